@@ -0,0 +1,81 @@
+"""
+Compares the time taken to find an address on a select address page with the address options index against the
+string slicing extraction which it replaced. The time to parse every address on the page is shown as well.
+
+Run from the repository root:
+    $ python benchmarks/address_options.py [number_of_lookups]
+"""
+import os
+import re
+import sys
+import time
+
+sys.path.append(os.getcwd())
+from locust_tasks.address_options import AddressOptions
+from locust_tasks.pages import Page
+from benchmarks.fixtures import generate_page
+
+
+def extract_with_slicing(page_content, uprn):
+    """
+    The extraction as it was before the address options parser, kept here as the baseline. The failure reporting
+    is left out.
+    """
+
+    target_id_string = 'id="' + uprn + '"'
+    if target_id_string not in page_content:
+        num_addresses_search = re.search('([0-9]*) addresses found for postcode', page_content, re.IGNORECASE)
+        return int(num_addresses_search.group(1))
+
+    page_extract1 = page_content[page_content.index(target_id_string):]
+    page_extract2 = page_extract1[page_extract1.index('value='):page_extract1.index('name=')]
+    page_extract2 = page_extract2.rstrip()
+    address_to_select = page_extract2[7:-1]
+    address_to_select = address_to_select.replace('&#34;', '"')
+    return address_to_select
+
+
+def extract_with_index(page_content, uprn):
+    address_options = AddressOptions(page_content)
+    address_to_select = address_options.get(uprn)
+    if address_to_select is None:
+        return address_options.get_address_count()
+    return address_to_select
+
+
+def extract_with_full_parse(page_content, uprn):
+    address_options = AddressOptions(page_content)
+    address_options.get_all()
+    address_to_select = address_options.get(uprn)
+    if address_to_select is None:
+        return address_options.get_address_count()
+    return address_to_select
+
+
+def time_extraction(extract, lookups):
+    start = time.perf_counter()
+    for (page_content, uprn) in lookups:
+        extract(page_content, uprn)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    number_of_lookups = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+    for number_of_addresses in (10, 50, 100):
+        page_content = generate_page(Page.SELECT_ADDRESS, 'I cannot find my address', number_of_addresses).decode()
+
+        # Look up addresses from across the page, plus one which isn't listed
+        uprns = [str(i) for i in range(0, number_of_addresses, max(1, number_of_addresses // 10))] + ['99999999']
+        lookups = [(page_content, uprns[i % len(uprns)]) for i in range(number_of_lookups)]
+
+        for (page_content, uprn) in lookups[:len(uprns)]:
+            expected = extract_with_slicing(page_content, uprn)
+            if expected != extract_with_index(page_content, uprn) or \
+                    expected != extract_with_full_parse(page_content, uprn):
+                raise AssertionError('The extractions differ for uprn %s' % uprn)
+
+        sys.stdout.write('%d addresses (%.1f KB)\n' % (number_of_addresses, len(page_content) / 1024))
+        for extract in (extract_with_slicing, extract_with_index, extract_with_full_parse):
+            elapsed = time_extraction(extract, lookups)
+            sys.stdout.write('  %-24s %8.1f us per lookup\n' % (extract.__name__, elapsed / number_of_lookups * 1e6))
@@ -0,0 +1,56 @@
+"""
+Compares the memory used per case by the worker case storage, before and after the switch from a list of
+csv.DictReader dicts to the packed CaseStore.
+
+Run from the repository root:
+    $ python benchmarks/case_store_memory.py [number_of_cases]
+"""
+import csv
+import io
+import os
+import sys
+import tracemalloc
+
+sys.path.append(os.getcwd())
+from locust_tasks.case_store import CaseStore
+from benchmarks.fixtures import generate_event_data
+
+
+def measure(load, event_data):
+    """
+    Measures the memory retained by a loader.
+    :param load: Is a function which loads the cases from a file object and returns the loaded cases.
+    :param event_data: Is the event data to load.
+    :return: The number of bytes still allocated once the loaded cases are the only thing left.
+    """
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    cases = load(io.StringIO(event_data, newline=''))
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    used = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del cases
+    return used
+
+
+def load_dicts(infile):
+    return list(csv.DictReader(infile))
+
+
+def load_case_store(infile):
+    reader = csv.reader(infile)
+    cases = CaseStore()
+    cases.append_rows(reader, next(reader))
+    return cases
+
+
+if __name__ == '__main__':
+    number_of_cases = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    event_data = generate_event_data(number_of_cases)
+
+    sys.stdout.write('Memory per case for %d cases\n' % number_of_cases)
+    for name, load in (('DictReader list', load_dicts), ('CaseStore', load_case_store)):
+        used = measure(load, event_data)
+        sys.stdout.write('  %-16s %8.1f bytes\n' % (name, used / number_of_cases))
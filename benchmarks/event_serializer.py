@@ -0,0 +1,124 @@
+"""
+Compares the events per second of the event serializer against the string building event builders which it
+replaced.
+
+Run from the repository root:
+    $ python benchmarks/event_serializer.py [number_of_cases]
+"""
+import csv
+import datetime
+import hashlib
+import io
+import os
+import sys
+import time
+from uuid import uuid4
+
+sys.path.append(os.getcwd())
+from locust_tasks.event_serializer import serialize_event_batch
+from benchmarks.fixtures import generate_event_data
+
+# The event builders as they were before the event serializer, kept here as the baseline
+
+
+def uac_event_builder(line, case_id, collection_exercise_id):
+    """
+    Build UAC event message.
+    :param line: CSV data
+    :param case_id:
+    :param collection_exercise_id:
+    :return:  UAC event message
+    """
+    str_list = []
+    str_list.append('{"event": { "type": "UAC_UPDATED", "source": "CASE_SERVICE", "channel": "RM", "dateTime": "')
+    str_list.append(datetime.datetime.utcnow().isoformat())
+    str_list.append('", "transactionId" : "')
+    str_list.append(str(uuid4()))
+    str_list.append('" }, "payload" : {"uac" : { "uacHash": "')
+    str_list.append(hashlib.sha256(line["uac"].encode()).hexdigest())
+    str_list.append('", "active" : ')
+    str_list.append(line["active"])
+    str_list.append(', "questionnaireId" : "')
+    str_list.append(line["questionnaireId"])
+    str_list.append('", "caseType" : "')
+    str_list.append(line["caseType"])
+    str_list.append('", "region" : "')
+    str_list.append(line["region"])
+    str_list.append('", "caseId" : "')
+    str_list.append(case_id)
+    str_list.append('", "collectionExerciseId" : "')
+    str_list.append(collection_exercise_id)
+    str_list.append('"}}}')
+    return ''.join(str_list)
+
+
+def case_event_builder(line, case_id, collection_exercise_id, case_ref):
+    """
+    Build Case event message.
+    :param line: CSV data
+    :param case_id:
+    :param collection_exercise_id:
+    :param case_ref: Unique reference for the case
+    :return: Case event message
+    """
+    str_list = []
+    str_list.append('{"event": { "type": "CASE_UPDATED", "source": "CASE_SERVICE", "channel": "RM", "dateTime": "')
+    str_list.append(datetime.datetime.utcnow().isoformat())
+    str_list.append('", "transactionId": "')
+    str_list.append(str(uuid4()))
+    str_list.append('" }, "payload": {"collectionCase": { "id": "')
+    str_list.append(case_id)
+    str_list.append('", "caseRef": "')
+    str_list.append(str(case_ref))
+    str_list.append('", "caseType": "')
+    str_list.append(line["caseType"])
+    str_list.append('", "survey": "CENSUS", "collectionExerciseId": "')
+    str_list.append(collection_exercise_id)
+    str_list.append('", "address": { "addressLine1": "')
+    str_list.append(line["addressLine1"])
+    str_list.append('", "addressLine2": "')
+    str_list.append(line["addressLine2"])
+    str_list.append('", "addressLine3": "')
+    str_list.append(line["addressLine3"])
+    str_list.append('", "townName": "')
+    str_list.append(line["townName"])
+    str_list.append('", "postcode": "')
+    str_list.append(line["postcode"])
+    str_list.append('", "region": "E", "latitude": "')
+    str_list.append(line["latitude"])
+    str_list.append('", "longitude": "')
+    str_list.append(line["longitude"])
+    str_list.append('", "uprn": "')
+    str_list.append(line["uprn"])
+    str_list.append('", "arid": "ABPXXXXXX010008328509", "addressType": "')
+    str_list.append(line["caseType"])
+    str_list.append('", "estabType": "Household"')
+    str_list.append('}, "contact": { "title": null, "forename": null, "surname": null, "email": null, "telNo": null')
+    str_list.append('}, "state": "ACTIONABLE", "actionableFrom": "')
+    str_list.append(datetime.datetime.utcnow().isoformat())
+    str_list.append('"}}}')
+    return ''.join(str_list)
+
+
+def run_legacy(cases):
+    for (line, case_id, collection_exercise_id, case_ref) in cases:
+        uac_event_builder(line, case_id, collection_exercise_id).encode('utf-8')
+        case_event_builder(line, case_id, collection_exercise_id, case_ref).encode('utf-8')
+
+
+def run_serializer_batch(cases):
+    for start in range(0, len(cases), 500):
+        serialize_event_batch(cases[start:start + 500])
+
+
+if __name__ == '__main__':
+    number_of_cases = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    lines = list(csv.DictReader(io.StringIO(generate_event_data(number_of_cases), newline='')))
+    cases = [(line, str(uuid4()), str(uuid4()), 84000001 + i) for (i, line) in enumerate(lines)]
+
+    sys.stdout.write('Events per second for %d cases (2 events per case)\n' % number_of_cases)
+    for name, run in (('legacy builders', run_legacy), ('serializer', run_serializer_batch)):
+        start = time.perf_counter()
+        run(cases)
+        elapsed = time.perf_counter() - start
+        sys.stdout.write('  %-18s %10.0f events/sec\n' % (name, number_of_cases * 2 / elapsed))
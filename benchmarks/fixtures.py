@@ -0,0 +1,78 @@
+"""
+Test data shared by the benchmarks.
+"""
+from locust_tasks.pages import Page
+
+HEADER = ('uac,active,questionnaireId,caseType,region,uprn,addressLine1,addressLine2,addressLine3,townName,postcode,'
+          'latitude,longitude,phone_number,first_name,last_name\n')
+
+
+def generate_event_data(number_of_cases):
+    """
+    Generates event data in the same shape as the sampleGenerator output.
+    :param number_of_cases: Is the number of records to generate.
+    :return: The event data as a string, including the header line.
+    """
+
+    lines = [HEADER]
+    for i in range(number_of_cases):
+        lines.append('%016x,true,0120%012d,HH,E12000007,%d,%d Sandford Walk,,,Keelden,AB%d 2ET,50.72483,-3.516292,'
+                     '07700%06d,Fred,Smith%d\n' % (i * 7919, i, 100040000000 + i, i % 97, i % 50, i, i % 1000))
+    return ''.join(lines)
+
+
+def generate_page(page, expected_content, number_of_addresses):
+    """
+    Generates a page which is roughly the size and shape of an RH page.
+    :param page: Is the Page to generate.
+    :param expected_content: Is text to include in the page body.
+    :param number_of_addresses: Is the number of address radio buttons to list, as on the select address page.
+    The addresses have UPRNs 0 to number_of_addresses - 1.
+    :return: The page as UTF-8 bytes.
+    """
+
+    body = []
+    if number_of_addresses:
+        body.append('<p>%d addresses found for postcode AB1 2ET</p>' % number_of_addresses)
+    body.extend(generate_address_option(str(i), '%d Sandford Walk, Keelden' % i) for i in range(number_of_addresses))
+    body.append('<p>%s</p>' % expected_content)
+    return render_page(page, body)
+
+
+def generate_address_option(uprn, address):
+    """
+    :return: The radio button for an address, as on the select address page. The value holds the address as JSON.
+    """
+
+    return ('<div class="radios__item"><input type="radio" id="%s" class="radio__input" '
+            'value="{&#34;uprn&#34;: &#34;%s&#34;, &#34;address&#34;: &#34;%s&#34;}" '
+            'name="form-pick-address"><label for="%s">%s – Exeter</label></div>'
+            % (uprn, uprn, address, uprn, address))
+
+
+# The headings which RH shows the markers of the pages whose title isn't a page marker in
+MARKER_HEADINGS = {
+    Page.EQ_LAUNCHED: '<h1>302: Found</h1>',
+    Page.ERROR_GENERIC: '<h1>Error: Server Error</h1>',
+    Page.ENTER_ADDRESS: '<h1 class="question__title">What is your postcode?</h1>',
+}
+
+
+def render_page(page, body):
+    """
+    Wraps the body of a page in the head and footer of an RH page, so the page is roughly the size and shape of an
+    RH page. The page's marker is put in the title, or in a heading at the start of the body if it isn't a title.
+    :param page: Is the Page to render.
+    :param body: Is a list of lines of HTML for the main content.
+    :return: The page as UTF-8 bytes.
+    """
+
+    lines = ['<!DOCTYPE html>\n<html lang="en">\n<head>\n<meta charset="utf-8">']
+    lines.extend('<link rel="stylesheet" href="/static/css/main-%d.css">' % i for i in range(40))
+    lines.append(page.title if page.title.startswith('<title>') else '<title>Census 2021</title>')
+    lines.append('</head>\n<body>\n<main id="main-content">')
+    if not page.title.startswith('<title>'):
+        lines.append(MARKER_HEADINGS[page])
+    lines.extend(body)
+    lines.append('</main>\n<footer class="footer">' + 'Crown copyright © 2021 ' * 200 + '</footer>\n</body>\n</html>')
+    return '\n'.join(lines).encode('utf-8')
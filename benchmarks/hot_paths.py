@@ -0,0 +1,247 @@
+"""
+Microbenchmarks for the code which runs on every request, and for the seeding event builders, so that a change which
+slows the load generator down is caught before a census scale run.
+
+Each benchmark is timed over several rounds, with garbage collection off, and the best round is reported as
+operations per second. The peak memory allocated by one operation is measured separately with tracemalloc, as tracing
+slows the code down. The results can be saved as a baseline, and later runs are compared with it. A benchmark which
+is more than the tolerance slower, or which allocates more than the tolerance more, is reported as a regression, and
+the script exits with status 1.
+
+The speed of a shared or virtual machine can drift by tens of percent between runs, so a fixed calibration workload
+is timed as well. The speeds are compared relative to the calibration, which cancels out most of the drift. Even so,
+the baseline is only meaningful on the machine it was saved on, so it is kept locally in
+benchmarks/hot_paths_baseline.json and isn't committed. Save one before making a change, on the machine the change
+will be checked on.
+
+Run from the repository root:
+    $ python benchmarks/hot_paths.py --save-baseline
+    $ python benchmarks/hot_paths.py [--tolerance 0.15] [name_filter]
+"""
+import argparse
+import csv
+import gc
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+sys.path.append(os.getcwd())
+from locust_tasks.locustfile import verify_response, identify_page, extract_key_page_content, clean_text, \
+    extract_address_radio_button_value
+from locust_tasks.pages import Page
+from locust_tasks.setup import generate_test_data_message_batch
+from benchmarks.fixtures import generate_event_data, generate_page
+
+BASELINE_FILE_NAME = os.path.join('benchmarks', 'hot_paths_baseline.json')
+
+ROUNDS = 7
+MIN_ROUND_SECONDS = 0.3
+SEED_BATCH_SIZE = 500
+
+# The baseline entry which holds the speed of the calibration workload
+CALIBRATION = '_calibration'
+
+
+class BenchmarkResponse:
+    """
+    Stands in for a Locust response, with the request meta data that Locust attaches to it.
+    """
+
+    def __init__(self, content, status_code=200):
+        self.content = content
+        self.encoding = 'utf-8'
+        self.status_code = status_code
+        self.locust_request_meta = {'start_time': time.monotonic(), 'response_time': 25.0,
+                                    'content_size': len(content)}
+
+    @property
+    def text(self):
+        return str(self.content, self.encoding, errors='replace')
+
+    def success(self):
+        pass
+
+    def failure(self, message):
+        raise AssertionError('Benchmark response failed verification: ' + message)
+
+
+class BenchmarkTask:
+    """
+    Stands in for a task set part way through a journey.
+    """
+
+    journey_timer = None
+
+    def __init__(self):
+        self.user = SimpleNamespace()
+        self.on_failure_detail = "UAC='0000000000001eef"
+        self.on_failure_logging = ''
+
+
+def create_benchmarks():
+    """
+    :return: List of (name, operation) tuples. A fresh response is made for each operation, as each request gets a
+    new response.
+    """
+
+    task = BenchmarkTask()
+    address_correct = generate_page(Page.ADDRESS_CORRECT, '1 Sandford Walk<br>AB1 2ET', 0)
+    select_address = generate_page(Page.SELECT_ADDRESS, 'AB1 2ET', 100)
+    code_sent = generate_page(Page.CODE_SENT, '<div class="panel__body svg-icon-margin--xl">We have sent a text to '
+                                              '07700000001</div>', 0)
+    code_sent_text = code_sent.decode('utf-8')
+
+    reader = csv.DictReader(io.StringIO(generate_event_data(SEED_BATCH_SIZE)))
+    seed_batch = list(enumerate(reader))
+
+    return [
+        ('verify_response', lambda: verify_response('RequestUacSms-4-SelectAddress', task,
+                                                    BenchmarkResponse(address_correct), 200, Page.ADDRESS_CORRECT,
+                                                    'AB1 2ET')),
+        ('identify_page', lambda: identify_page('RequestUacSms-4-SelectAddress', task,
+                                                BenchmarkResponse(address_correct))),
+        ('extract_key_page_content', lambda: extract_key_page_content('RequestUacSms-9-ConfirmMobileNumber', task,
+                                                                      BenchmarkResponse(code_sent), Page.CODE_SENT)),
+        ('clean_text', lambda: clean_text(code_sent_text)),
+        ('extract_address_radio_button_value', lambda: extract_address_radio_button_value(
+            'RequestUacSms-3-EnterAddress', task, BenchmarkResponse(select_address), '50')),
+        ('seed_event_batch_%d' % SEED_BATCH_SIZE, lambda: list(generate_test_data_message_batch(seed_batch, None))),
+    ]
+
+
+def calibration_workload():
+    """
+    A fixed mix of the string, dict and regular expression work which the hot paths do.
+    """
+
+    values = {}
+    for i in range(200):
+        key = 'RequestUacSms-%d-Step' % (i % 9)
+        values[key] = values.get(key, 0) + len(key.replace('-', ' ').split())
+    return sorted(values.items())
+
+
+def time_operation(operation):
+    """
+    :return: The best operations per second over the rounds. As with timeit, garbage collection is off while timing.
+    """
+
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return time_rounds(operation)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def time_rounds(operation):
+    # Find a number of operations which takes long enough to time reliably
+    iterations = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            operation()
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_ROUND_SECONDS:
+            break
+        iterations *= 2 if elapsed < MIN_ROUND_SECONDS / 10 else int(MIN_ROUND_SECONDS / elapsed) + 1
+
+    best = elapsed
+    for _ in range(ROUNDS - 1):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            operation()
+        best = min(best, time.perf_counter() - start)
+    return iterations / best
+
+
+def measure_peak_allocation(operation):
+    """
+    :return: The peak number of bytes allocated while running the operation once.
+    """
+
+    operation()
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        operation()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return max(0, peak - baseline)
+
+
+def find_regressions(results, baseline, tolerance):
+    """
+    :return: Dict of the description of each regression against the baseline, by benchmark name.
+    """
+
+    regressions = {}
+    for (name, result) in results.items():
+        previous = baseline.get(name)
+        if not previous or name == CALIBRATION:
+            continue
+        problems = []
+        change = get_speed_change(result, previous, results, baseline)
+        if change < -tolerance:
+            problems.append('%.0f%% slower' % (-change * 100))
+        if result['peak_bytes'] > previous['peak_bytes'] * (1 + tolerance) + 1024:
+            problems.append('%d bytes more allocated' % (result['peak_bytes'] - previous['peak_bytes']))
+        if problems:
+            regressions[name] = ', '.join(problems)
+    return regressions
+
+
+def get_speed_change(result, previous, results, baseline):
+    """
+    :return: The fractional change in speed against the baseline, relative to the calibration workload.
+    """
+
+    speed_ratio = result['ops_per_sec'] / previous['ops_per_sec']
+    if CALIBRATION in results and CALIBRATION in baseline:
+        speed_ratio /= results[CALIBRATION]['ops_per_sec'] / baseline[CALIBRATION]['ops_per_sec']
+    return speed_ratio - 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Runs the hot path microbenchmarks.')
+    parser.add_argument('name_filter', nargs='?', default='', help='only run benchmarks whose names contain this')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the baseline')
+    parser.add_argument('--baseline', default=BASELINE_FILE_NAME, help='the baseline file')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='the fraction by which a result may be worse')
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    results = {CALIBRATION: {'ops_per_sec': time_operation(calibration_workload), 'peak_bytes': 0}}
+    sys.stdout.write('%-40s %14s %14s %14s\n' % ('Benchmark', 'ops/sec', 'peak bytes', 'vs baseline'))
+    for (name, operation) in create_benchmarks():
+        if args.name_filter not in name:
+            continue
+        results[name] = {'ops_per_sec': time_operation(operation), 'peak_bytes': measure_peak_allocation(operation)}
+        previous = baseline.get(name)
+        change = '%+.1f%%' % (get_speed_change(results[name], previous, results, baseline) * 100) if previous else '-'
+        sys.stdout.write('%-40s %14.0f %14d %14s\n' % (name, results[name]['ops_per_sec'], results[name]['peak_bytes'],
+                                                     change))
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+        sys.stdout.write('Saved the baseline to %s\n' % args.baseline)
+    elif not baseline:
+        sys.stdout.write('There is no baseline at %s to compare with. Save one with --save-baseline\n' % args.baseline)
+    else:
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for (name, description) in sorted(regressions.items()):
+            sys.stdout.write('REGRESSION %s: %s\n' % (name, description))
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,107 @@
+"""
+Compares the requests per second which one core can generate with the 'requests' and 'fast' HTTP clients.
+A local server, in a separate process, serves an RH sized start page. Each client requests and verifies the page
+from many greenlets at once, as the Locust users do. The client's CPU time is measured as well as the elapsed time,
+so the requests per CPU second show the maximum that one core could generate, whatever the server's speed.
+
+Run from the repository root:
+    $ python benchmarks/http_client.py [seconds_per_client] [concurrent_users]
+"""
+import multiprocessing
+import os
+import sys
+import time
+
+from gevent.pool import Pool
+from locust.clients import HttpSession
+from locust.env import Environment
+
+sys.path.append(os.getcwd())
+from locust_tasks.fast_client import FormFastHttpSession
+from locust_tasks.pages import Page
+from locust_tasks.response_view import get_response_view
+from benchmarks.fixtures import generate_page
+
+SERVER_PORT = 18089
+
+
+def serve():
+    """
+    Serves the start page for any GET, and the address correct page for any POST.
+    """
+
+    from gevent.pywsgi import WSGIServer
+
+    pages = {
+        'GET': generate_page(Page.START, 'Enter your 16-character access code', 0),
+        'POST': generate_page(Page.ADDRESS_CORRECT, 'AB1 2ET', 0),
+    }
+
+    def application(environ, start_response):
+        if environ['REQUEST_METHOD'] == 'POST':
+            environ['wsgi.input'].read()
+        body = pages[environ['REQUEST_METHOD']]
+        start_response('200 OK', [('Content-Type', 'text/html; charset=utf-8'), ('Content-Length', str(len(body)))])
+        return [body]
+
+    WSGIServer(('127.0.0.1', SERVER_PORT), application, log=None).serve_forever()
+
+
+def create_session(client, environment, base_url):
+    if client == 'requests':
+        return HttpSession(base_url, environment.events.request_success, environment.events.request_failure)
+    return FormFastHttpSession(environment, base_url)
+
+
+def run_user(session, deadline, counts):
+    while time.monotonic() < deadline:
+        with session.get('/en/start/', catch_response=True) as response:
+            if get_response_view(response).find_page() != Page.START:
+                response.failure('Not on the start page')
+        with session.post('/en/start/', {'uac': 'ABCD1234ABCD1234'}, catch_response=True) as response:
+            if get_response_view(response).find_page() != Page.ADDRESS_CORRECT:
+                response.failure('Not on the address correct page')
+        counts[0] += 2
+
+
+def time_client(client, seconds, concurrent_users):
+    """
+    :return: Tuple of the number of requests, the elapsed seconds and the CPU seconds used by the client.
+    """
+
+    environment = Environment()
+    failures = []
+    environment.events.request_failure.add_listener(lambda **kwargs: failures.append(kwargs['exception']))
+
+    base_url = 'http://127.0.0.1:%d' % SERVER_PORT
+    sessions = [create_session(client, environment, base_url) for _ in range(concurrent_users)]
+    counts = [0]
+
+    start = time.monotonic()
+    start_cpu = time.process_time()
+    deadline = start + seconds
+    pool = Pool(concurrent_users)
+    for session in sessions:
+        pool.spawn(run_user, session, deadline, counts)
+    pool.join()
+
+    if failures:
+        raise AssertionError('%d requests failed with the %s client, eg: %s' % (len(failures), client, failures[0]))
+    return counts[0], time.monotonic() - start, time.process_time() - start_cpu
+
+
+if __name__ == '__main__':
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10.0
+    concurrent_users = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    server = multiprocessing.get_context('spawn').Process(target=serve, daemon=True)
+    server.start()
+    time.sleep(2.0)
+
+    try:
+        for client in ('requests', 'fast'):
+            (requests_made, elapsed, cpu) = time_client(client, seconds, concurrent_users)
+            sys.stdout.write('%-8s %8.0f requests/sec %8.0f requests/CPU sec\n'
+                             % (client, requests_made / elapsed, requests_made / cpu))
+    finally:
+        server.terminate()
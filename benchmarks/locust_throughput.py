@@ -0,0 +1,103 @@
+"""
+Measures how many journeys per second one core of a Locust worker can drive, by running locustfile.py against the
+RH UI stand-in (see mock_rh.py), with no think time. No network or RH is needed.
+
+Locust runs as a single process, so it can use at most one core. The stand-in runs in separate processes, so that
+it isn't the bottleneck. If Locust's CPU use is close to 100% then the journeys per CPU second is the most that one
+worker core can generate, and a throughput ceiling seen against RH below this comes from RH, not from the workers.
+The CPU time includes Locust's start up, which is small for a run of more than a few seconds.
+
+Run from the repository root:
+    $ python benchmarks/locust_throughput.py [seconds] [users] [requests|fast]
+"""
+import csv
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append(os.getcwd())
+from locust_tasks.journey_timing import JOURNEY
+from benchmarks.fixtures import generate_event_data
+from benchmarks.mock_rh import start_servers
+
+NUMBER_OF_CASES = 5000
+SERVER_PORT = 18092
+# The stand-in gets the cores which Locust doesn't use
+SERVER_PROCESSES = max(1, (os.cpu_count() or 2) - 1)
+
+
+def run_locust(work_dir, seconds, users, http_client):
+    """
+    Runs a headless Locust against the stand-in.
+    :return: Tuple of the stats CSV file name and the CPU seconds used by Locust.
+    """
+
+    # The journeys are counted from their entries in Locust's statistics
+    env = dict(os.environ, FILE_NAME=os.path.join(work_dir, 'event_data.txt'), INSTANCE_NUM='1', MAX_INSTANCES='1',
+               DATA_PUBLISH='false', WAIT_TIME_MIN='0', WAIT_TIME_MAX='0', HTTP_CLIENT=http_client,
+               JOURNEY_STATS='true')
+    env.pop('INDEX_FILE_NAME', None)
+    env.pop('POSTCODE_INDEX_FILE_NAME', None)
+    csv_prefix = os.path.join(work_dir, 'locust')
+
+    command = [sys.executable, '-m', 'locust', '-f', 'locust_tasks/locustfile.py', '--headless', '--only-summary',
+               '--users', str(users), '--spawn-rate', str(users), '--run-time', '%ds' % seconds,
+               '--host', 'http://127.0.0.1:%d' % SERVER_PORT, '--csv', csv_prefix]
+
+    start_cpu = resource.getrusage(resource.RUSAGE_CHILDREN)
+    with open(os.path.join(work_dir, 'locust.log'), 'w') as log_file:
+        subprocess.run(command, env=env, stdout=log_file, stderr=subprocess.STDOUT, check=False)
+    end_cpu = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    cpu = (end_cpu.ru_utime - start_cpu.ru_utime) + (end_cpu.ru_stime - start_cpu.ru_stime)
+    return csv_prefix + '_stats.csv', cpu
+
+
+def read_counts(stats_file_name):
+    """
+    :return: Tuple of the number of completed journeys, failed journeys and requests to the stand-in.
+    """
+
+    (completed, failed, requests) = (0, 0, 0)
+    with open(stats_file_name, newline='') as stats_file:
+        for row in csv.DictReader(stats_file):
+            if row['Type'] == JOURNEY:
+                failed += int(row['Failure Count'])
+                completed += int(row['Request Count']) - int(row['Failure Count'])
+            elif row['Type'] in ('GET', 'POST'):
+                requests += int(row['Request Count'])
+    return completed, failed, requests
+
+
+if __name__ == '__main__':
+    seconds = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    http_client = sys.argv[3] if len(sys.argv) > 3 else 'requests'
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        event_data_file_name = os.path.join(work_dir, 'event_data.txt')
+        with open(event_data_file_name, 'w') as event_data_file:
+            event_data_file.write(generate_event_data(NUMBER_OF_CASES))
+
+        servers = start_servers(event_data_file_name, SERVER_PORT, SERVER_PROCESSES)
+        time.sleep(1.0)
+        try:
+            (stats_file_name, cpu) = run_locust(work_dir, seconds, users, http_client)
+        finally:
+            for server in servers:
+                server.terminate()
+
+        if not os.path.exists(stats_file_name):
+            with open(os.path.join(work_dir, 'locust.log')) as log_file:
+                sys.stdout.write(log_file.read())
+            sys.exit('Locust did not write its statistics')
+        (completed, failed, requests) = read_counts(stats_file_name)
+
+    sys.stdout.write('%s client, %d users for %ds: %d journeys completed, %d failed, %d requests\n'
+                     % (http_client, users, seconds, completed, failed, requests))
+    sys.stdout.write('Locust CPU: %.1fs (%.0f%% of one core)\n' % (cpu, cpu / seconds * 100))
+    sys.stdout.write('%8.1f journeys/sec %8.1f journeys/CPU sec %8.0f requests/CPU sec\n'
+                     % (completed / seconds, completed / cpu, requests / cpu))
@@ -0,0 +1,310 @@
+"""
+A stand-in for the RH UI, which serves the pages used by the task sets, so that Locust can be run without RH or a
+network. It's built on gevent's WSGI server, so it handles each request on a greenlet, as Locust does.
+
+The cases come from an event data file, as used by Locust, so that each page holds the text the task sets check for:
+the address for a UAC, the addresses listed for a postcode, the mobile number and the name. As with RH, the state of
+a user's journey is held in a session cookie, rather than on the server. So the server can run as several processes
+sharing the same port, and the load generator, rather than the stand-in, is the bottleneck.
+
+Run from the repository root:
+    $ python benchmarks/mock_rh.py [event_data_file] [port] [processes]
+"""
+import base64
+import csv
+import json
+import multiprocessing
+import os
+import socket
+import sys
+from collections import defaultdict
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs
+
+sys.path.append(os.getcwd())
+from locust_tasks.address_options import MAX_LISTED_ADDRESSES
+from locust_tasks.pages import Page
+from locust_tasks.postcode_index import normalise_postcode
+from benchmarks.fixtures import generate_address_option, render_page
+
+SESSION_COOKIE = 'RH_SESSION'
+DEFAULT_PORT = 9092
+
+
+def escape(text):
+    """
+    :return: The text escaped as RH escapes it, with apostrophes as &#39;
+    """
+
+    return (text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&#34;')
+            .replace("'", '&#39;'))
+
+
+class Response:
+    """
+    A page, or a redirect, to send back to the client.
+    """
+
+    __slots__ = ('status', 'body', 'session', 'location')
+
+    def __init__(self, status, page, body=(), session=None, location=None):
+        self.status = status
+        self.body = render_page(page, list(body))
+        self.session = session
+        self.location = location
+
+
+class MockRH:
+    """
+    Serves the RH UI pages for the cases in an event data file.
+    """
+
+    def __init__(self, file_name):
+        """
+        :param file_name: Is the name of the event data file.
+        """
+
+        self.cases_by_uac = {}
+        self.cases_by_uprn = {}
+        self.cases_by_postcode = defaultdict(list)
+        with open(file_name, newline='') as event_data_file:
+            for row in csv.DictReader(event_data_file):
+                case = {
+                    'uac': row['uac'],
+                    'uprn': row['uprn'],
+                    'address_line_1': row.get('address_line_1') or row.get('addressLine1', ''),
+                    'town': row.get('townName', ''),
+                    'postcode': row['postcode'],
+                }
+                self.cases_by_uac[case['uac'].lower()] = case
+                self.cases_by_uprn[case['uprn']] = case
+                self.cases_by_postcode[normalise_postcode(case['postcode'])].append(case)
+
+        self.routes = {
+            ('GET', '/en/start/'): self.start,
+            ('POST', '/en/start/'): self.enter_uac,
+            ('POST', '/en/start/confirm-address/'): self.confirm_launch_address,
+            ('POST', '/en/start/address-edit'): self.edit_address,
+            ('GET', '/en/requests/access-code/enter-address/'): self.enter_address,
+            ('POST', '/en/requests/access-code/enter-address/'): self.enter_postcode,
+            ('POST', '/en/requests/access-code/select-address/'): self.select_address,
+            ('POST', '/en/requests/access-code/confirm-address/'): self.confirm_request_address,
+            ('POST', '/en/requests/access-code/household-information/'): self.household_information,
+            ('POST', '/en/requests/access-code/select-method/'): self.select_method,
+            ('POST', '/en/requests/access-code/enter-mobile/'): self.enter_mobile,
+            ('POST', '/en/requests/access-code/confirm-mobile/'): self.confirm_mobile,
+            ('POST', '/en/requests/access-code/enter-name/'): self.enter_name,
+            ('POST', '/en/requests/access-code/confirm-name-address/'): self.confirm_name_address,
+            ('GET', '/webchat'): self.webchat,
+            ('POST', '/webchat'): self.start_webchat,
+        }
+
+    def __call__(self, environ, start_response):
+        form = {}
+        if environ['REQUEST_METHOD'] == 'POST':
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+            form = {name: values[0] for (name, values)
+                    in parse_qs(environ['wsgi.input'].read(length).decode('utf-8')).items()}
+
+        session = read_session(environ.get('HTTP_COOKIE'))
+        handler = self.routes.get((environ['REQUEST_METHOD'], environ['PATH_INFO']))
+        if handler:
+            response = handler(form, session)
+        else:
+            response = Response('404 Not Found', Page.ERROR, ['<h1>Page not found</h1>'])
+
+        headers = [('Content-Type', 'text/html; charset=utf-8'), ('Content-Length', str(len(response.body)))]
+        if response.session is not None:
+            headers.append(('Set-Cookie', '%s=%s; Path=/; HttpOnly' % (SESSION_COOKIE,
+                                                                      write_session(response.session))))
+        if response.location:
+            headers.append(('Location', response.location))
+        start_response(response.status, headers)
+        return [response.body]
+
+    def address_correct(self, case, session):
+        return Response('200 OK', Page.ADDRESS_CORRECT, [
+            '<h1 class="question__title">Is this the correct address?</h1>',
+            '<p>%s<br>%s<br>%s</p>' % (escape(case['address_line_1']), escape(case['town']), escape(case['postcode'])),
+            '<fieldset><input type="radio" name="address-check-answer" value="Yes"></fieldset>',
+        ], session)
+
+    def start(self, form, session):
+        return Response('200 OK', Page.START, [
+            '<h1>Start census</h1>',
+            '<label for="uac">Enter your 16-character access code</label><input id="uac" name="uac">',
+        ])
+
+    def enter_uac(self, form, session):
+        case = self.cases_by_uac.get(form.get('uac', '').replace(' ', '').lower())
+        if case is None:
+            return Response('401 Unauthorized', Page.START, [
+                '<h1>Start census</h1>',
+                '<p class="error">Enter a valid code</p>',
+                '<label for="uac">Enter your 16-character access code</label><input id="uac" name="uac">',
+            ])
+        return self.address_correct(case, {'uprn': case['uprn']})
+
+    def confirm_launch_address(self, form, session):
+        if form.get('address-check-answer', '').lower() == 'yes':
+            return Response('302 Found', Page.EQ_LAUNCHED, ['<h1>302: Found</h1>'], location='/eq/session')
+        return Response('200 OK', Page.ADDRESS_CORRECT, ['<h1 class="question__title">Enter the address</h1>',
+                                                        '<fieldset></fieldset>'])
+
+    def edit_address(self, form, session):
+        return Response('200 OK', Page.ADDRESS_CORRECT, [
+            '<h1 class="question__title">Is this the correct address?</h1>',
+            '<fieldset></fieldset>',
+        ])
+
+    def enter_address(self, form, session):
+        return Response('200 OK', Page.ENTER_ADDRESS, [
+            '<h1 class="question__title">What is your postcode?</h1>',
+            '<input id="postcode" name="form-enter-address-postcode">',
+        ])
+
+    def enter_postcode(self, form, session):
+        postcode = form.get('form-enter-address-postcode', '')
+        cases = self.cases_by_postcode.get(normalise_postcode(postcode), [])
+        body = [
+            '<h1 class="question__title">Select your address</h1>',
+            '<p>%d addresses found for postcode %s</p>' % (len(cases), escape(postcode)),
+        ]
+        body.extend(generate_address_option(case['uprn'], escape('%s, %s' % (case['address_line_1'], case['town'])))
+                    for case in cases[:MAX_LISTED_ADDRESSES])
+        body.append('<a href="/en/requests/access-code/enter-address/">I cannot find my address</a>')
+        return Response('200 OK', Page.SELECT_ADDRESS, body, {'postcode': postcode})
+
+    def select_address(self, form, session):
+        try:
+            case = self.cases_by_uprn[json.loads(form['form-select-address'])['uprn']]
+        except (KeyError, ValueError):
+            return Response('200 OK', Page.ERROR, ['<h1>Sorry, something went wrong</h1>'])
+        return self.address_correct(case, {'uprn': case['uprn']})
+
+    def confirm_request_address(self, form, session):
+        return Response('200 OK', Page.HOUSEHOLD_INFORMATION, ['<h1>Request a new household access code</h1>',
+                                                               '<p>You will need to provide a mobile number</p>'])
+
+    def household_information(self, form, session):
+        return Response('200 OK', Page.SELECT_METHOD, [
+            '<h1 class="question__title">How would you like to receive a new household access code?</h1>',
+            '<p>To request a census in a different format or for further help, please call</p>',
+        ])
+
+    def select_method(self, form, session):
+        if form.get('form-select-method') == 'post':
+            return Response('200 OK', Page.ENTER_NAME, [
+                '<h1 class="question__title">What is your name?</h1>',
+                '<button>Continue</button>',
+            ])
+        return Response('200 OK', Page.ENTER_MOBILE, [
+            '<h1 class="question__title">What is your mobile phone number?</h1>',
+            '<button>Continue</button>',
+        ])
+
+    def enter_mobile(self, form, session):
+        phone_number = form.get('request-mobile-number', '')
+        session['phone_number'] = phone_number
+        return Response('200 OK', Page.CONFIRM_MOBILE, [
+            '<h1 class="question__title">Is this mobile phone number correct?</h1>',
+            '<p>%s</p>' % escape(phone_number),
+            '<button>Continue</button>',
+        ], session)
+
+    def confirm_mobile(self, form, session):
+        return Response('200 OK', Page.CODE_SENT, [
+            '<div class="panel__body svg-icon-margin--xl">We have sent a text to %s</div>'
+            % escape(session.get('phone_number', '')),
+        ])
+
+    def enter_name(self, form, session):
+        session['name'] = '%s %s' % (form.get('name_first_name', ''), form.get('name_last_name', ''))
+        return Response('200 OK', Page.CONFIRM_NAME, [
+            '<h1 class="question__title">Do you want to send a new household access code to this address?</h1>',
+            '<p>%s<br>%s</p>' % (escape(session['name']), escape(session.get('uprn', ''))),
+            '<button>Continue</button>',
+        ], session)
+
+    def confirm_name_address(self, form, session):
+        return Response('200 OK', Page.CODE_SENT, [
+            '<div class="panel__body svg-icon-margin--xl">A letter will be sent to %s at the address</div>'
+            % escape(session.get('name', '')),
+        ])
+
+    def webchat(self, form, session):
+        return Response('200 OK', Page.CALL_CONTACT_CENTRE, ['<h1>Web chat</h1>'])
+
+    def start_webchat(self, form, session):
+        return Response('302 Found', Page.EQ_LAUNCHED, ['<h1>302: Found</h1>'], location='/webchat/chat')
+
+
+def read_session(cookie_header):
+    """
+    :return: The session held in the session cookie, or an empty session if there isn't one.
+    """
+
+    if not cookie_header:
+        return {}
+    morsel = SimpleCookie(cookie_header).get(SESSION_COOKIE)
+    if morsel is None:
+        return {}
+    try:
+        return json.loads(base64.urlsafe_b64decode(morsel.value.encode()))
+    except ValueError:
+        return {}
+
+
+def write_session(session):
+    return base64.urlsafe_b64encode(json.dumps(session).encode()).decode()
+
+
+def serve(file_name, port, listener=None):
+    """
+    Runs the stand-in until the process is stopped.
+    :param listener: Is a socket to share with other server processes, or None to listen on the port.
+    """
+
+    from gevent import socket as gevent_socket
+    from gevent.pywsgi import WSGIServer
+
+    if listener is not None:
+        listener = gevent_socket.socket(listener.family, listener.type, fileno=listener.detach())
+    WSGIServer(listener or ('127.0.0.1', port), MockRH(file_name), log=None).serve_forever()
+
+
+def create_listener(port):
+    """
+    :return: A listening socket, which can be shared by several server processes.
+    """
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(('127.0.0.1', port))
+    listener.listen(1024)
+    return listener
+
+
+def start_servers(file_name, port, processes):
+    """
+    Starts the stand-in in separate processes, which share one listening socket.
+    :return: List of the server processes.
+    """
+
+    listener = create_listener(port)
+    context = multiprocessing.get_context('fork')
+    servers = [context.Process(target=serve, args=(file_name, port, listener), daemon=True) for _ in range(processes)]
+    for server in servers:
+        server.start()
+    listener.close()
+    return servers
+
+
+if __name__ == '__main__':
+    event_data_file_name = sys.argv[1] if len(sys.argv) > 1 else './test_data/event_data.txt'
+    server_port = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_PORT
+    server_processes = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+
+    sys.stdout.write('Serving the RH UI stand-in on http://127.0.0.1:%d\n' % server_port)
+    for server_process in start_servers(event_data_file_name, server_port, server_processes):
+        server_process.join()
@@ -0,0 +1,63 @@
+"""
+Compares the seeding throughput of the basic and pipelined publish modes.
+Messages go to a temporary exchange and queue, so nothing reaches RH. This needs a RabbitMQ broker, which can be
+run locally with:
+    $ docker run -d -p 6672:5672 rabbitmq:3
+
+Run from the repository root:
+    $ python benchmarks/publish_throughput.py [number_of_cases]
+"""
+import csv
+import io
+import os
+import sys
+
+import pika
+
+sys.path.append(os.getcwd())
+from locust_tasks import RABBITMQ_URL, UAC_ROUTING_KEY, CASE_ROUTING_KEY
+from locust_tasks.publisher import PipelinedPublisher, publish_basic
+from locust_tasks.setup import generate_test_data_messages
+from benchmarks.fixtures import generate_event_data
+
+BENCHMARK_EXCHANGE = 'rh-perf-publish-benchmark'
+BENCHMARK_QUEUE = 'rh-perf-publish-benchmark'
+
+
+def declare_benchmark_queue():
+    """
+    Declares an exchange and queue for the benchmark messages, so that the broker routes and stores them as it
+    would for RH. Both are removed when the benchmark finishes.
+    """
+
+    connection = pika.BlockingConnection(pika.URLParameters(RABBITMQ_URL))
+    channel = connection.channel()
+    channel.exchange_declare(BENCHMARK_EXCHANGE, exchange_type='direct', auto_delete=True)
+    channel.queue_declare(BENCHMARK_QUEUE, auto_delete=True)
+    for routing_key in (UAC_ROUTING_KEY, CASE_ROUTING_KEY):
+        channel.queue_bind(BENCHMARK_QUEUE, BENCHMARK_EXCHANGE, routing_key)
+    return connection, channel
+
+
+def messages(event_data):
+    return generate_test_data_messages(csv.DictReader(io.StringIO(event_data, newline='')), 0)
+
+
+if __name__ == '__main__':
+    number_of_cases = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    event_data = generate_event_data(number_of_cases)
+
+    connection, channel = declare_benchmark_queue()
+    runs = (
+        ('basic', lambda: publish_basic(RABBITMQ_URL, BENCHMARK_EXCHANGE, messages(event_data))),
+        ('pipelined', lambda: PipelinedPublisher(RABBITMQ_URL, BENCHMARK_EXCHANGE).publish_all(messages(event_data))),
+    )
+
+    sys.stdout.write('Publishing %d cases (%d messages)\n' % (number_of_cases, number_of_cases * 2))
+    for name, publish in runs:
+        stats = publish()
+        sys.stdout.write('  %-10s %s\n' % (name, stats))
+        channel.queue_purge(BENCHMARK_QUEUE)
+
+    channel.queue_delete(BENCHMARK_QUEUE)
+    connection.close()
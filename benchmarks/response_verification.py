@@ -0,0 +1,84 @@
+"""
+Compares the time taken to verify a response with the shared response view against reading resp.text for each
+check, as verify_response() used to.
+
+Run from the repository root:
+    $ python benchmarks/response_verification.py [number_of_responses]
+"""
+import os
+import sys
+import time
+
+sys.path.append(os.getcwd())
+from locust_tasks.pages import Page, find_page
+from locust_tasks.response_view import ResponseView
+from benchmarks.fixtures import generate_page
+
+
+class Response:
+    """
+    Stands in for a requests Response. As with requests, the text is decoded from the content on every access.
+    """
+
+    def __init__(self, content):
+        self.content = content
+        self.encoding = 'utf-8'
+        self.status_code = 200
+
+    @property
+    def text(self):
+        return str(self.content, self.encoding, errors='replace')
+
+
+def verify_with_text(resp, expected_page, expected_content):
+    """
+    The checks made by verify_response(), reading resp.text for each as it used to.
+    """
+
+    if not resp.text:
+        return False
+    if find_page(resp.text) != expected_page:
+        return False
+    return expected_content in resp.text
+
+
+def verify_with_view(resp, expected_page, expected_content):
+    """
+    The checks made by verify_response(), sharing a response view.
+    """
+
+    view = ResponseView(resp)
+    if not view:
+        return False
+    if view.find_page() != expected_page:
+        return False
+    return view.contains(expected_content)
+
+
+def time_verification(verify, responses):
+    start = time.perf_counter()
+    for (resp, expected_page, expected_content) in responses:
+        if not verify(resp, expected_page, expected_content):
+            raise AssertionError('%s failed to verify a %s page' % (verify.__name__, expected_page.name))
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    number_of_responses = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+    # A mix of the pages in a request new code journey. The select address page is the largest.
+    journey = [
+        (Page.START, 'Enter your 16-character access code', 0),
+        (Page.ENTER_ADDRESS, 'Enter a postcode', 0),
+        (Page.SELECT_ADDRESS, 'I cannot find my address', 60),
+        (Page.ADDRESS_CORRECT, 'AB12 2ET', 0),
+        (Page.CONFIRM_MOBILE, '07700 900123', 0),
+    ]
+    pages = [(Response(generate_page(page, content, addresses)), page, content)
+             for (page, content, addresses) in journey]
+    responses = [pages[i % len(pages)] for i in range(number_of_responses)]
+
+    sys.stdout.write('Average page size %.1f KB\n' % (sum(len(p[0].content) for p in pages) / len(pages) / 1024))
+    for verify in (verify_with_text, verify_with_view):
+        elapsed = time_verification(verify, responses)
+        sys.stdout.write('%-18s %8.1f us per response\n' % (verify.__name__, elapsed / number_of_responses * 1e6))
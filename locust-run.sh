@@ -12,4 +12,9 @@ fi
 
 echo "$LOCUST $LOCUS_OPTS"
 
+# WORKER_PROCESSES runs several worker processes in the container, eg, 'auto' for one per core
+if [[ "$LOCUST_MODE" = "worker" && -n "$WORKER_PROCESSES" && "$WORKER_PROCESSES" != "1" ]]; then
+    exec python -m locust_tasks.launcher $LOCUST $LOCUS_OPTS
+fi
+
 $LOCUST $LOCUS_OPTS
\ No newline at end of file
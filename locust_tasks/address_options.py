@@ -0,0 +1,90 @@
+import re
+
+# The id and value of an address radio button on the select address page. The value holds the address as JSON,
+# with its quotes escaped as &#34;
+ADDRESS_OPTION = re.compile(r'id="([^"]*)"[^>]*value="([^"]*)"')
+ADDRESS_COUNT = re.compile(r'([0-9]*) addresses found for postcode', re.IGNORECASE)
+
+# RHUI lists no more than this many addresses for a postcode
+MAX_LISTED_ADDRESSES = 100
+
+
+class AddressOptions:
+    """
+    The address radio buttons on a select address page, keyed by UPRN.
+    Looking up an address searches the page for its radio button and copies out just its value, rather than
+    slicing off the rest of the page. The values found are kept, so looking an address up again doesn't rescan the
+    page. The whole page is only parsed when every address is asked for.
+    The values are held as they appear in the page and only unescaped when they're returned.
+    """
+
+    __slots__ = ('_page_content', '_values', '_parsed')
+
+    def __init__(self, page_content):
+        """
+        :param page_content: Is the text of a select address page.
+        """
+
+        self._page_content = page_content
+        self._values = {}
+        self._parsed = False
+
+    def __len__(self):
+        return len(self.get_all())
+
+    def __contains__(self, uprn):
+        return self.get(uprn) is not None
+
+    def get(self, uprn):
+        """
+        :param uprn: Is the UPRN of the address.
+        :return: The value of the address's radio button, or None if the address isn't listed.
+        """
+
+        value = self._values.get(uprn)
+        if value is None and not self._parsed:
+            value = self._find(uprn)
+        return unescape(value) if value is not None else None
+
+    def get_all(self):
+        """
+        :return: Dict of the value of every address's radio button, keyed by UPRN. The values are still escaped.
+        """
+
+        if not self._parsed:
+            self._values = dict(ADDRESS_OPTION.findall(self._page_content))
+            self._parsed = True
+        return self._values
+
+    def _find(self, uprn):
+        page_content = self._page_content
+        start = page_content.find('id="' + uprn + '"')
+        if start < 0:
+            return None
+
+        # The value must belong to the same input
+        value_start = page_content.find('value="', start)
+        if value_start < 0 or page_content.find('>', start, value_start) >= 0:
+            return None
+        value_start += len('value="')
+        value = page_content[value_start:page_content.find('"', value_start)]
+
+        self._values[uprn] = value
+        return value
+
+    def get_address_count(self):
+        """
+        :return: The number of addresses which the page says were found for the postcode, or None if the page
+        doesn't say. This can be more than the number listed.
+        """
+
+        count = ADDRESS_COUNT.search(self._page_content)
+        return int(count.group(1)) if count and count.group(1) else None
+
+
+def unescape(value):
+    """
+    :return: The address value with its quotes unescaped. The value is returned as it is if it has nothing escaped.
+    """
+
+    return value.replace('&#34;', '"') if '&' in value else value
@@ -0,0 +1,297 @@
+"""
+Starts journeys at a scheduled arrival rate, whatever the response times. This is an open model: the number of
+journeys started per second follows the schedule, rather than falling when RH slows down as it does when each user
+simply waits between journeys.
+
+The schedule file has one stage per line, as 'duration,rate' for a constant rate or 'duration,rate,end_rate' for a
+rate which ramps linearly from rate to end_rate. The duration is in seconds and the rates are journeys started per
+second, across all workers. Blank lines and lines starting with '#' are ignored. The test stops at the end of the
+last stage. For example, to ramp up to 50 journeys a second over 5 minutes and then hold for 10:
+    300,0,50
+    600,50
+
+The master runs ArrivalRateShape, which keeps enough users running to cover the rate. Each worker runs an
+ArrivalPacer, which holds its users back until their journeys are due. The workers interleave their journeys, so
+worker i of n starts journeys i, n + i, 2n + i and so on.
+"""
+import logging
+import math
+import time
+
+import gevent
+from locust import LoadTestShape
+
+from . import ARRIVAL_SCHEDULE, ARRIVAL_JOURNEY_TIME
+
+logger = logging.getLogger('performance')
+
+# A journey which can't start within this many seconds of when it was due is counted as missed, rather than being
+# started late. Otherwise a backlog of missed journeys would all start at once when users become free.
+MAX_START_LAG = 1.0
+
+
+class ArrivalSchedule:
+    """
+    The journey arrival rate over the course of a test.
+    """
+
+    def __init__(self, stages):
+        """
+        :param stages: Is a list of (duration, rate, end_rate) tuples.
+        """
+
+        self.stages = []
+        start = 0.0
+        arrivals = 0.0
+        for (duration, rate, end_rate) in stages:
+            self.stages.append((start, duration, rate, end_rate, arrivals))
+            start += duration
+            arrivals += duration * (rate + end_rate) / 2
+        self.duration = start
+        self.total_arrivals = arrivals
+
+    @classmethod
+    def read(cls, file_name):
+        """
+        Reads a schedule file.
+        :param file_name: Is the name of the schedule file.
+        :return: The ArrivalSchedule.
+        :raises ValueError: if the file doesn't hold a valid schedule.
+        """
+
+        stages = []
+        with open(file_name) as schedule_file:
+            for (line_num, line) in enumerate(schedule_file, 1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                try:
+                    values = [float(value) for value in line.split(',')]
+                except ValueError:
+                    values = []
+                if len(values) not in (2, 3) or min(values) < 0:
+                    raise ValueError('%s line %d: expected duration,rate[,end_rate] but got: %s'
+                                     % (file_name, line_num, line))
+                stages.append((values[0], values[1], values[-1]))
+
+        if not stages:
+            raise ValueError('%s holds no stages' % file_name)
+        return cls(stages)
+
+    def rate_at(self, run_time):
+        """
+        :param run_time: Is the number of seconds since the test started.
+        :return: The arrival rate at that time, or None if the schedule has ended.
+        """
+
+        for (start, duration, rate, end_rate, _) in self.stages:
+            if run_time < start + duration:
+                return rate + (end_rate - rate) * (run_time - start) / duration
+        return None
+
+    def max_rate_between(self, from_time, to_time):
+        """
+        :return: The highest arrival rate between two times. The rate peaks at the start or end of a stage.
+        """
+
+        rates = [rate for rate in (self.rate_at(from_time), self.rate_at(to_time)) if rate is not None]
+        for (start, duration, rate, end_rate, _) in self.stages:
+            if start + duration > from_time and start < to_time:
+                rates.extend((rate, end_rate))
+        return max(rates, default=0.0)
+
+    def arrivals_by(self, run_time):
+        """
+        :param run_time: Is the number of seconds since the test started.
+        :return: The number of journeys which should have started by then. This is fractional.
+        """
+
+        for (start, duration, rate, end_rate, arrivals) in self.stages:
+            if run_time < start + duration:
+                elapsed = max(0.0, run_time - start)
+                return arrivals + elapsed * (rate + (end_rate - rate) * elapsed / duration / 2)
+        return self.total_arrivals
+
+    def arrival_time(self, arrival):
+        """
+        Works out when a journey is due to start.
+        :param arrival: Is the number of the journey, counting from 1.
+        :return: The number of seconds after the start of the test that the journey is due, or None if the
+        schedule ends first.
+        """
+
+        if arrival > self.total_arrivals:
+            return None
+
+        for (start, duration, rate, end_rate, arrivals) in self.stages:
+            stage_arrivals = duration * (rate + end_rate) / 2
+            if arrival > arrivals + stage_arrivals:
+                continue
+
+            # Solve rate * t + ramp * t^2 = remaining for the time t into the stage
+            remaining = arrival - arrivals
+            ramp = (end_rate - rate) / duration / 2
+            if abs(ramp) < 1e-12:
+                return start + remaining / rate
+            return start + (math.sqrt(max(0.0, rate * rate + 4 * ramp * remaining)) - rate) / (2 * ramp)
+        return None
+
+
+class ArrivalPacer:
+    """
+    Holds each user back until its next journey is due, and counts how well the intended arrivals were met.
+    """
+
+    def __init__(self, schedule, instance_num, num_instances):
+        """
+        :param schedule: Is the ArrivalSchedule for the whole test.
+        :param instance_num: Is the number of this worker. Numbered from 1.
+        :param num_instances: Is the number of workers.
+        """
+
+        self.schedule = schedule
+        self.instance_num = instance_num
+        self.num_instances = num_instances
+        self.start_time = None
+        self._next_arrival = 0
+        self._share_start = 0
+        self._intended_before = 0
+        self.started = 0
+        self.missed = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+
+    def start(self):
+        """
+        Starts the schedule. Called when the test starts.
+        """
+
+        self.start_time = time.monotonic()
+        self._next_arrival = 0
+        self._share_start = 0
+        self._intended_before = 0
+        self.started = 0
+        self.missed = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+
+    def set_share(self, instance_num, num_instances):
+        """
+        Changes this worker's share of the journeys, eg, when workers join or leave. The worker carries on from the
+        current point in the schedule.
+        :param instance_num: Is the new number of this worker. Numbered from 1.
+        :param num_instances: Is the new number of workers.
+        """
+
+        if (instance_num, num_instances) == (self.instance_num, self.num_instances):
+            return
+
+        if self.start_time is not None:
+            arrivals = int(self.schedule.arrivals_by(time.monotonic() - self.start_time))
+            self._intended_before = self._count_intended(arrivals)
+            self._share_start = arrivals
+            # The first journey of the new share which isn't yet due
+            self._next_arrival = max(0, -(-(arrivals + 1 - instance_num) // num_instances))
+
+        self.instance_num = instance_num
+        self.num_instances = num_instances
+
+    def _count_intended(self, arrivals):
+        """
+        :param arrivals: Is the number of journeys of the whole schedule due so far.
+        :return: The number of them which were this worker's.
+        """
+
+        def count_share(arrival):
+            return (arrival - self.instance_num) // self.num_instances + 1 if arrival >= self.instance_num else 0
+
+        return self._intended_before + count_share(arrivals) - count_share(self._share_start)
+
+    def _arrival_time(self, arrival):
+        # This worker's journeys are every num_instances'th journey of the whole schedule
+        return self.schedule.arrival_time(arrival * self.num_instances + self.instance_num)
+
+    def wait_for_start(self):
+        """
+        Waits until the next journey is due.
+        :return: True when the journey should start, or False if the schedule has ended.
+        """
+
+        if self.start_time is None:
+            self.start()
+
+        while True:
+            arrival = self._next_arrival
+            self._next_arrival += 1
+            due = self._arrival_time(arrival)
+            if due is None:
+                return False
+
+            lag = time.monotonic() - self.start_time - due
+            if lag <= MAX_START_LAG:
+                break
+            self.missed += 1
+
+        if lag < 0:
+            gevent.sleep(-lag)
+            lag = 0.0
+
+        self.started += 1
+        self.total_lag += lag
+        self.max_lag = max(self.max_lag, lag)
+        return True
+
+    def get_counts(self):
+        """
+        :return: Dict of the number of journeys intended and started so far by this worker, plus how late they were.
+        """
+
+        run_time = time.monotonic() - self.start_time if self.start_time is not None else 0.0
+        arrivals = int(self.schedule.arrivals_by(run_time))
+
+        return {
+            'intended': self._count_intended(arrivals),
+            'started': self.started,
+            'missed': self.missed,
+            'total_lag': self.total_lag,
+            'max_lag': self.max_lag,
+        }
+
+
+class ArrivalRateShape(LoadTestShape):
+    """
+    Keeps enough users running to start journeys at the scheduled rate. Each journey holds a user for up to
+    ARRIVAL_JOURNEY_TIME seconds, so this is the rate over the next journey time multiplied by the journey time.
+    The users only start journeys when the workers' ArrivalPacers allow, so spare users just wait.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.schedule = ArrivalSchedule.read(ARRIVAL_SCHEDULE)
+        self.journey_time = float(ARRIVAL_JOURNEY_TIME)
+
+    def tick(self):
+        run_time = self.get_run_time()
+        if run_time >= self.schedule.duration:
+            return None
+
+        user_count = max(1, math.ceil(self.schedule.max_rate_between(run_time, run_time + self.journey_time)
+                                      * self.journey_time))
+        return user_count, min(user_count, 100)
+
+
+def sum_arrival_counts(counts_by_worker):
+    """
+    Totals the arrival counts reported by the workers, and also lists them by worker.
+    """
+
+    totals = {'intended': 0, 'started': 0, 'missed': 0, 'total_lag': 0.0, 'max_lag': 0.0}
+    for counts in counts_by_worker.values():
+        for name in ('intended', 'started', 'missed', 'total_lag'):
+            totals[name] += counts.get(name, 0)
+        totals['max_lag'] = max(totals['max_lag'], counts.get('max_lag', 0.0))
+
+    totals['gap'] = totals['intended'] - totals['started']
+    totals['mean_lag'] = totals['total_lag'] / totals['started'] if totals['started'] else 0.0
+    totals['workers'] = counts_by_worker
+    return totals
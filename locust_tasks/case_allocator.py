@@ -0,0 +1,274 @@
+import logging
+import time
+from collections import deque
+
+from gevent.event import Event
+
+logger = logging.getLogger('performance')
+
+# Exhaustion policies. These decide what happens when a user wants a case but every case is already leased.
+#   wrap  - Share a case with another user, going round the cases in turn. Matches the original behaviour.
+#   stop  - Stop the user.
+#   block - Wait for another user to return a case. The user is stopped if none is returned within the timeout.
+WRAP = 'wrap'
+STOP_USER = 'stop'
+BLOCK = 'block'
+EXHAUSTION_POLICIES = (WRAP, STOP_USER, BLOCK)
+
+
+class CasesExhausted(Exception):
+    """
+    Raised when a case can't be leased under the current exhaustion policy.
+    """
+
+
+def refill(pool, indices):
+    """
+    Replaces the contents of a pool of available cases. The pool is changed in place, as users waiting for a case
+    hold on to it.
+    :param pool: Is the deque of case indices.
+    :param indices: Is the list of case indices to put in it.
+    """
+
+    pool.clear()
+    pool.extend(indices)
+
+
+class CaseAllocator:
+    """
+    Leases cases to users, so that a case is only used by one user at a time.
+    A user holds its case for the length of a journey and returns it when the journey completes or is interrupted.
+    Returned cases go to the back of the queue, so the cases are still used in turn.
+    Users run as greenlets, so the lease and release operations can't be interrupted part way through.
+
+    Cases whose address RH won't list, because there are too many addresses at the postcode, are kept apart. A
+    journey which has to pick its address from the list only leases listed cases, and other journeys use the
+    unlisted cases first, which leaves the listed cases free for the journeys that need them.
+
+    When the master hands out the cases, cases can be added while the users are running, and cases can be retired so
+    that they're given back to the master. A retired case is never leased again, and once it's returned its space in
+    the store can be freed by compact().
+    """
+
+    def __init__(self, cases, policy=WRAP, block_timeout=None, unlisted=()):
+        """
+        :param cases: Is the store of cases owned by this worker.
+        :param policy: Is the exhaustion policy. One of EXHAUSTION_POLICIES.
+        :param block_timeout: Is the maximum number of seconds that a user waits for a case under the block policy.
+        None means wait for ever.
+        :param unlisted: Is the indices of the cases whose addresses aren't listed by RH.
+        """
+
+        if policy not in EXHAUSTION_POLICIES:
+            raise ValueError('Unknown case exhaustion policy: %s' % policy)
+
+        self.cases = cases
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.exhausted_count = 0
+        self.shared_count = 0
+        self.unlisted = set(unlisted)
+        self.journeys_saved = 0.0
+        self.retired = set()
+        self._available = deque(index for index in range(len(cases)) if index not in self.unlisted)
+        self._available_unlisted = deque(sorted(self.unlisted))
+        # The Cases held by users, by index. Kept so that they can be renumbered when the store is compacted.
+        self._leases = {}
+        self._next_shared = 0
+        self._released = Event()
+
+    @property
+    def leased_count(self):
+        return len(self._leases)
+
+    @property
+    def freeable_count(self):
+        """
+        :return: The number of retired cases which have been returned, and so would be removed by compact().
+        """
+        return len(self.retired) - sum(1 for index in self._leases if index in self.retired)
+
+    @property
+    def available_count(self):
+        return len(self._available) + len(self._available_unlisted)
+
+    def lease(self, listed_only=False):
+        """
+        Leases the next available case.
+        :param listed_only: Is True if the journey needs a case whose address RH lists.
+        :return: The leased Case.
+        :raises CasesExhausted: if no case could be leased.
+        """
+
+        # If every case is unlisted then the journey has to make do with one
+        listed_only = listed_only and len(self.unlisted) < len(self.cases)
+        pools = (self._available,) if listed_only else (self._available_unlisted, self._available)
+
+        deadline = None
+        if not any(pools):
+            self.exhausted_count += 1
+            # A waiter which loses the race for a returned case carries on waiting, but only until the deadline
+            if self.block_timeout is not None:
+                deadline = time.monotonic() + self.block_timeout
+
+        while not any(pools):
+            if not self._leases:
+                raise CasesExhausted('There are no cases to lease')
+            if self.policy == WRAP:
+                return self._lease_shared(listed_only)
+            if self.policy == STOP_USER:
+                raise CasesExhausted('All %d cases are leased' % len(self._leases))
+
+            timeout = None if deadline is None else deadline - time.monotonic()
+            self._released.clear()
+            if (timeout is not None and timeout <= 0) or not self._released.wait(timeout):
+                raise CasesExhausted('No case returned within %s seconds' % self.block_timeout)
+
+        if listed_only:
+            self._count_journey_saved()
+
+        index = (pools[0] or pools[-1]).popleft()
+        case = self.cases[index]
+        self._leases[index] = [case]
+        return case
+
+    def release(self, case):
+        """
+        Returns a leased case. Returning a case which is not leased has no effect.
+        :param case: Is the Case to return.
+        """
+
+        holders = self._leases.get(case.index)
+        if not holders:
+            return
+        if len(holders) > 1:
+            holders.remove(case if case in holders else holders[0])
+            return
+
+        del self._leases[case.index]
+        if case.index in self.retired:
+            return
+        if case.index in self.unlisted:
+            self._available_unlisted.append(case.index)
+        else:
+            self._available.append(case.index)
+        self._released.set()
+
+    def add_cases(self, indices, unlisted=()):
+        """
+        Makes more cases available for lease, once they've been added to the store.
+        :param indices: Is the indices of the new cases.
+        :param unlisted: Is the indices of the new cases whose addresses aren't listed by RH.
+        """
+
+        unlisted = set(unlisted)
+        self.unlisted.update(unlisted)
+        for index in indices:
+            if index in unlisted:
+                self._available_unlisted.append(index)
+            else:
+                self._available.append(index)
+        self._released.set()
+
+    def retire_available(self, count):
+        """
+        Retires up to count of the available cases. Listed cases are kept back, if there are enough unlisted ones.
+        :return: List of the indices of the retired cases.
+        """
+
+        retired = []
+        for pool in (self._available_unlisted, self._available):
+            while pool and len(retired) < count:
+                retired.append(pool.pop())
+        self.retired.update(retired)
+        return retired
+
+    def retire_all(self, end):
+        """
+        Retires every case before the given index, including the leased ones, which are retired when they're returned.
+        :param end: Is the index of the first case to keep.
+        :return: The number of cases retired.
+        """
+
+        retired = set(range(end)) - self.retired
+        self.retired.update(retired)
+        refill(self._available, [index for index in self._available if index >= end])
+        refill(self._available_unlisted, [index for index in self._available_unlisted if index >= end])
+        return len(retired)
+
+    def compact(self):
+        """
+        Removes the retired cases which have been returned from the store, so that the store doesn't keep growing as
+        cases are given back and new ones added. The cases which are kept are renumbered, including those held by
+        users.
+        :return: List of the old index of each case which is kept, in its new order.
+        """
+
+        keep = [index for index in range(len(self.cases)) if index not in self.retired or index in self._leases]
+        new_indices = {index: new_index for (new_index, index) in enumerate(keep)}
+        self.cases.keep_cases(keep)
+
+        refill(self._available, [new_indices[index] for index in self._available])
+        refill(self._available_unlisted, [new_indices[index] for index in self._available_unlisted])
+        self.unlisted = {new_indices[index] for index in self.unlisted if index in new_indices}
+        self.retired = {new_indices[index] for index in self.retired if index in new_indices}
+        leases = {}
+        for (index, holders) in self._leases.items():
+            for case in holders:
+                case.index = new_indices[index]
+            leases[new_indices[index]] = holders
+        self._leases = leases
+        self._next_shared = 0
+        return keep
+
+    def _lease_shared(self, listed_only):
+        """
+        Leases a case which is already leased to another user. Only used when every case is leased.
+        :param listed_only: Is True if the journey needs a case whose address RH lists.
+        :return: The leased Case.
+        """
+
+        if not self.shared_count:
+            logger.warning('All %d cases are leased. Cases will be shared between users' % len(self._leases))
+        self.shared_count += 1
+
+        # Every case which isn't retired is leased at this point, so just go round them in turn
+        index = self._next_shared
+        for _ in range(len(self.cases)):
+            if index in self._leases and not (listed_only and index in self.unlisted):
+                break
+            index = (index + 1) % len(self.cases)
+        else:
+            index = next(iter(self._leases))
+        self._next_shared = (index + 1) % len(self.cases)
+
+        if listed_only:
+            self._count_journey_saved()
+
+        case = self.cases[index]
+        self._leases[index].append(case)
+        return case
+
+    def _count_journey_saved(self):
+        """
+        Counts the journeys which would have failed without the unlisted cases being kept apart. Without that the
+        cases would be used in turn, so this is the chance that the journey would have got an unlisted case.
+        """
+
+        self.journeys_saved += len(self.unlisted) / len(self.cases)
+
+    def get_counts(self):
+        """
+        :return: Dict holding the live number of leased and available cases, plus how often cases ran out and the
+        number of journeys saved by avoiding unlisted cases.
+        """
+
+        return {
+            'leased': self.leased_count,
+            'available': self.available_count,
+            'exhausted': self.exhausted_count,
+            'shared': self.shared_count,
+            'unlisted': len(self.unlisted),
+            'retired': len(self.retired),
+            'journeys_saved': int(self.journeys_saved),
+        }
@@ -0,0 +1,407 @@
+"""
+Hands the cases out from the master to the workers in chunks, so that the workers don't need their own copy of the
+event data file and don't need to be told which section of it is theirs.
+
+The master reads the event data file once, and gives each case to one worker at a time. A worker fetches its first
+chunk when it starts, and then fetches another whenever fewer than half a chunk of its cases are free. A worker only
+has one fetch in flight, and only fetches when it's running short, so a worker can't take more than its share of the
+cases while other workers still need them.
+
+The workers can come and go during a run, so the master rebalances the cases:
+  - The cases held by a worker which quits, or which stops sending heartbeats, are taken back and handed out again.
+    If an evicted worker comes back it's told to drop its cases and start again.
+  - If a worker runs short once every case has been handed out, the workers holding more than their fair share are
+    asked to give the extra back. Each worker syncs with the master every few seconds, even when it isn't short, so
+    it gets these requests. It stops using the cases before giving them back, so a case is never used by two workers.
+
+Locust 1.3 can't send custom messages between the master and the workers, so the chunks are fetched from the
+master's web UI, on CASE_CHUNKS_PATH, and the syncs are requests for no cases.
+"""
+import logging
+import time
+from array import array
+from collections import deque
+
+import gevent
+import requests
+from gevent.event import Event
+
+from .case_store import CASE_FIELDS
+
+logger = logging.getLogger('performance')
+
+CASE_CHUNKS_PATH = '/case-chunks'
+
+# Distribution modes. These decide where a worker gets its cases from.
+#   file   - Each worker reads its own section of the event data file, given by INSTANCE_NUM and MAX_INSTANCES.
+#   master - The master reads the event data file and hands the cases out to the workers.
+FILE = 'file'
+MASTER = 'master'
+DISTRIBUTION_MODES = (FILE, MASTER)
+
+# The reasons for rebalancing the cases, which are counted in the metrics
+WORKER_JOINED = 'worker_joined'
+WORKER_LEFT = 'worker_left'
+WORKER_EVICTED = 'worker_evicted'
+RELEASE_REQUESTED = 'release_requested'
+REBALANCE_REASONS = (WORKER_JOINED, WORKER_LEFT, WORKER_EVICTED, RELEASE_REQUESTED)
+
+# The seconds a worker which has fetched cases may be unknown to the master's runner, before its cases are taken back.
+# A worker's first fetch can arrive before the runner has seen it.
+UNKNOWN_WORKER_GRACE = 10.0
+
+NO_OWNER = -1
+
+
+class CaseSource:
+    """
+    Hands out the master's cases a chunk at a time, and keeps track of which worker holds each case.
+    """
+
+    def __init__(self, cases, unlisted, chunk_size):
+        """
+        :param cases: Is the store holding every case from the event data file.
+        :param unlisted: Is the indices of the cases whose addresses aren't listed by RH.
+        :param chunk_size: Is the most cases handed out in one chunk.
+        """
+
+        self.cases = cases
+        self.unlisted = frozenset(unlisted)
+        self.chunk_size = chunk_size
+        self.next_index = 0
+        self.holdings = {}
+        self.rebalance_counts = dict.fromkeys(REBALANCE_REASONS, 0)
+        self.reassigned_count = 0
+        # The number of the worker holding each case. Numbers are used, rather than IDs, to keep this compact.
+        self._owners = array('i', [NO_OWNER]) * len(cases)
+        self._worker_numbers = {}
+        self._returned = deque()
+        self._release_requests = {}
+        self._evicted = set()
+        self._last_seen = {}
+
+    @property
+    def unassigned_count(self):
+        return len(self.cases) - self.next_index + len(self._returned)
+
+    def take_chunk(self, worker_id, max_count, released=()):
+        """
+        Hands the next cases out to a worker, once it has given back any cases it was asked to.
+        :param worker_id: Is the worker's client ID.
+        :param max_count: Is the most cases the worker wants. 0 just syncs the worker with the master.
+        :param released: Is the indices of the cases the worker has given back.
+        :return: Dict holding the case fields, the indices and field values of the cases, the positions in the chunk
+        of the unlisted cases, the number of cases which are free, the number of cases the worker should give back,
+        and whether the worker should drop all of its cases.
+        """
+
+        self._last_seen[worker_id] = time.monotonic()
+        reset = worker_id in self._evicted
+        if reset:
+            # The worker's cases have already been handed out again, so anything it gives back is out of date
+            self._evicted.discard(worker_id)
+            released = ()
+            logger.info(f'Worker {worker_id} is back after being evicted. It will start again with new cases')
+
+        self._take_back(worker_id, released)
+        self.holdings.setdefault(worker_id, 0)
+
+        indices = self._next_free_indices(max_count)
+        number = self._get_worker_number(worker_id)
+        for index in indices:
+            self._owners[index] = number
+        self.holdings[worker_id] += len(indices)
+
+        if max_count and len(indices) < max_count:
+            self._request_releases(worker_id)
+
+        rows = []
+        for index in indices:
+            case = self.cases[index]
+            rows.append([getattr(case, field) for field in CASE_FIELDS])
+
+        return {
+            'fields': list(CASE_FIELDS),
+            'indices': indices,
+            'rows': rows,
+            'unlisted': [position for (position, index) in enumerate(indices) if index in self.unlisted],
+            'remaining': self.unassigned_count,
+            'release': self._release_requests.get(worker_id, 0),
+            'reset': reset,
+        }
+
+    def update_workers(self, connected, missing):
+        """
+        Takes the cases back from the workers which have gone, so they can be handed out again.
+        :param connected: Is the IDs of the workers the runner knows of, which are sending heartbeats.
+        :param missing: Is the IDs of the workers the runner knows of, which have stopped sending heartbeats.
+        """
+
+        now = time.monotonic()
+        for worker_id in list(self.holdings):
+            if worker_id in missing:
+                reason = WORKER_EVICTED
+                self._evicted.add(worker_id)
+            elif worker_id not in connected and now - self._last_seen.get(worker_id, 0.0) > UNKNOWN_WORKER_GRACE:
+                reason = WORKER_LEFT
+            else:
+                continue
+
+            count = self._reclaim(worker_id)
+            self.rebalance_counts[reason] += 1
+            logger.info(f'Worker {worker_id} has gone ({reason}). {count} of its cases will be handed out again')
+
+        for worker_id in connected:
+            if worker_id not in self._last_seen:
+                self._last_seen[worker_id] = now
+                if self.holdings:
+                    self.rebalance_counts[WORKER_JOINED] += 1
+
+    def _next_free_indices(self, max_count):
+        count = max(0, min(max_count, self.chunk_size, self.unassigned_count))
+        indices = []
+        while self._returned and len(indices) < count:
+            indices.append(self._returned.popleft())
+        first = self.next_index
+        self.next_index += count - len(indices)
+        indices.extend(range(first, self.next_index))
+        return indices
+
+    def _get_worker_number(self, worker_id):
+        if worker_id not in self._worker_numbers:
+            self._worker_numbers[worker_id] = len(self._worker_numbers)
+        return self._worker_numbers[worker_id]
+
+    def _take_back(self, worker_id, released):
+        """
+        Returns the cases a worker has given back to the free cases. Cases the worker no longer holds are ignored.
+        """
+
+        number = self._worker_numbers.get(worker_id)
+        count = 0
+        for index in released:
+            if 0 <= index < len(self.cases) and self._owners[index] == number:
+                self._owners[index] = NO_OWNER
+                self._returned.append(index)
+                count += 1
+        if count:
+            self.holdings[worker_id] -= count
+            self.reassigned_count += count
+            outstanding = self._release_requests.pop(worker_id, 0) - count
+            if outstanding > 0:
+                self._release_requests[worker_id] = outstanding
+
+    def _reclaim(self, worker_id):
+        """
+        Takes back all of a worker's cases.
+        :return: The number of cases taken back.
+        """
+
+        number = self._worker_numbers.get(worker_id)
+        count = self.holdings.pop(worker_id, 0)
+        self._release_requests.pop(worker_id, None)
+        if count:
+            for (index, owner) in enumerate(self._owners):
+                if owner == number:
+                    self._owners[index] = NO_OWNER
+                    self._returned.append(index)
+            self.reassigned_count += count
+        return count
+
+    def _request_releases(self, worker_id):
+        """
+        Asks the workers holding more than their fair share of the cases to give the extra back, so that a worker
+        which is short can have them.
+        """
+
+        fair_share = len(self.cases) // max(1, len(self.holdings))
+        if self.holdings[worker_id] + self.unassigned_count >= fair_share:
+            return
+
+        requested = False
+        for (other_id, held) in self.holdings.items():
+            extra = held - self._release_requests.get(other_id, 0) - fair_share
+            if other_id != worker_id and extra > 0:
+                self._release_requests[other_id] = self._release_requests.get(other_id, 0) + extra
+                requested = True
+        if requested:
+            self.rebalance_counts[RELEASE_REQUESTED] += 1
+
+    def get_counts(self):
+        """
+        :return: Dict holding the number of cases, the number held by the workers and free, the number held by each
+        worker, the number of times the cases were rebalanced for each reason, and the number of cases taken back
+        from one worker to be handed out again.
+        """
+
+        return {
+            'total': len(self.cases),
+            'handed_out': len(self.cases) - self.unassigned_count,
+            'remaining': self.unassigned_count,
+            'workers': dict(self.holdings),
+            'rebalances': dict(self.rebalance_counts),
+            'reassigned': self.reassigned_count,
+        }
+
+
+def get_arrival_share(worker_id, connected):
+    """
+    Splits the journeys of an arrival schedule between the workers the master has now.
+    :param worker_id: Is the worker's client ID.
+    :param connected: Is the IDs of the workers which are sending heartbeats.
+    :return: Tuple of the number of the worker, numbered from 1, and the number of workers.
+    """
+
+    worker_ids = sorted(set(connected) | {worker_id})
+    return worker_ids.index(worker_id) + 1, len(worker_ids)
+
+
+class CaseFeed:
+    """
+    Fetches chunks of cases from the master into a worker's case store, whenever the worker is running short, and
+    gives cases back when the master asks for them.
+    """
+
+    def __init__(self, url, worker_id, chunk_size, poll_interval=0.5, sync_interval=3.0, request_timeout=30.0):
+        """
+        :param url: Is the base URL of the master's web UI.
+        :param worker_id: Is the worker's client ID.
+        :param chunk_size: Is the number of cases to fetch at a time.
+        :param poll_interval: Is the number of seconds between checks of the number of free cases.
+        :param sync_interval: Is the most seconds between requests to the master.
+        :param request_timeout: Is the number of seconds to wait for the master to send a chunk.
+        """
+
+        self.url = url.rstrip('/') + CASE_CHUNKS_PATH
+        self.worker_id = worker_id
+        self.chunk_size = chunk_size
+        self.low_water = max(1, chunk_size // 2)
+        self.poll_interval = poll_interval
+        self.sync_interval = sync_interval
+        self.request_timeout = request_timeout
+        self.master_has_cases = True
+        self.fetched = 0
+        self.released = 0
+        # This worker's share of the arrival schedule, from the master, and a function to call when it changes
+        self.arrival_share = None
+        self.on_arrival_share = None
+        # The master's index of each case in the store
+        self.source_indices = array('I')
+        self._to_release = []
+        self._next_sync = 0.0
+        self._session = requests.Session()
+        self._stop_event = Event()
+        self._feed_greenlet = None
+
+    def fetch_first_chunk(self, cases, wait_timeout):
+        """
+        Fetches the first chunk into the case store, retrying until the master's web UI is up and has cases for this
+        worker. A worker which joins once every case has been handed out gets an empty chunk, until the workers with
+        more than their share have given some back.
+        :param cases: Is the worker's case store.
+        :param wait_timeout: Is the most seconds to keep retrying for.
+        :return: The unlisted case indices. The store is still empty if the master had no cases in time.
+        :raises requests.RequestException: if the master didn't send a chunk in time.
+        """
+
+        deadline = time.monotonic() + wait_timeout
+        while True:
+            try:
+                (unlisted, _) = self.fetch_chunk(cases, self.chunk_size)
+                if len(cases) or time.monotonic() >= deadline:
+                    return unlisted
+                logger.info('Waiting for the master to free some cases for this worker')
+                gevent.sleep(self.sync_interval)
+            except requests.RequestException as e:
+                if time.monotonic() >= deadline:
+                    raise
+                logger.info(f'Waiting for cases from the master at {self.url}: {e}')
+                gevent.sleep(2.0)
+
+    def fetch_chunk(self, cases, max_count):
+        """
+        Fetches the next chunk from the master and adds it to the case store. Any cases given back are sent with the
+        request.
+        :param cases: Is the worker's case store.
+        :param max_count: Is the most cases to fetch.
+        :return: Tuple of the indices in the store of the unlisted cases in the chunk, and the response from the
+        master.
+        """
+
+        (released, self._to_release) = (self._to_release, [])
+        try:
+            response = self._session.post(self.url, json={'worker': self.worker_id, 'max_cases': max_count,
+                                                          'released': released}, timeout=self.request_timeout)
+            response.raise_for_status()
+            chunk = response.json()
+        except (requests.RequestException, ValueError):
+            # Try again next time, as the cases are no use to this worker now
+            self._to_release = released + self._to_release
+            raise
+        self._next_sync = time.monotonic() + self.sync_interval
+        self.released += len(released)
+
+        first = len(cases)
+        cases.append_rows(chunk['rows'], chunk['fields'])
+        self.source_indices.extend(chunk['indices'])
+        self.fetched += len(chunk['rows'])
+        if self.master_has_cases and not chunk['remaining']:
+            logger.info(f'The master has no more free cases. This worker has {len(cases)}')
+        self.master_has_cases = chunk['remaining'] > 0
+
+        share = tuple(chunk.get('arrival_share') or ())
+        if share and share != self.arrival_share:
+            self.arrival_share = share
+            if self.on_arrival_share:
+                self.on_arrival_share(*share)
+
+        return [first + position for position in chunk['unlisted']], chunk
+
+    def start(self, case_allocator):
+        """
+        Starts the greenlet which keeps the allocator topped up with cases.
+        """
+
+        if self._feed_greenlet is None:
+            self._stop_event.clear()
+            self._feed_greenlet = gevent.spawn(self._feed_loop, case_allocator)
+
+    def stop(self):
+        if self._feed_greenlet is not None:
+            self._stop_event.set()
+            self._feed_greenlet.join()
+            self._feed_greenlet = None
+
+    def _feed_loop(self, case_allocator):
+        while not self._stop_event.wait(self.poll_interval):
+            # The cases given back to the master are dropped from the store, so it stays the size of this worker's share
+            if case_allocator.freeable_count >= max(self.chunk_size, len(case_allocator.cases) // 2):
+                self._compact(case_allocator)
+
+            short = case_allocator.available_count < self.low_water
+            if not (short and self.master_has_cases) and time.monotonic() < self._next_sync:
+                continue
+
+            first = len(case_allocator.cases)
+            try:
+                (unlisted, chunk) = self.fetch_chunk(case_allocator.cases, self.chunk_size if short else 0)
+            except (requests.RequestException, ValueError) as e:
+                logger.warning(f'Failed to fetch cases from the master: {e}')
+                self._next_sync = time.monotonic() + self.sync_interval
+                continue
+
+            if chunk['reset']:
+                dropped = case_allocator.retire_all(end=first)
+                logger.warning(f'The master has taken back all of this worker\'s cases. {dropped} cases dropped')
+            case_allocator.add_cases(range(first, len(case_allocator.cases)), unlisted)
+
+            if chunk['release']:
+                retired = case_allocator.retire_available(chunk['release'] - len(self._to_release))
+                self._to_release.extend(self.source_indices[index] for index in retired)
+                # Give them straight back, rather than waiting for the next sync
+                self._next_sync = 0.0
+
+    def _compact(self, case_allocator):
+        keep = case_allocator.compact()
+        self.source_indices = array('I', (self.source_indices[index] for index in keep))
+        logger.info(f'Removed the cases given back to the master. This worker has {len(keep)} cases')
@@ -0,0 +1,239 @@
+import mmap
+import os
+import struct
+from array import array
+
+# The case fields which are used by the task sets. Other event data columns are only needed for seeding, so they
+# are not kept by the workers.
+CASE_FIELDS = ('uac', 'uprn', 'postcode', 'address_line_1', 'phone_number', 'first_name', 'last_name')
+
+# A case file starts with the magic number and the number of cases. Then for each field there's an array of the end
+# offsets, followed by the values, padded to keep the next array aligned. The arrays are in the machine's byte order,
+# so a case file is only for use on the machine it was written on.
+CASE_FILE_MAGIC = b'RHCASES1'
+CASE_FILE_HEADER = struct.Struct('=8sI4x')
+OFFSET_SIZE = array('I').itemsize
+
+# Alternative event data column names for some fields. The first name found in the header is used.
+COLUMN_NAMES = {
+    'address_line_1': ('address_line_1', 'addressLine1'),
+}
+
+
+class Case:
+    """
+    The data for a single case, as used by the task sets.
+    A Case is built on demand from the CaseStore, so holding on to one doesn't cost any more than a regular object.
+    """
+
+    __slots__ = ('index',) + CASE_FIELDS
+
+    def __init__(self, index, *values):
+        self.index = index
+        for field, value in zip(CASE_FIELDS, values):
+            setattr(self, field, value)
+
+    def __repr__(self):
+        return 'Case(index=%d, uac=%r, uprn=%r, postcode=%r)' % (self.index, self.uac, self.uprn, self.postcode)
+
+
+class CaseStore:
+    """
+    Compact storage for the cases owned by this worker.
+    Rather than holding a dict of strings per case, each field is held as a column. A column is one buffer of
+    UTF-8 bytes for all cases, plus an array holding the end offset of each case's value.
+    """
+
+    def __init__(self):
+        self._columns = [bytearray() for _ in CASE_FIELDS]
+        self._ends = [array('I') for _ in CASE_FIELDS]
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        """
+        Builds a Case for the case at the given position in the store.
+        :param index: Is the position of the case, numbered from 0.
+        :return: A Case object.
+        """
+
+        if index < 0:
+            index += self._count
+        if index < 0 or index >= self._count:
+            raise IndexError('case index out of range')
+
+        values = []
+        for column, ends in zip(self._columns, self._ends):
+            start = ends[index - 1] if index else 0
+            values.append(column[start:ends[index]].decode('utf-8'))
+        return Case(index, *values)
+
+    def iter_values(self, field):
+        """
+        Reads one field for every case, without building the Cases.
+        :param field: Is the name of the case field.
+        :return: Generator of the field's values, in case order.
+        """
+
+        position = CASE_FIELDS.index(field)
+        column = self._columns[position]
+        start = 0
+        for end in self._ends[position]:
+            yield column[start:end].decode('utf-8')
+            start = end
+
+    def append_rows(self, rows, fieldnames):
+        """
+        Adds cases to the store.
+        :param rows: Is an iterable of CSV rows, each of which is a list of column values.
+        :param fieldnames: Is the list of column names from the event data file header.
+        """
+
+        positions = [find_column(fieldnames, field) for field in CASE_FIELDS]
+        stores = list(zip(positions, self._columns, self._ends))
+
+        for row in rows:
+            if not row:
+                continue
+            for position, column, ends in stores:
+                if position is not None and position < len(row):
+                    column += row[position].encode('utf-8')
+                ends.append(len(column))
+            self._count += 1
+
+    def clear(self):
+        """
+        Removes all cases from the store.
+        """
+
+        self.__init__()
+
+    def keep_cases(self, indices):
+        """
+        Removes all but the given cases from the store. The cases which are kept are renumbered in the given order.
+        :param indices: Is the indices of the cases to keep.
+        """
+
+        columns = [bytearray() for _ in CASE_FIELDS]
+        ends = [array('I') for _ in CASE_FIELDS]
+        for (old_column, old_ends, column, new_ends) in zip(self._columns, self._ends, columns, ends):
+            for index in indices:
+                column += old_column[old_ends[index - 1] if index else 0:old_ends[index]]
+                new_ends.append(len(column))
+        (self._columns, self._ends, self._count) = (columns, ends, len(indices))
+
+    def save(self, file_name):
+        """
+        Writes the cases to a case file, which the worker processes on this machine can share using SharedCaseStore.
+        The file is written under a temporary name and then renamed, so a reader never sees part of a file.
+        :param file_name: Is the name of the case file.
+        """
+
+        temp_file_name = file_name + '.tmp'
+        with open(temp_file_name, 'wb') as case_file:
+            case_file.write(CASE_FILE_HEADER.pack(CASE_FILE_MAGIC, self._count))
+            for column, ends in zip(self._columns, self._ends):
+                case_file.write(ends.tobytes())
+                case_file.write(column)
+                case_file.write(bytes(-len(column) % OFFSET_SIZE))
+        os.replace(temp_file_name, file_name)
+
+
+class SharedCaseStore:
+    """
+    Read only storage for cases, held in a memory mapped case file written by CaseStore.save().
+    The operating system keeps one copy of the file in memory, however many processes map it, so the worker processes
+    in a container share the cases rather than each holding its own. Each process can then select the part of the
+    cases which it uses.
+    """
+
+    def __init__(self, file_name):
+        """
+        :param file_name: Is the name of the case file.
+        :raises ValueError: if the file isn't a case file.
+        """
+
+        with open(file_name, 'rb') as case_file:
+            self._map = mmap.mmap(case_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, count) = CASE_FILE_HEADER.unpack_from(self._map)
+        if magic != CASE_FILE_MAGIC:
+            raise ValueError('%s is not a case file' % file_name)
+
+        view = memoryview(self._map)
+        position = CASE_FILE_HEADER.size
+        self._columns = []
+        self._ends = []
+        for _ in CASE_FIELDS:
+            ends = view[position:position + count * OFFSET_SIZE].cast('I')
+            position += count * OFFSET_SIZE
+            size = ends[-1] if count else 0
+            self._columns.append(view[position:position + size])
+            self._ends.append(ends)
+            position += size + (-size % OFFSET_SIZE)
+
+        self._starts = [0] * len(CASE_FIELDS)
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def select(self, first, last):
+        """
+        Narrows the store down to a range of its cases, which are then numbered from 0.
+        :param first: Is the position of the first case to keep.
+        :param last: Is the position of the last case to keep.
+        """
+
+        last = min(last, self._count - 1)
+        self._starts = [ends[first - 1] if first else start for (ends, start) in zip(self._ends, self._starts)]
+        self._ends = [ends[first:last + 1] for ends in self._ends]
+        self._count = max(0, last - first + 1)
+
+    def __getitem__(self, index):
+        """
+        Builds a Case for the case at the given position in the store.
+        :param index: Is the position of the case, numbered from 0.
+        :return: A Case object.
+        """
+
+        if index < 0:
+            index += self._count
+        if index < 0 or index >= self._count:
+            raise IndexError('case index out of range')
+
+        values = []
+        for column, ends, first_start in zip(self._columns, self._ends, self._starts):
+            start = ends[index - 1] if index else first_start
+            values.append(str(column[start:ends[index]], 'utf-8'))
+        return Case(index, *values)
+
+    def iter_values(self, field):
+        """
+        Reads one field for every case, without building the Cases.
+        :param field: Is the name of the case field.
+        :return: Generator of the field's values, in case order.
+        """
+
+        position = CASE_FIELDS.index(field)
+        column = self._columns[position]
+        start = self._starts[position]
+        for end in self._ends[position]:
+            yield str(column[start:end], 'utf-8')
+            start = end
+
+
+def find_column(fieldnames, field):
+    """
+    Finds the event data column which holds a case field.
+    :param fieldnames: Is the list of column names from the event data file header.
+    :param field: Is the name of the case field.
+    :return: The position of the column, or None if the event data file doesn't hold the field.
+    """
+
+    for name in COLUMN_NAMES.get(field, (field,)):
+        if name in fieldnames:
+            return fieldnames.index(name)
+    return None
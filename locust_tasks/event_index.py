@@ -0,0 +1,188 @@
+import array
+import csv
+import logging
+import mmap
+import os
+import struct
+import sys
+
+from . import FILE_NAME, INDEX_FILE_NAME
+
+logger = logging.getLogger('performance')
+
+# An index file holds a header, which identifies the version of the event data file it was built from,
+# followed by the byte offset of the start of each record and a final entry holding the end of the last record.
+# Version 1 indexes assumed one record per line, so they are rebuilt.
+INDEX_MAGIC = b'RHEVIDX2'
+INDEX_HEADER = struct.Struct('<8sQQ')
+OFFSET_TYPE = 'Q'
+
+
+def get_index_file_name(file_name):
+    """
+    Works out where the index for an event data file lives.
+    :param file_name: Is the name of the event data file.
+    :return: The name of the index file.
+    """
+
+    if file_name == FILE_NAME:
+        return INDEX_FILE_NAME
+    return file_name + '.idx'
+
+
+def load_event_data_index(file_name):
+    """
+    Returns the record offsets for the event data file. An existing index file is reused if it was built from the
+    current version of the event data file, otherwise the index is built and saved for the next run.
+    Reading an existing index only touches the entries that are actually used, so its cost doesn't grow with the
+    size of the event data file.
+    :param file_name: Is the name of the event data file.
+    :return: Sequence of record start offsets, with a trailing entry for the end of the final record. The number of
+    records is therefore one less than its length.
+    """
+
+    index_file_name = get_index_file_name(file_name)
+    data_stat = os.stat(file_name)
+
+    offsets = map_index_file(index_file_name, data_stat)
+    if offsets is not None:
+        logger.info('Reusing event data index %s' % index_file_name)
+        return offsets
+
+    offsets = build_event_data_index(file_name)
+    save_index_file(index_file_name, data_stat, offsets)
+    return offsets
+
+
+def build_event_data_index(file_name):
+    """
+    Scans the event data file once to find where each record starts. The records are split by the CSV reader, as a
+    quoted field can hold a line break, so a record can span several lines.
+    :param file_name: Is the name of the event data file.
+    :return: Array of record start offsets, with a trailing entry for the end of the final record.
+    """
+
+    offsets = array.array(OFFSET_TYPE)
+    position = 0
+
+    def read_lines(infile):
+        nonlocal position
+        for line in infile:
+            position += len(line)
+            yield line.decode('utf-8')
+
+    with open(file_name, 'rb') as infile:
+        # The reader only reads as many lines as each record needs, so the position is always the end of a record
+        reader = csv.reader(read_lines(infile))
+        next(reader, None)
+        start = position
+        for row in reader:
+            # Blank lines are skipped by the CSV DictReader, so they don't count as records
+            if row:
+                offsets.append(start)
+            start = position
+    offsets.append(position)
+
+    return offsets
+
+
+def map_index_file(index_file_name, data_stat):
+    """
+    Memory maps an existing index file.
+    :param index_file_name: Is the name of the index file.
+    :param data_stat: Is the os.stat() result for the event data file, used to check that the index is current.
+    :return: The record offsets held by the index file, or None if there is no usable index file.
+    """
+
+    try:
+        with open(index_file_name, 'rb') as index_file:
+            index_map = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    if len(index_map) < INDEX_HEADER.size:
+        index_map.close()
+        return None
+    (magic, data_size, data_mtime) = INDEX_HEADER.unpack_from(index_map)
+    if magic != INDEX_MAGIC or data_size != data_stat.st_size or data_mtime != data_stat.st_mtime_ns:
+        logger.info('Ignoring out of date event data index %s' % index_file_name)
+        index_map.close()
+        return None
+
+    return memoryview(index_map)[INDEX_HEADER.size:].cast(OFFSET_TYPE)
+
+
+def save_index_file(index_file_name, data_stat, offsets):
+    """
+    Saves the index so that later runs can reuse it. Failure to save is not fatal, as the index can always be rebuilt.
+    :param index_file_name: Is the name of the index file.
+    :param data_stat: Is the os.stat() result for the event data file that the index was built from.
+    :param offsets: Is the array of record offsets.
+    """
+
+    temp_file_name = index_file_name + '.tmp'
+    try:
+        with open(temp_file_name, 'wb') as index_file:
+            index_file.write(INDEX_HEADER.pack(INDEX_MAGIC, data_stat.st_size, data_stat.st_mtime_ns))
+            offsets.tofile(index_file)
+        os.replace(temp_file_name, index_file_name)
+    except OSError as e:
+        logger.warning('Unable to save event data index %s: %s' % (index_file_name, e))
+
+
+def calculate_section(number_records, section_num, num_sections):
+    """
+    Splits the records into equal sized sections and works out which records belong to one of them.
+    :param number_records: Is the number of records in the event data file.
+    :param section_num: Is the number of the section. Numbered from 1.
+    :param num_sections: Is the total number of sections.
+    :return: The number of the first and last records in the section. Numbered from 0 after the header line.
+    """
+
+    records_per_section = number_records / num_sections
+    first_record = int(records_per_section * (section_num - 1))
+    last_record = int(records_per_section * section_num) - 1
+
+    return first_record, last_record
+
+
+def read_event_data_header(file_name):
+    """
+    :param file_name: Is the name of the event data file.
+    :return: The list of column names from the event data file header.
+    """
+
+    with open(file_name, 'rb') as infile:
+        return next(csv.reader([infile.readline().decode('utf-8')]))
+
+
+def iter_event_data_section(file_name, offsets, first_record, last_record):
+    """
+    Reads the lines of a section of the event data file, without reading any of the rest of the file. A record which
+    spans several lines is returned as several lines, which the CSV reader joins.
+    :param file_name: Is the name of the event data file.
+    :param offsets: Are the record offsets from the event data file index.
+    :param first_record: Is the first record to read. Numbered from 0 after the header line.
+    :param last_record: Is the final record to read.
+    :return: Generator of the lines holding the records, suitable for passing to a CSV reader.
+    """
+
+    position = offsets[first_record]
+    end = offsets[last_record + 1]
+    with open(file_name, 'rb') as infile:
+        infile.seek(position)
+        while position < end:
+            line = infile.readline()
+            if not line:
+                break
+            position += len(line)
+            yield line.decode('utf-8')
+
+
+if __name__ == '__main__':
+    # Prebuild the index, so that it can be shipped alongside the event data file
+    if not os.path.exists(FILE_NAME):
+        sys.stdout.write('No event data file at %s. Index not built\n' % FILE_NAME)
+        sys.exit(0)
+    num_records = len(load_event_data_index(FILE_NAME)) - 1
+    sys.stdout.write('Indexed %d records in %s\n' % (num_records, FILE_NAME))
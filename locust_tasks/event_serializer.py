@@ -0,0 +1,106 @@
+"""
+Serializes the UAC and Case update events used to seed RH.
+Each event shape is a precompiled template, so building an event is one format operation rather than dozens of
+string appends. Every value taken from the event data is JSON escaped, so an address containing a quote or a
+backslash still produces a valid message.
+"""
+import datetime
+import hashlib
+import os
+from json.encoder import encode_basestring
+
+# Escapes a string and wraps it in double quotes. This is the C implementation when it's available.
+escape = encode_basestring
+
+# The generated IDs and hashes can't contain anything which needs escaping, so they go into the templates as they are
+UAC_EVENT_TEMPLATE = (
+    '{"event": { "type": "UAC_UPDATED", "source": "CASE_SERVICE", "channel": "RM", "dateTime": %s, '
+    '"transactionId" : "%s" }, "payload" : {"uac" : { "uacHash": "%s", "active" : %s, "questionnaireId" : %s, '
+    '"caseType" : %s, "region" : %s, "caseId" : "%s", "collectionExerciseId" : "%s"}}}'
+)
+
+CASE_EVENT_TEMPLATE = (
+    '{"event": { "type": "CASE_UPDATED", "source": "CASE_SERVICE", "channel": "RM", "dateTime": %s, '
+    '"transactionId": "%s" }, "payload": {"collectionCase": { "id": "%s", "caseRef": "%d", "caseType": %s, '
+    '"survey": "CENSUS", "collectionExerciseId": "%s", "address": { "addressLine1": %s, "addressLine2": %s, '
+    '"addressLine3": %s, "townName": %s, "postcode": %s, "region": "E", "latitude": %s, "longitude": %s, '
+    '"uprn": %s, "arid": "ABPXXXXXX010008328509", "addressType": %s, "estabType": "Household"}, '
+    '"contact": { "title": null, "forename": null, "surname": null, "email": null, "telNo": null}, '
+    '"state": "ACTIONABLE", "actionableFrom": %s}}}'
+)
+
+UUID_VARIANTS = '89ab'
+
+
+def get_timestamp():
+    """
+    :return: The current time, as a quoted JSON string.
+    """
+
+    return escape(datetime.datetime.utcnow().isoformat())
+
+
+def generate_uuids(count):
+    """
+    Generates random (version 4) UUIDs. Taking the random bytes for all of them in one go is several times faster
+    than calling uuid4() for each.
+    :param count: Is the number of UUIDs to generate.
+    :return: List of UUID strings.
+    """
+
+    random_hex = os.urandom(16 * count).hex()
+    uuids = []
+    for start in range(0, 32 * count, 32):
+        h = random_hex[start:start + 32]
+        uuids.append('%s-%s-4%s-%s%s-%s' % (h[:8], h[8:12], h[13:16], UUID_VARIANTS[int(h[16], 16) & 3], h[17:20], h[20:]))
+    return uuids
+
+
+def serialize_event_batch(cases):
+    """
+    Build the UAC and Case event messages for a batch of cases. The events in a batch share a timestamp.
+    :param cases: Is a sequence of (line, case_id, collection_exercise_id, case_ref) tuples, where line is the CSV
+    data for the case.
+    :return: List of (uac_event, case_event) tuples, in the same order as the cases. Each event is UTF-8 bytes.
+    """
+
+    timestamp = get_timestamp()
+    transaction_ids = generate_uuids(2 * len(cases))
+    events = []
+
+    for (position, (line, case_id, collection_exercise_id, case_ref)) in enumerate(cases):
+        case_type = escape(line['caseType'])
+        active = 'true' if line['active'].strip().lower() == 'true' else 'false'
+
+        uac_event = UAC_EVENT_TEMPLATE % (
+            timestamp,
+            transaction_ids[2 * position],
+            hashlib.sha256(line['uac'].encode()).hexdigest(),
+            active,
+            escape(line['questionnaireId']),
+            case_type,
+            escape(line['region']),
+            case_id,
+            collection_exercise_id,
+        )
+        case_event = CASE_EVENT_TEMPLATE % (
+            timestamp,
+            transaction_ids[2 * position + 1],
+            case_id,
+            case_ref,
+            case_type,
+            collection_exercise_id,
+            escape(line['addressLine1']),
+            escape(line['addressLine2']),
+            escape(line['addressLine3']),
+            escape(line['townName']),
+            escape(line['postcode']),
+            escape(line['latitude']),
+            escape(line['longitude']),
+            escape(line['uprn']),
+            case_type,
+            timestamp,
+        )
+        events.append((uac_event.encode('utf-8'), case_event.encode('utf-8')))
+
+    return events
@@ -0,0 +1,123 @@
+import logging
+import time
+
+import gevent
+
+logger = logging.getLogger('performance')
+
+
+class TokenBucket:
+    """
+    Allows an action up to a steady rate, with bursts of up to capacity actions.
+    """
+
+    def __init__(self, rate, capacity):
+        """
+        :param rate: Is the number of tokens added per second.
+        :param capacity: Is the maximum number of tokens held.
+        """
+
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last = time.monotonic()
+
+    def take(self):
+        """
+        :return: True if a token was available, and has been taken.
+        """
+
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+
+class FailureReporter:
+    """
+    Logs test failures without flooding the log when things are going wrong, and without slowing the users down.
+    Failures are grouped by step ID and failure message. The first failure in each group since the last summary is
+    always logged. After that a failure is only logged in full, with its page extract, if the token bucket allows,
+    and the rest are just counted. The counts for every group are logged periodically.
+    Every failure is still reported to Locust, so the failure statistics are exact.
+    """
+
+    def __init__(self, extract_rate, extract_burst, summary_interval):
+        """
+        :param extract_rate: Is the number of failures per second which can be logged in full.
+        :param extract_burst: Is the number of failures which can be logged in full in a burst.
+        :param summary_interval: Is the number of seconds between logging the failure counts.
+        """
+
+        self.summary_interval = summary_interval
+        self._bucket = TokenBucket(extract_rate, extract_burst)
+        self._counts = {}
+        self._unlogged = {}
+        self._summary_greenlet = None
+
+    def report(self, id, status, failure_message, detail, page_content):
+        """
+        Logs a failure, subject to the throttling.
+        :param id: Is the ID of the step which failed.
+        :param status: Is the HTTP status of the response.
+        :param failure_message: Is the description of the failure.
+        :param detail: Is the detail of the user's journey, eg, the UAC.
+        :param page_content: Is the page extract to log with the failure.
+        """
+
+        key = (id, failure_message)
+        first = key not in self._counts
+        self._counts[key] = self._counts.get(key, 0) + 1
+
+        if self._bucket.take():
+            error_detail = f' Page content >>> {page_content} <<<' if page_content else ''
+        elif first:
+            error_detail = ' Page content not logged, as too many failures are being reported'
+        else:
+            self._unlogged[key] = self._unlogged.get(key, 0) + 1
+            return
+
+        logger.error(f'ID={id} {detail} Status={status}: {failure_message}{error_detail}')
+
+    def log_summary(self):
+        """
+        Logs the number of failures in each group since the last summary, and then resets the counts.
+        """
+
+        if not self._counts:
+            return
+
+        (counts, unlogged) = (self._counts, self._unlogged)
+        (self._counts, self._unlogged) = ({}, {})
+
+        lines = [f'{sum(counts.values())} failures since the last summary:']
+        for ((id, failure_message), count) in sorted(counts.items(), key=lambda item: -item[1]):
+            lines.append(f'  {count} x ID={id} {failure_message} ({unlogged.get((id, failure_message), 0)} not logged)')
+        logger.error('\n'.join(lines))
+
+    def start(self):
+        """
+        Starts logging the failure counts periodically.
+        """
+
+        if self._summary_greenlet is None:
+            self._summary_greenlet = gevent.spawn(self._summary_loop)
+
+    def stop(self):
+        """
+        Stops the periodic logging, after logging any outstanding counts.
+        """
+
+        if self._summary_greenlet is not None:
+            self._summary_greenlet.kill(block=False)
+            self._summary_greenlet = None
+        self.log_summary()
+
+    def _summary_loop(self):
+        while True:
+            gevent.sleep(self.summary_interval)
+            self.log_summary()
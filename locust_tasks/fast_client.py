@@ -0,0 +1,43 @@
+from urllib.parse import urlencode
+
+from locust.contrib.fasthttp import FastHttpSession, FastHttpUser
+
+
+class FormFastHttpSession(FastHttpSession):
+    """
+    A FastHttpSession which takes a dict of form fields as the request data, as the requests based HttpSession does.
+    This lets the task sets run unchanged on either client.
+    """
+
+    def request(self, method, path, **kwargs):
+        data = kwargs.get('data')
+        if isinstance(data, dict):
+            kwargs['data'] = urlencode(data, doseq=True)
+            headers = dict(kwargs.get('headers') or {})
+            if 'Content-Type' not in headers and 'content-type' not in headers:
+                headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            kwargs['headers'] = headers
+
+        return super().request(method, path, **kwargs)
+
+
+class FormFastHttpUser(FastHttpUser):
+    """
+    A FastHttpUser whose client is a FormFastHttpSession.
+    The geventhttpclient based client uses much less CPU per request than requests, so each worker can generate
+    more load.
+    """
+
+    abstract = True
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        self.client = FormFastHttpSession(
+            self.environment,
+            base_url=self.host,
+            network_timeout=self.network_timeout,
+            connection_timeout=self.connection_timeout,
+            max_redirects=self.max_redirects,
+            max_retries=self.max_retries,
+            insecure=self.insecure,
+        )
@@ -0,0 +1,92 @@
+"""
+Times each run through a journey, eg, all nine steps of requesting a new code by SMS, so that the journeys can be
+reported to Locust as transactions alongside the individual requests.
+"""
+
+# The request types which the journey transactions are reported to Locust under
+JOURNEY = 'JOURNEY'
+JOURNEY_SERVER_TIME = 'JOURNEY-SERVER'
+JOURNEY_THINK_TIME = 'JOURNEY-THINK'
+
+
+class JourneyInterrupted(Exception):
+    """
+    Reported to Locust as the failure of a journey which didn't reach its last step.
+    """
+    pass
+
+
+class JourneyTimer:
+    """
+    Times one run through a journey, from the start of its first request to the end of its last response.
+    The elapsed time is split into the server time, which is the total response time of the journey's steps, and the
+    think time, which is the rest. The think time is mostly the users' wait time between steps.
+    """
+
+    __slots__ = ('name', 'start_time', 'end_time', 'server_time', 'steps', 'last_step')
+
+    def __init__(self, name):
+        """
+        :param name: Is the name of the journey.
+        """
+
+        self.name = name
+        self.start_time = None
+        self.end_time = None
+        self.server_time = 0.0
+        self.steps = 0
+        self.last_step = None
+
+    def record_step(self, step, start_time, response_time):
+        """
+        Records a step of the journey.
+        :param step: Is the step ID.
+        :param start_time: Is the time the request started, in seconds.
+        :param response_time: Is the response time in milliseconds.
+        """
+
+        if self.start_time is None:
+            self.start_time = start_time
+        self.end_time = start_time + response_time / 1000
+        self.server_time += response_time
+        self.steps += 1
+        self.last_step = step
+
+    def get_elapsed_time(self):
+        """
+        :return: The elapsed time of the journey so far, in milliseconds.
+        """
+
+        if self.start_time is None:
+            return 0.0
+        return (self.end_time - self.start_time) * 1000
+
+    def get_think_time(self):
+        """
+        :return: The elapsed time which wasn't spent waiting for responses, in milliseconds.
+        """
+
+        return max(0.0, self.get_elapsed_time() - self.server_time)
+
+    def report(self, events):
+        """
+        Reports a completed journey to Locust, as a successful JOURNEY request with the elapsed time, plus
+        JOURNEY-SERVER and JOURNEY-THINK requests with the server and think times.
+        :param events: Is the Locust environment's events.
+        """
+
+        for (request_type, response_time) in ((JOURNEY, self.get_elapsed_time()),
+                                              (JOURNEY_SERVER_TIME, self.server_time),
+                                              (JOURNEY_THINK_TIME, self.get_think_time())):
+            events.request_success.fire(request_type=request_type, name=self.name, response_time=response_time,
+                                        response_length=0)
+
+    def report_interrupted(self, events):
+        """
+        Reports a journey which was interrupted before its last step to Locust, as a failed JOURNEY request.
+        :param events: Is the Locust environment's events.
+        """
+
+        events.request_failure.fire(request_type=JOURNEY, name=self.name, response_time=self.get_elapsed_time(),
+                                    response_length=0,
+                                    exception=JourneyInterrupted(f'Interrupted at {self.last_step}'))
@@ -0,0 +1,137 @@
+"""
+Runs several Locust worker processes in one container. gevent runs each Locust process on a single core, so without
+this a worker container can't use more than one core.
+
+The launcher runs WORKER_PROCESSES copies of the Locust command, one per core by default, and tells each which one it
+is with WORKER_PROCESS_NUM. Each process is a separate worker to the master, so each has its own statistics,
+request log and metrics.
+
+When the workers read their cases from the event data file, the launcher reads the instance's section of the file
+once and saves it as a case file. Each process memory maps the case file, so the processes share one copy of the
+cases, and uses its own part of them. When the master hands out the cases each process fetches its own from the
+master.
+
+Run by locust-run.sh, eg:
+    $ WORKER_PROCESSES=auto python -m locust_tasks.launcher locust -f locust_tasks/locustfile.py --worker
+"""
+import logging
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from . import WORKER_PROCESSES, CASE_DISTRIBUTION, SHARED_CASES_FILE
+from .case_distribution import FILE
+from .setup import save_instance_cases
+
+logger = logging.getLogger('performance')
+
+# The cgroup files which hold the container's CPU limit, for cgroup v2 and v1
+CGROUP_CPU_MAX = '/sys/fs/cgroup/cpu.max'
+CGROUP_CFS_QUOTA = '/sys/fs/cgroup/cpu/cpu.cfs_quota_us'
+CGROUP_CFS_PERIOD = '/sys/fs/cgroup/cpu/cpu.cfs_period_us'
+
+
+def get_available_cores():
+    """
+    :return: The number of whole cores this container may use. This is the smaller of the cores the process may run
+    on and the container's CPU limit, if it has one.
+    """
+
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+    limit = read_cgroup_cpu_limit()
+    if limit:
+        cores = min(cores, int(limit))
+    return max(1, cores)
+
+
+def read_cgroup_cpu_limit():
+    """
+    :return: The container's CPU limit in cores, or None if it has no limit.
+    """
+
+    try:
+        with open(CGROUP_CPU_MAX) as cpu_max_file:
+            (quota, period) = cpu_max_file.read().split()[:2]
+        return None if quota == 'max' else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+
+    try:
+        with open(CGROUP_CFS_QUOTA) as quota_file, open(CGROUP_CFS_PERIOD) as period_file:
+            (quota, period) = (int(quota_file.read()), int(period_file.read()))
+        return None if quota <= 0 else quota / period
+    except (OSError, ValueError):
+        return None
+
+
+def get_num_processes():
+    """
+    :return: The number of worker processes to run. 'auto' runs one per core.
+    """
+
+    if WORKER_PROCESSES == 'auto':
+        return get_available_cores()
+    return max(1, int(WORKER_PROCESSES))
+
+
+def run_workers(command, num_processes, env):
+    """
+    Runs the worker processes until they have all finished. If one fails then the others are stopped, so that the
+    container is restarted rather than running short of workers.
+    :param command: Is the Locust command to run.
+    :param num_processes: Is the number of worker processes.
+    :param env: Is the environment for the worker processes.
+    :return: The exit status of the first process which failed, or 0.
+    """
+
+    processes = [subprocess.Popen(command, env=dict(env, WORKER_PROCESS_NUM=str(num)))
+                 for num in range(1, num_processes + 1)]
+
+    def stop_workers(signum, frame):
+        for process in processes:
+            if process.poll() is None:
+                process.send_signal(signum)
+
+    signal.signal(signal.SIGTERM, stop_workers)
+    signal.signal(signal.SIGINT, stop_workers)
+
+    status = 0
+    running = list(processes)
+    while running:
+        time.sleep(0.5)
+        for process in [process for process in running if process.poll() is not None]:
+            running.remove(process)
+            if process.returncode and not status:
+                logger.error('Worker process %d exited with status %d. Stopping the other worker processes'
+                             % (processes.index(process) + 1, process.returncode))
+                status = process.returncode
+                stop_workers(signal.SIGTERM, None)
+    return status
+
+
+def main(command):
+    num_processes = get_num_processes()
+    env = dict(os.environ, WORKER_PROCESSES=str(num_processes))
+
+    if CASE_DISTRIBUTION == FILE and num_processes > 1:
+        shared_cases_file = SHARED_CASES_FILE or os.path.join(tempfile.gettempdir(), 'shared_cases.bin')
+        num_cases = save_instance_cases(shared_cases_file)
+        if num_cases < num_processes:
+            sys.exit('ERROR: The instance has %d cases, which is too few for %d worker processes'
+                     % (num_cases, num_processes))
+        env['SHARED_CASES_FILE'] = shared_cases_file
+        logger.info('Saved the instance\'s %d cases to %s, to share between %d worker processes'
+                    % (num_cases, shared_cases_file, num_processes))
+
+    logger.info('Starting %d worker processes: %s' % (num_processes, ' '.join(command)))
+    return run_workers(command, num_processes, env)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        sys.exit('Usage: python -m locust_tasks.launcher <locust command and options>')
+    logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(name)s/%(levelname)s: %(message)s')
+    sys.exit(main(sys.argv[1:]))
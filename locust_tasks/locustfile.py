@@ -1,94 +1,121 @@
 import sys
 import os
 import re
-import logging
 import time
-from enum import Enum
+import logging
+from flask import Response, jsonify, request
 from locust import HttpUser, between, SequentialTaskSet, task, events
-from locust.runners import MasterRunner
+from locust.exception import StopUser
+from locust.runners import MasterRunner, WorkerRunner, STATE_MISSING
 
 sys.path.append(os.getcwd())
-from locust_tasks.setup import setup_master, setup_worker, get_next_case
+from locust_tasks.address_options import AddressOptions, MAX_LISTED_ADDRESSES
+from locust_tasks import FAILURE_LOG_RATE, FAILURE_LOG_BURST, FAILURE_SUMMARY_INTERVAL, HTTP_CLIENT
+from locust_tasks import WAIT_TIME_MIN, WAIT_TIME_MAX
+from locust_tasks import ARRIVAL_SCHEDULE, INSTANCE_NUM, MAX_INSTANCES, LATENCY_CORRECTION, JOURNEY_STATS
+from locust_tasks import CASE_DISTRIBUTION, WORKER_PROCESSES, WORKER_PROCESS_NUM
+from locust_tasks import REQUEST_LOG_DIR, REQUEST_LOG_MAX_FILE_MB, REQUEST_LOG_MAX_FILES, REQUEST_LOG_BUFFER_MB
+from locust_tasks.arrival_rate import ArrivalPacer, ArrivalSchedule, sum_arrival_counts
+from locust_tasks.case_allocator import CasesExhausted
+from locust_tasks.case_distribution import CASE_CHUNKS_PATH, MASTER
+from locust_tasks.failure_reporter import FailureReporter
+from locust_tasks.fast_client import FormFastHttpUser
+from locust_tasks.journey_timing import JourneyTimer
+from locust_tasks.metrics import CONTENT_TYPE, MetricsCache
+from locust_tasks.pages import Page
+from locust_tasks.request_log import RequestLog
+from locust_tasks.response_view import get_response_view
+from locust_tasks.step_latency import StepLatencies
+from locust_tasks.setup import setup_master, setup_worker, stop_worker, lease_case, release_case, get_case_counts
+from locust_tasks.setup import get_case_chunk, get_case_source_counts, get_worker_arrival_share
+from locust_tasks.setup import set_arrival_share_listener
 
 logger = logging.getLogger('performance')
 
+failure_reporter = FailureReporter(float(FAILURE_LOG_RATE), float(FAILURE_LOG_BURST), float(FAILURE_SUMMARY_INTERVAL))
 
-"""
-This enum defines the applications pages.
+# Latency histograms for each step and journey. Workers send theirs to the master, which merges them.
+step_latencies = StepLatencies(LATENCY_CORRECTION)
 
-To identify pages each entry must define some 'title' text, which should only appear on that 
-particular page.
+# When an arrival schedule is set the journeys are started at the scheduled rate. Locust uses the load shape which
+# is imported here to run the right number of users, and each worker's pacer starts their journeys on time.
+arrival_pacer = None
+if ARRIVAL_SCHEDULE:
+    from locust_tasks.arrival_rate import ArrivalRateShape
 
-If the page specifies some text extract_start/end then the text within this range will be
-used in the error message to help debug what has gone wrong. 
-If the extract start/end is not specified then the whole page will be added to the error message.
-""" 
-class Page(Enum):
-    START           = ('<title>Start census - Census 2021</title>',
-                       'Start census</h1>',
-                       'Enter your 16-character access code'
-    				  )
-    ADDRESS_CORRECT = ('<title>Is this the correct address? - Census 2021</title>',
-                       '<h1 class="question__title">',
-                       '<fieldset'
-                      )
-    EQ_LAUNCHED     = ('302: Found',
-                       '',
-                       ''
-                      )
-    CALL_CONTACT_CENTRE = ('<title>Call Census Customer Contact Centre - Census 2021</title>',
-                       '<main',
-                       '</main>'
-                      )
-    ERROR           = ('<title>Error - Census 2021</title>',
-                       'id="main-content"',
-                       '<footer'
-                      )
-    ERROR_403       = ('<title>403</title>',
-                       '',
-                       ''
-                      )
-    ERROR_502       = ('<title>502 Server Error</title>',
-                       '',
-                       ''
-                      )
-    ERROR_GENERIC   = ('<h1>Error: Server Error</h1>',
-                       '',
-                       ''
-                      )
-    ENTER_ADDRESS = ('>What is your postcode?</h1>',
-                       '<h1',
-                       '</h1>')
-    SELECT_ADDRESS = ('<title>Select your address - Census 2021</title>',
-                      '<h1 class="question__title">Select your address</h1>',
-                      'I cannot find my address')
-    SELECT_METHOD = ('<title>How would you like to receive a new access code? - Census 2021</title>',
-                     '<h1 class="question__title">How would you like to receive a new household access code?</h1>',
-                     'To request a census in a different format or for further help, please')
-    ENTER_MOBILE = ('<title>What is your mobile phone number? - Census 2021</title>',
-                    '<h1 class="question__title">What is your mobile phone number?</h1>',
-                    'Continue')
-    HOUSEHOLD_INFORMATION = ('<title>Request a new household access code - Census 2021</title>',
-                       '<main',
-                       '<p>')
-    CONFIRM_MOBILE = ('<title>Is this mobile phone number correct? - Census 2021</title>',
-                      '<h1 class="question__title">Is this mobile phone number correct?</h1>',
-                      'Continue')
-    ENTER_NAME = ('<title>What is your name? - Census 2021</title>',
-                  '<h1 class="question__title">What is your name?</h1>',
-                  'Continue')
-    CONFIRM_NAME = ('<title>Do you want to send a new access code to this address? - Census 2021</title>',
-                    '<h1 class="question__title">Do you want to send a new household access code to this address?</h1>',
-                    'Continue')
-    CODE_SENT = ('<title>We have sent an access code - Census 2021</title>',
-                 '<div class="panel__body svg-icon-margin--xl"',
-                 '</div>')
-
-  
-    def __init__(self, title, extract_start, extract_end):
-        self.title = title
-        self.extract_start = extract_start
-        self.extract_end = extract_end
+# When a request log directory is set each worker streams a record of every verified request to disk
+request_log = None
+
+
+class JourneyTaskSet(SequentialTaskSet):
+    """
+    Base class for the journeys. Each run through the sequence is timed, from its first request to its last
+    response, and reported to Locust as a JOURNEY transaction. A journey which is interrupted before its last task
+    completes is reported as a failed transaction.
+    """
+
+    journey_timer = None
+
+    def execute_task(self, task):
+        if task is self.tasks[0]:
+            self.journey_timer = JourneyTimer(type(self).__name__)
+
+        try:
+            super().execute_task(task)
+        except Exception:
+            self.end_journey(completed=False)
+            raise
+
+        if task is self.tasks[-1]:
+            self.end_journey(completed=True)
+
+    def end_journey(self, completed):
+        """
+        Reports the journey, unless it hadn't made any verified requests yet.
+        """
+        timer = self.journey_timer
+        self.journey_timer = None
+        if not JOURNEY_STATS or timer is None or not timer.steps:
+            return
+
+        if completed:
+            timer.report(self.user.environment.events)
+        else:
+            timer.report_interrupted(self.user.environment.events)
+
+
+class CaseTaskSet(JourneyTaskSet):
+    """
+    Base class for task sequences which use a case.
+    The case is leased to the user for the whole journey, so no other user can be part way through a journey with
+    the same UAC. It is released when the next journey starts, or when the sequence is interrupted or stopped.
+    """
+
+    case = None
+
+    # Set by journeys which select the case's address from the list of addresses at its postcode
+    selects_address = False
+
+    def lease_case(self):
+        """
+        Releases the case from any previous journey and leases a new one, once the journey is due to start.
+        The user is stopped if a case can't be leased.
+        """
+        self.release_case()
+        wait_for_journey_start()
+        try:
+            self.case = lease_case(self.selects_address)
+        except CasesExhausted as e:
+            logger.error(f'Stopping user. Unable to lease a case: {e}')
+            raise StopUser()
+
+    def release_case(self):
+        if self.case is not None:
+            release_case(self.case)
+            self.case = None
+
+    def on_stop(self):
+        self.release_case()
 
         
 """
@@ -97,14 +124,14 @@ This sequence is the principle route used to simulate a user:
   - Enter a valid UAC
   - Confirm address to launch EQ
 """
-class LaunchEQ(SequentialTaskSet):
+class LaunchEQ(CaseTaskSet):
     """
     Class to represent a user entering a UAC and launching EQ.
     """
 
     def init_thread(self):
-        self.case = get_next_case()
-        self.on_failure_detail = "UAC='" + self.case['uac']
+        self.lease_case()
+        self.on_failure_detail = "UAC='" + self.case.uac
         self.on_failure_logging = ""
 
     # assume all users arrive at the start page
@@ -123,9 +150,9 @@ class LaunchEQ(SequentialTaskSet):
         """
         POST a valid UAC
         """
-        with self.client.post("/en/start/", {"uac": self.case['uac']}, catch_response=True) as response:
-            verify_response('Launch-EnterUAC', self, response, 200, Page.ADDRESS_CORRECT, self.case["address_line_1"])
-            verify_response('Launch-EnterUAC', self, response, 200, Page.ADDRESS_CORRECT, self.case["postcode"])
+        with self.client.post("/en/start/", {"uac": self.case.uac}, catch_response=True) as response:
+            verify_response('Launch-EnterUAC', self, response, 200, Page.ADDRESS_CORRECT, self.case.address_line_1)
+            verify_response('Launch-EnterUAC', self, response, 200, Page.ADDRESS_CORRECT, self.case.postcode)
 
     @task
     def post_address_is_correct(self):
@@ -141,12 +168,13 @@ This sequence simulates a user who mistypes their UAC.
 The incorrect UAC is 16 characters long so it will still trigger the call to RHSvc.
 TODO Fix this class (it currently fails)
 """
-class LaunchEQInvalidUAC(SequentialTaskSet):
+class LaunchEQInvalidUAC(JourneyTaskSet):
     """
     Class to represent a user who enters an incorrect UAC.
     """
 
     def init_thread(self):
+        wait_for_journey_start()
         self.on_failure_detail = ""
         self.on_failure_logging = ""
 
@@ -177,11 +205,11 @@ the user says that their address is not correct and enters a corrected address.
 The address correction exercises different backend code. 
 TODO Fix this class (it currently fails)
 """    
-class LaunchEQwithAddressCorrection(SequentialTaskSet):
+class LaunchEQwithAddressCorrection(CaseTaskSet):
 
     def init_thread(self):
-        self.case = get_next_case()
-        self.on_failure_detail = "UAC='" + self.case['uac']
+        self.lease_case()
+        self.on_failure_detail = "UAC='" + self.case.uac
         self.on_failure_logging = ""
 
     # assume all users arrive at the start page
@@ -194,8 +222,8 @@ class LaunchEQwithAddressCorrection(SequentialTaskSet):
 
     @task
     def enter_valid_uac(self):
-        with self.client.post("/en/start/", {"uac": self.case['uac']}, catch_response=True) as response:
-            verify_response('AddrCorrection-EnterUAC', self, response, 200, Page.ADDRESS_CORRECT, self.case["address_line_1"])
+        with self.client.post("/en/start/", {"uac": self.case.uac}, catch_response=True) as response:
+            verify_response('AddrCorrection-EnterUAC', self, response, 200, Page.ADDRESS_CORRECT, self.case.address_line_1)
 
     @task
     def select_address_not_correct(self):
@@ -219,15 +247,17 @@ This task sequence simulates a user following the 'request a new code' sequence
 The simulated user steps through the pages one by one. They don't go down any of the 
 correction/error paths as this doesn't trigger any significant server side work.
 """
-class RequestNewCodeSMS(SequentialTaskSet):
+class RequestNewCodeSMS(CaseTaskSet):
     """
     Class to represent a user requesting a new UAC, which is to be sent by SMS.
     """
 
+    selects_address = True
+
     def init_thread(self):
-        self.case = get_next_case()
-        self.on_failure_detail = "Postcode='" + self.case['postcode'] + "'"
-        self.on_failure_logging = "UPRN=" + self.case['uprn']
+        self.lease_case()
+        self.on_failure_detail = "Postcode='" + self.case.postcode + "'"
+        self.on_failure_logging = "UPRN=" + self.case.uprn
 
     @task
     def start_page(self):
@@ -253,12 +283,12 @@ class RequestNewCodeSMS(SequentialTaskSet):
         POST postcode
         """
         with self.client.post("/en/requests/access-code/enter-address/", {
-            'form-enter-address-postcode': self.case['postcode']
+            'form-enter-address-postcode': self.case.postcode
         }, catch_response=True) as response:
             id = 'RequestUacSms-3-EnterAddress'
             verify_response(id, self, response, 200, Page.SELECT_ADDRESS,
-                            self.case["postcode"])
-            self.address_to_select = extract_address_radio_button_value(id, self, response, self.case["uprn"])
+                            self.case.postcode)
+            self.address_to_select = extract_address_radio_button_value(id, self, response, self.case.uprn)
             
     @task
     def select_address(self):
@@ -269,7 +299,7 @@ class RequestNewCodeSMS(SequentialTaskSet):
         with self.client.post("/en/requests/access-code/select-address/", {
             'form-select-address': self.address_to_select
         }, catch_response=True) as response:
-            verify_response('RequestUacSms-4-SelectAddress', self, response, 200, Page.ADDRESS_CORRECT, self.case["postcode"])
+            verify_response('RequestUacSms-4-SelectAddress', self, response, 200, Page.ADDRESS_CORRECT, self.case.postcode)
 
     @task
     def confirm_address(self):
@@ -306,7 +336,7 @@ class RequestNewCodeSMS(SequentialTaskSet):
         """
         POST a phone number. Then use a section of the phone number (the last 3 digits) to verify the response.
         """
-        self.phone_num = self.case["phone_number"]
+        self.phone_num = self.case.phone_number
         #logger.info("Phone number: " + self.phone_num)
         with self.client.post("/en/requests/access-code/enter-mobile/", {
             'request-mobile-number': self.phone_num
@@ -325,12 +355,14 @@ class RequestNewCodeSMS(SequentialTaskSet):
             verify_response('RequestUacSms-9-ConfirmMobileNumber', self, response, 200, Page.CODE_SENT, expected_text)
 
 
-class RequestNewCodePost(SequentialTaskSet):
+class RequestNewCodePost(CaseTaskSet):
+
+    selects_address = True
 
     def init_thread(self):
-        self.case = get_next_case()
-        self.on_failure_detail = "Postcode='" + self.case['postcode'] + "'"
-        self.on_failure_logging = "UPRN=" + self.case['uprn']
+        self.lease_case()
+        self.on_failure_detail = "Postcode='" + self.case.postcode + "'"
+        self.on_failure_logging = "UPRN=" + self.case.uprn
 
     # All users arrive at the start page
     @task
@@ -357,12 +389,12 @@ class RequestNewCodePost(SequentialTaskSet):
         POST postcode
         """
         with self.client.post("/en/requests/access-code/enter-address/", {
-            'form-enter-address-postcode': self.case['postcode']
+            'form-enter-address-postcode': self.case.postcode
         }, catch_response=True) as response:
             id = 'RequestUacPost-3-EnterAddress'
             verify_response(id, self, response, 200, Page.SELECT_ADDRESS,
-                            self.case["postcode"])
-            self.address_to_select = extract_address_radio_button_value(id, self, response, self.case["uprn"])
+                            self.case.postcode)
+            self.address_to_select = extract_address_radio_button_value(id, self, response, self.case.uprn)
 
     @task
     def select_address(self):
@@ -372,7 +404,7 @@ class RequestNewCodePost(SequentialTaskSet):
         with self.client.post("/en/requests/access-code/select-address/", {
             'form-select-address': self.address_to_select
         }, catch_response=True) as response:
-            verify_response('RequestUacPost-4-SelectAddress', self, response, 200, Page.ADDRESS_CORRECT, self.case["postcode"])
+            verify_response('RequestUacPost-4-SelectAddress', self, response, 200, Page.ADDRESS_CORRECT, self.case.postcode)
 
     @task
     def confirm_address(self):
@@ -410,10 +442,10 @@ class RequestNewCodePost(SequentialTaskSet):
         POST first_name and last_name taken from event_data.txt
         """
         with self.client.post("/en/requests/access-code/enter-name/", {
-            'name_first_name': self.case["first_name"],
-            'name_last_name': self.case["last_name"]
+            'name_first_name': self.case.first_name,
+            'name_last_name': self.case.last_name
         }, catch_response=True) as response:
-            expected_name = self.case["first_name"] + " " + self.case["last_name"]
+            expected_name = self.case.first_name + " " + self.case.last_name
             verify_response('RequestUacPost-8-EnterName', self, response, 200, Page.CONFIRM_NAME,
                             expected_name + "<br>")
 
@@ -425,17 +457,18 @@ class RequestNewCodePost(SequentialTaskSet):
         with self.client.post("/en/requests/access-code/confirm-name-address/", {
             'request-name-address-confirmation': 'yes'
         }, catch_response=True) as response:
-            expected_name = self.case["first_name"] + " " + self.case["last_name"]
+            expected_name = self.case.first_name + " " + self.case.last_name
             expected_text = "will be sent to " + expected_name + " at"
             verify_response('RequestUacPost-9-ConfirmName', self, response, 200, Page.CODE_SENT, expected_text)
 
 
-class LaunchWebChat(SequentialTaskSet):
+class LaunchWebChat(JourneyTaskSet):
     """
     This task sequence simulates a user launching web chat.
     """
 
     def init_thread(self):
+        wait_for_journey_start()
         self.urls_on_current_page = self.toc_urls = None
         self.on_failure_detail = ""
         self.on_failure_logging = ""
@@ -460,7 +493,20 @@ class LaunchWebChat(SequentialTaskSet):
         }, allow_redirects=False)
 
 
-class WebsiteUser(HttpUser):
+"""
+The HTTP clients which the simulated users can use. 'fast' uses much less CPU per request than 'requests', so each
+worker can generate more load.
+"""
+HTTP_USER_CLASSES = {
+    'requests': HttpUser,
+    'fast': FormFastHttpUser,
+}
+
+if HTTP_CLIENT not in HTTP_USER_CLASSES:
+    sys.exit("ERROR: Environment variable 'HTTP_CLIENT' must be one of: " + ', '.join(HTTP_USER_CLASSES))
+
+
+class WebsiteUser(HTTP_USER_CLASSES[HTTP_CLIENT]):
     """
     This class controls the balance of the tasks which simulated users are performing.
     """
@@ -474,14 +520,24 @@ class WebsiteUser(HttpUser):
         LaunchWebChat: 0
     }
     
-    wait_time = between(2, 10)
+    wait_time = between(float(WAIT_TIME_MIN), float(WAIT_TIME_MAX))
     
     
+"""
+Waits until the next journey is due to start, when journeys are started at a scheduled arrival rate.
+The user is stopped once the schedule has ended.
+"""
+def wait_for_journey_start():
+    if arrival_pacer and not arrival_pacer.wait_for_start():
+        raise StopUser()
+
+
 """
 This function should be called after each page transition as it aims to aggressively check that:
   - The current page is the expected page.
   - The actual http response status matches the expected status.
   - Optionally verifies that key content exists on the current page.
+It also records the response time against the step ID, for the per step latency histograms.
 
 In the event of failure it:
   - Reports key debugging information, such as step ID & the UAC, to aid with debugging.
@@ -494,8 +550,11 @@ def verify_response(id, task, resp, expected_status, expected_page, expected_con
     # print ('  status:%d' % (resp.status_code))
     # print ('  Expected page title:%s' % (expected_page.title))
 
+    view = get_response_view(resp)
+    record_step_latency(id, task, resp)
+
     # Sanity check for missing response 
-    if not resp.text:
+    if not view:
         failure_message = f'Expected to be on the {expected_page.name} page but got an empty response!'
         report_failure(id, resp, task, failure_message, '')
 
@@ -518,7 +577,7 @@ def verify_response(id, task, resp, expected_status, expected_page, expected_con
         if "'" in expected_content:
             expected_content = expected_content.replace("'", "&#39;")
         # Check page content
-        if expected_content not in resp.text:
+        if not view.contains(expected_content):
             failure_message = f'{current_page.name} page does not contain expected text ({expected_content}).'
             page_extract = extract_key_page_content(id, task, resp, current_page)
             report_failure(id, resp, task, failure_message, page_extract)
@@ -526,24 +585,47 @@ def verify_response(id, task, resp, expected_status, expected_page, expected_con
     resp.success()
 
     
+"""
+Records the response time of a step in the step and journey latency histograms. A response which is verified more
+than once is only recorded once.
+The think time since the user's previous response is recorded too, for the coordinated omission correction, the
+step is added to the timing of the journey, and the request is written to the request log.
+"""
+def record_step_latency(id, task, resp):
+    request_meta = getattr(resp, 'locust_request_meta', None)
+    if request_meta is None or getattr(resp, 'rh_step_recorded', False):
+        return
+    resp.rh_step_recorded = True
+
+    user = task.user
+    start_time = request_meta['start_time']
+    response_time = request_meta['response_time']
+    last_response_end = getattr(user, 'rh_last_response_end', None)
+    think_time = (start_time - last_response_end) * 1000 if last_response_end is not None else None
+    user.rh_last_response_end = start_time + response_time / 1000
+
+    step_latencies.record(id, type(task).__name__, response_time, think_time)
+
+    if task.journey_timer is not None:
+        task.journey_timer.record_step(id, start_time, response_time)
+
+    if request_log:
+        request_log.record(time.time() - response_time / 1000, id, resp.status_code, response_time,
+                           request_meta.get('content_size'), task.on_failure_detail)
+
+
 """
 Reports a test failure:
   - the error is reported to Locust
-  - an error is logged with either whole or partial page content
+  - an error is logged with either whole or partial page content, subject to the failure reporter's throttling
+The user then waits as usual before starting its next journey, so failures don't change the pacing.
 """
 def report_failure(id, resp, task, failure_message, page_content):
-    error_detail = ''
-    if page_content:
-        error_detail = f' Page content >>> {page_content} <<<'
-
     resp.failure(f'ID={id} {task.on_failure_detail} Status={resp.status_code}: {failure_message}')
-    logger.error(f'ID={id} {task.on_failure_detail} {task.on_failure_logging} Status={resp.status_code}: {failure_message}{error_detail}')
-    
-    # Slow down error reporting when things are going wrong (otherwise hundreds of errors are logged in just a few seconds)
-    # Note that this sleep does not affect the progress of other tasks
-    time.sleep(5.0)
+    failure_reporter.report(id, resp.status_code, failure_message,
+                            f'{task.on_failure_detail} {task.on_failure_logging}', page_content)
     
-    task.interrupt()
+    task.interrupt(reschedule=False)
 
 
 """ 
@@ -551,50 +633,44 @@ Identifies the current page based on its content.
 It returns a Page enum value if the page can be identified, or fails the test if it cannot.
 """
 def identify_page(id, task, resp):
-    page_content=resp.text
+    view = get_response_view(resp)
     
-    for page in Page:
-        if page.title in page_content:
-            return page
+    page = view.find_page()
+    if page:
+        return page
 
     # Identification failed
     failure_message = f'Failed to identify page. Status={resp.status_code}.'
-    report_failure(id, resp, task, failure_message, clean_text(page_content))
+    report_failure(id, resp, task, failure_message, clean_text(view.text))
 
 """
 Returns the html 'value' for a radio button of the target address i.e. the address that corresponds to the uprn parameter of this method.
 """
 def extract_address_radio_button_value(id, task, resp, uprn):
-    page_content = resp.text
+    page_content = get_response_view(resp).text
+    address_options = AddressOptions(page_content)
     
     # Firstly check to see if the uprn is on the page
-    target_id_string = 'id="' + uprn + '"'
-    if target_id_string not in page_content:
+    address_to_select = address_options.get(uprn)
+    if address_to_select is None:
         # UPRN is not on page.
         # This may be because RHUI lists only the first 100 results. So may be working correctly.
         # Find out how many results have been listed.
-        num_addresses_search = re.search('([0-9]*) addresses found for postcode', page_content, re.IGNORECASE)
-        if not num_addresses_search:
+        num_addresses = address_options.get_address_count()
+        if num_addresses is None:
             error_message = 'Failed to extract number of addresses found.'
-            report_failure(id, resp, task, error_message, clean_text(resp.text))
+            report_failure(id, resp, task, error_message, clean_text(page_content))
         
         # Fail if the address should have been on the results page, but isn't.
         # ie, the number of results is not high enough that we would expect RHUI to only list a subset.
-        num_addresses = int(num_addresses_search.group(1))
-        if num_addresses < 100:
+        if num_addresses < MAX_LISTED_ADDRESSES:
             error_message = 'RHUI failed to list address for uprn: ' + uprn + '.'
-            report_failure(id, resp, task, error_message, clean_text(resp.text))
+            report_failure(id, resp, task, error_message, clean_text(page_content))
 
         # Abort the task_set for this UPRN. 
         # It's unlucky enough to be for a postcode with more than 100 addresses
-        task.interrupt()
+        task.interrupt(reschedule=False)
             
-    # Page content includes the uprn, so extract its radio button id
-    page_extract1 = page_content[page_content.index(target_id_string):]
-    page_extract2 = page_extract1[page_extract1.index('value='):page_extract1.index('name=')]
-    page_extract2 = page_extract2.rstrip()
-    address_to_select = page_extract2[7:-1]
-    address_to_select = address_to_select.replace('&#34;', '"')
     #logger.info("Address extracted: " + address_to_select)
 
     return address_to_select
@@ -606,20 +682,22 @@ the whole page content is returned.
 Excess blank lines are removed to help condense the output.
 """
 def extract_key_page_content(id, task, resp, current_page):
+    page_content = get_response_view(resp).text
+
     # Use page content if start/end markers not set for the page
     if (not current_page.extract_start) or (not current_page.extract_end):
-        return clean_text(resp.text)
+        return clean_text(page_content)
         
     # Grab key page content
-    start = resp.text.find(current_page.extract_start)
-    end = resp.text.find(current_page.extract_end, start)
-    extract = resp.text[start:end]
+    start = page_content.find(current_page.extract_start)
+    end = page_content.find(current_page.extract_end, start)
+    extract = page_content[start:end]
     page_extract = clean_text(extract)
     
     # Fail if page doesn't contain expected start/end text
     if start < 0 or end <0:
         failure_message = f'Could not find start/end text on the {current_page.name} page. Offsets found {start},{end}'
-        report_failure(id, resp, task, failure_message, clean_text(resp.text))        
+        report_failure(id, resp, task, failure_message, clean_text(page_content))        
     
     return page_extract
     
@@ -631,11 +709,198 @@ def clean_text(text):
     return re.sub(r'\n\s*\n', '\n', text, flags=re.MULTILINE)
 
 
+"""
+Live counts of leased and available cases, as last reported by each worker. Only used by the master.
+"""
+worker_case_counts = {}
+
+"""
+Arrival counts, as last reported by each worker. Only used by the master.
+"""
+worker_arrival_counts = {}
+
+
+def create_arrival_pacer():
+    """
+    :return: The pacer for this worker's share of the journeys in the arrival schedule.
+    """
+
+    schedule = ArrivalSchedule.read(ARRIVAL_SCHEDULE)
+    if CASE_DISTRIBUTION == MASTER:
+        # The master splits the schedule between the workers it has, and changes each worker's share as they come and go
+        arrival_pacer = ArrivalPacer(schedule, *get_worker_arrival_share())
+        set_arrival_share_listener(arrival_pacer.set_share)
+        return arrival_pacer
+
+    if INSTANCE_NUM is None or MAX_INSTANCES is None:
+        sys.exit("ERROR: ARRIVAL_SCHEDULE needs the environment variables 'INSTANCE_NUM' and 'MAX_INSTANCES' to be set")
+    # Each worker process in a container takes its own share of the instance's journeys
+    num_processes = int(WORKER_PROCESSES)
+    process_num = (int(INSTANCE_NUM) - 1) * num_processes + int(WORKER_PROCESS_NUM)
+    return ArrivalPacer(schedule, process_num, int(MAX_INSTANCES) * num_processes)
+
+
 @events.init.add_listener
-def on_locust_init(environment, **kwargs):
+def on_locust_init(environment, web_ui=None, **kwargs):
+    global arrival_pacer, request_log
+
     if isinstance(environment.runner, MasterRunner):
         logger.info("Running as a MASTER node")
         setup_master()
     else:
         logger.info("Running as a WORKER node")
-        setup_worker()
+        if isinstance(environment.runner, WorkerRunner):
+            setup_worker(environment.runner.master_host, environment.runner.client_id)
+        else:
+            setup_worker()
+        failure_reporter.start()
+        if ARRIVAL_SCHEDULE:
+            arrival_pacer = create_arrival_pacer()
+        if REQUEST_LOG_DIR:
+            request_log = RequestLog(REQUEST_LOG_DIR, f'requests-{INSTANCE_NUM}-{os.getpid()}',
+                                     int(float(REQUEST_LOG_MAX_FILE_MB) * 1024 * 1024), int(REQUEST_LOG_MAX_FILES),
+                                     int(float(REQUEST_LOG_BUFFER_MB) * 1024 * 1024))
+            request_log.start()
+
+    if CASE_DISTRIBUTION == MASTER and isinstance(environment.runner, MasterRunner) and not web_ui:
+        sys.exit("ERROR: CASE_DISTRIBUTION 'master' needs the master's web UI, so it can't be run headless")
+
+    if web_ui:
+        @web_ui.app.route('/cases')
+        def case_counts():
+            if isinstance(environment.runner, MasterRunner):
+                connected = {id: counts for id, counts in worker_case_counts.items() if id in environment.runner.clients}
+                totals = sum_case_counts(connected)
+                if CASE_DISTRIBUTION == MASTER:
+                    totals['distribution'] = get_case_source_counts()
+                return jsonify(totals)
+            return jsonify(get_case_counts())
+
+        if CASE_DISTRIBUTION == MASTER and isinstance(environment.runner, MasterRunner):
+            @web_ui.app.route(CASE_CHUNKS_PATH, methods=['POST'])
+            def case_chunk():
+                chunk_request = request.get_json(force=True)
+                workers = environment.runner.clients.values()
+                connected = {worker.id for worker in workers if worker.state != STATE_MISSING}
+                missing = {worker.id for worker in workers if worker.state == STATE_MISSING}
+                return jsonify(get_case_chunk(str(chunk_request['worker']), int(chunk_request['max_cases']),
+                                              [int(index) for index in chunk_request.get('released', ())],
+                                              connected, missing))
+
+        @web_ui.app.route('/steps')
+        def step_latency_summary():
+            return jsonify(step_latencies.get_summary())
+
+        @web_ui.app.route('/arrivals')
+        def arrival_counts():
+            return jsonify(get_arrival_counts(environment))
+
+        get_case_distribution = None
+        if CASE_DISTRIBUTION == MASTER and isinstance(environment.runner, MasterRunner):
+            get_case_distribution = get_case_source_counts
+        metrics_cache = MetricsCache(environment.runner, step_latencies, get_case_distribution)
+
+        @web_ui.app.route('/metrics')
+        def metrics():
+            return Response(metrics_cache.get_text(), content_type=CONTENT_TYPE)
+
+
+"""
+Returns the number of journeys which were intended to start and which did start, when journeys are started at a
+scheduled arrival rate. On the master these are the totals for the workers, plus a breakdown by worker.
+"""
+def get_arrival_counts(environment):
+    if isinstance(environment.runner, MasterRunner):
+        connected = {id: counts for id, counts in worker_arrival_counts.items() if id in environment.runner.clients}
+        return sum_arrival_counts(connected)
+    if arrival_pacer:
+        return sum_arrival_counts({'local': arrival_pacer.get_counts()})
+    return {}
+
+
+@events.test_start.add_listener
+def on_test_start(**kwargs):
+    step_latencies.clear()
+    if arrival_pacer:
+        arrival_pacer.start()
+
+
+@events.reset_stats.add_listener
+def on_reset_stats():
+    step_latencies.clear()
+
+
+@events.test_stop.add_listener
+def on_test_stop(environment, **kwargs):
+    failure_reporter.log_summary()
+
+    if not isinstance(environment.runner, WorkerRunner):
+        log_step_latencies()
+
+    if ARRIVAL_SCHEDULE:
+        counts = get_arrival_counts(environment)
+        if counts:
+            logger.info('Journeys intended: %d, started: %d, missed: %d, mean start lag: %.3fs, max start lag: %.3fs'
+                        % (counts['intended'], counts['started'], counts['missed'], counts['mean_lag'], counts['max_lag']))
+
+
+@events.quitting.add_listener
+def on_quitting(**kwargs):
+    failure_reporter.stop()
+    stop_worker()
+    if request_log:
+        request_log.stop()
+
+
+@events.report_to_master.add_listener
+def on_report_to_master(client_id, data):
+    data['case_counts'] = get_case_counts()
+    deltas = step_latencies.take_deltas()
+    if deltas:
+        data['step_latencies'] = deltas
+    if arrival_pacer:
+        data['arrival_counts'] = arrival_pacer.get_counts()
+
+
+@events.worker_report.add_listener
+def on_worker_report(client_id, data):
+    if 'case_counts' in data:
+        worker_case_counts[client_id] = data['case_counts']
+    if 'arrival_counts' in data:
+        worker_arrival_counts[client_id] = data['arrival_counts']
+    if 'step_latencies' in data:
+        step_latencies.add_deltas(data['step_latencies'])
+
+
+"""
+Totals the case counts reported by the workers, and also lists them by worker.
+"""
+def sum_case_counts(counts_by_worker):
+    totals = {'leased': 0, 'available': 0, 'exhausted': 0, 'shared': 0, 'unlisted': 0, 'retired': 0, 'journeys_saved': 0}
+    for counts in counts_by_worker.values():
+        for name in totals:
+            totals[name] += counts.get(name, 0)
+    totals['workers'] = counts_by_worker
+    return totals
+
+
+"""
+Logs the latency percentiles for each step and journey.
+"""
+def log_step_latencies():
+    summary = step_latencies.get_summary()
+    if not summary['steps']:
+        return
+
+    columns = ('p50', 'p90', 'p95', 'p99', 'p99.9', 'max')
+    headings = ['Count'] + [column.capitalize() for column in columns]
+    if LATENCY_CORRECTION:
+        headings += ['Corr. ' + column for column in ('p50', 'p99', 'p99.9')]
+
+    lines = ['%-40s' % 'Step/Journey' + ''.join('%14s' % heading for heading in headings)]
+    for name, latencies in list(summary['steps'].items()) + list(summary['journeys'].items()):
+        values = ['%14d' % latencies['count']] + ['%14.1f' % latencies[column] for column in columns]
+        if 'corrected' in latencies:
+            values += ['%14.1f' % latencies['corrected'][column] for column in ('p50', 'p99', 'p99.9')]
+        lines.append('%-40s' % name + ''.join(values))
+    logger.info('Step latencies (ms):\n' + '\n'.join(lines))
@@ -0,0 +1,223 @@
+"""
+Renders the state of a test in the OpenMetrics text format, so that Prometheus can scrape it from the master during
+long soak runs. See https://openmetrics.io
+
+The metrics are built from state which the master already holds: Locust's request statistics, the worker nodes and
+the merged step latency histograms. So a scrape doesn't add any work for the workers or any messages between the
+master and the workers. That state only changes when the workers report, every few seconds, so the rendered metrics
+are reused until the next report is due, however often they're scraped.
+"""
+import math
+import time
+
+from locust.runners import WORKER_REPORT_INTERVAL, MasterRunner, STATE_INIT, STATE_SPAWNING, STATE_RUNNING, STATE_CLEANUP, STATE_STOPPING, \
+    STATE_STOPPED, STATE_MISSING
+
+from .step_latency import PERCENTILES
+
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+STATES = (STATE_INIT, STATE_SPAWNING, STATE_RUNNING, STATE_CLEANUP, STATE_STOPPING, STATE_STOPPED, STATE_MISSING)
+
+
+def escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_sample(name, labels, value):
+    """
+    :param name: Is the sample name.
+    :param labels: Is a tuple of (label, value) pairs.
+    :param value: Is the sample value.
+    :return: The sample line.
+    """
+
+    if labels:
+        name += '{' + ','.join('%s="%s"' % (label, escape_label_value(label_value))
+                               for (label, label_value) in labels) + '}'
+    return '%s %s' % (name, format_value(value))
+
+
+def format_value(value):
+    """
+    :param value: Is the sample value.
+    :return: The value as OpenMetrics text, which spells infinities and NaN differently from Python.
+    """
+
+    if not isinstance(value, float):
+        return str(int(value))
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(value)
+
+
+class MetricsWriter:
+    """
+    Collects metric families and their samples as OpenMetrics text.
+    """
+
+    def __init__(self):
+        self.lines = []
+
+    def family(self, name, metric_type, help_text, unit=None):
+        self.lines.append('# TYPE %s %s' % (name, metric_type))
+        if unit:
+            self.lines.append('# UNIT %s %s' % (name, unit))
+        self.lines.append('# HELP %s %s' % (name, help_text))
+
+    def sample(self, name, labels, value):
+        self.lines.append(format_sample(name, labels, value))
+
+    def get_text(self):
+        return '\n'.join(self.lines + ['# EOF', ''])
+
+
+def write_runner_metrics(writer, runner):
+    writer.family('locust_users', 'gauge', 'Number of running simulated users.')
+    writer.sample('locust_users', (), runner.user_count)
+
+    writer.family('locust_state', 'stateset', 'State of the test.')
+    for state in STATES:
+        writer.sample('locust_state', (('locust_state', state),), int(runner.state == state))
+
+    if not isinstance(runner, MasterRunner):
+        return
+
+    workers = list(runner.clients.values())
+    writer.family('locust_workers', 'gauge', 'Number of workers in each state.')
+    for state in STATES:
+        writer.sample('locust_workers', (('state', state),), sum(1 for worker in workers if worker.state == state))
+
+    writer.family('locust_worker_up', 'gauge', 'Whether the worker is sending heartbeats.')
+    for worker in workers:
+        writer.sample('locust_worker_up', (('worker', worker.id),), int(worker.state != STATE_MISSING))
+
+    writer.family('locust_worker_users', 'gauge', 'Number of simulated users running on the worker.')
+    for worker in workers:
+        writer.sample('locust_worker_users', (('worker', worker.id),), worker.user_count)
+
+    writer.family('locust_worker_cpu_percent', 'gauge', 'CPU usage of the worker process.')
+    for worker in workers:
+        writer.sample('locust_worker_cpu_percent', (('worker', worker.id),), float(worker.cpu_usage))
+
+
+def write_request_metrics(writer, stats):
+    entries = sorted(stats.entries.values(), key=lambda entry: (entry.method, entry.name))
+    labelled_entries = [((('method', entry.method), ('name', entry.name)), entry) for entry in entries]
+    labelled_entries.append(((('method', ''), ('name', 'Aggregated')), stats.total))
+
+    writer.family('locust_requests', 'counter', 'Number of requests since the statistics were last reset.')
+    for (labels, entry) in labelled_entries:
+        writer.sample('locust_requests_total', labels, entry.num_requests)
+
+    writer.family('locust_request_failures', 'counter', 'Number of failures since the statistics were last reset.')
+    for (labels, entry) in labelled_entries:
+        writer.sample('locust_request_failures_total', labels, entry.num_failures)
+
+    writer.family('locust_current_rps', 'gauge', 'Requests per second over the last few seconds.')
+    for (labels, entry) in labelled_entries:
+        writer.sample('locust_current_rps', labels, float(entry.current_rps))
+
+    writer.family('locust_current_failures_per_second', 'gauge', 'Failures per second over the last few seconds.')
+    for (labels, entry) in labelled_entries:
+        writer.sample('locust_current_failures_per_second', labels, float(entry.current_fail_per_sec))
+
+
+def write_latency_summaries(writer, name, help_text, label, histograms):
+    """
+    Writes a summary, with the percentile latencies, for each histogram.
+    :param histograms: Is a dict of LatencyHistograms by label value.
+    """
+
+    writer.family(name, 'summary', help_text, 'seconds')
+    for label_value in sorted(histograms):
+        histogram = histograms[label_value]
+        labels = ((label, label_value),)
+        for (percentile, value) in zip(PERCENTILES, histogram.get_values_at_percentiles(PERCENTILES)):
+            writer.sample(name, labels + (('quantile', '%g' % (percentile / 100)),), value / 1000000)
+        writer.sample(name + '_sum', labels, histogram.total / 1000000)
+        writer.sample(name + '_count', labels, histogram.total_count)
+
+
+# The step latency summaries, as (name, help, label, StepLatencies group)
+STEP_LATENCY_SUMMARIES = (
+    ('locust_step_latency_seconds', 'Response time of each step.', 'step', 'steps'),
+    ('locust_journey_step_latency_seconds', 'Response time of the steps of each journey.', 'journey', 'journeys'),
+    ('locust_corrected_step_latency_seconds', 'Response time of each step, corrected for coordinated omission.',
+     'step', 'corrected_steps'),
+    ('locust_corrected_journey_step_latency_seconds', 'Response time of the steps of each journey, corrected for '
+     'coordinated omission.', 'journey', 'corrected_journeys'),
+)
+
+
+def write_step_latency_metrics(writer, step_latencies):
+    for (name, help_text, label, group) in STEP_LATENCY_SUMMARIES:
+        if group.startswith('corrected_') and not step_latencies.corrected:
+            continue
+        write_latency_summaries(writer, name, help_text, label, step_latencies.histograms[group])
+
+
+def write_case_distribution_metrics(writer, counts):
+    """
+    :param counts: Is the case distribution counts, as returned by CaseSource.get_counts().
+    """
+
+    writer.family('locust_cases_unassigned', 'gauge', 'Number of cases which the master holds for the workers.')
+    writer.sample('locust_cases_unassigned', (), counts['remaining'])
+
+    writer.family('locust_worker_cases', 'gauge', 'Number of cases handed out to the worker.')
+    for worker_id in sorted(counts['workers']):
+        writer.sample('locust_worker_cases', (('worker', worker_id),), counts['workers'][worker_id])
+
+    writer.family('locust_case_rebalances', 'counter', 'Number of times the cases were rebalanced between workers.')
+    for reason in sorted(counts['rebalances']):
+        writer.sample('locust_case_rebalances_total', (('reason', reason),), counts['rebalances'][reason])
+
+    writer.family('locust_cases_reassigned', 'counter', 'Number of cases taken back from a worker to be handed out '
+                  'again.')
+    writer.sample('locust_cases_reassigned_total', (), counts['reassigned'])
+
+
+def render_metrics(runner, step_latencies, case_distribution=None):
+    """
+    :param runner: Is the Locust runner, normally the MasterRunner.
+    :param step_latencies: Is the StepLatencies, which on the master holds the histograms merged from the workers.
+    :param case_distribution: Is the case distribution counts, when the master hands out the cases.
+    :return: The metrics in the OpenMetrics text format.
+    """
+
+    writer = MetricsWriter()
+    write_runner_metrics(writer, runner)
+    write_request_metrics(writer, runner.stats)
+    write_step_latency_metrics(writer, step_latencies)
+    if case_distribution:
+        write_case_distribution_metrics(writer, case_distribution)
+    return writer.get_text()
+
+
+class MetricsCache:
+    """
+    Holds the rendered metrics for up to max_age seconds.
+    """
+
+    def __init__(self, runner, step_latencies, get_case_distribution=None, max_age=WORKER_REPORT_INTERVAL):
+        """
+        :param get_case_distribution: Is a function returning the case distribution counts, or None.
+        """
+
+        self.runner = runner
+        self.step_latencies = step_latencies
+        self.get_case_distribution = get_case_distribution
+        self.max_age = max_age
+        self._text = None
+        self._rendered_at = 0.0
+
+    def get_text(self):
+        now = time.monotonic()
+        if self._text is None or now - self._rendered_at >= self.max_age:
+            case_distribution = self.get_case_distribution() if self.get_case_distribution else None
+            self._text = render_metrics(self.runner, self.step_latencies, case_distribution)
+            self._rendered_at = now
+        return self._text
@@ -0,0 +1,151 @@
+import re
+from enum import Enum
+
+
+"""
+This enum defines the applications pages.
+
+To identify pages each entry must define some 'title' text, which should only appear on that 
+particular page.
+
+If the page specifies some text extract_start/end then the text within this range will be
+used in the error message to help debug what has gone wrong. 
+If the extract start/end is not specified then the whole page will be added to the error message.
+""" 
+class Page(Enum):
+    START           = ('<title>Start census - Census 2021</title>',
+                       'Start census</h1>',
+                       'Enter your 16-character access code'
+    				  )
+    ADDRESS_CORRECT = ('<title>Is this the correct address? - Census 2021</title>',
+                       '<h1 class="question__title">',
+                       '<fieldset'
+                      )
+    EQ_LAUNCHED     = ('302: Found',
+                       '',
+                       ''
+                      )
+    CALL_CONTACT_CENTRE = ('<title>Call Census Customer Contact Centre - Census 2021</title>',
+                       '<main',
+                       '</main>'
+                      )
+    ERROR           = ('<title>Error - Census 2021</title>',
+                       'id="main-content"',
+                       '<footer'
+                      )
+    ERROR_403       = ('<title>403</title>',
+                       '',
+                       ''
+                      )
+    ERROR_502       = ('<title>502 Server Error</title>',
+                       '',
+                       ''
+                      )
+    ERROR_GENERIC   = ('<h1>Error: Server Error</h1>',
+                       '',
+                       ''
+                      )
+    ENTER_ADDRESS = ('>What is your postcode?</h1>',
+                       '<h1',
+                       '</h1>')
+    SELECT_ADDRESS = ('<title>Select your address - Census 2021</title>',
+                      '<h1 class="question__title">Select your address</h1>',
+                      'I cannot find my address')
+    SELECT_METHOD = ('<title>How would you like to receive a new access code? - Census 2021</title>',
+                     '<h1 class="question__title">How would you like to receive a new household access code?</h1>',
+                     'To request a census in a different format or for further help, please')
+    ENTER_MOBILE = ('<title>What is your mobile phone number? - Census 2021</title>',
+                    '<h1 class="question__title">What is your mobile phone number?</h1>',
+                    'Continue')
+    HOUSEHOLD_INFORMATION = ('<title>Request a new household access code - Census 2021</title>',
+                       '<main',
+                       '<p>')
+    CONFIRM_MOBILE = ('<title>Is this mobile phone number correct? - Census 2021</title>',
+                      '<h1 class="question__title">Is this mobile phone number correct?</h1>',
+                      'Continue')
+    ENTER_NAME = ('<title>What is your name? - Census 2021</title>',
+                  '<h1 class="question__title">What is your name?</h1>',
+                  'Continue')
+    CONFIRM_NAME = ('<title>Do you want to send a new access code to this address? - Census 2021</title>',
+                    '<h1 class="question__title">Do you want to send a new household access code to this address?</h1>',
+                    'Continue')
+    CODE_SENT = ('<title>We have sent an access code - Census 2021</title>',
+                 '<div class="panel__body svg-icon-margin--xl"',
+                 '</div>')
+
+  
+    def __init__(self, title, extract_start, extract_end):
+        self.title = title
+        self.extract_start = extract_start
+        self.extract_end = extract_end
+
+
+"""
+Pages are identified in one pass over the page, by a search for the page title and the markers of the pages whose
+title isn't a page marker, such as the server error page, all at once. A title is near the start of the page, so
+for most pages the search stops there. If the page holds the markers of several pages then the page listed first
+wins, as when each page was checked in turn, so an error shown within a page's layout is still reported as the error.
+"""
+TITLE_MARKER = re.compile(r'<title>[^<]*</title>')
+PAGES_BY_TITLE = {page.title: page for page in Page if TITLE_MARKER.fullmatch(page.title)}
+PAGE_POSITIONS = {page: position for (position, page) in enumerate(Page)}
+
+# The markers of the other pages, matched from the '<' of the tag which holds them. Every alternative of the search
+# then starts with '<', so the re module skips from tag to tag rather than trying each alternative at every character.
+BODY_MARKER_PATTERNS = {
+    Page.EQ_LAUNCHED: r'h1>302: Found</h1>',
+    Page.ERROR_GENERIC: r'h1>Error: Server Error</h1>',
+    Page.ENTER_ADDRESS: r'h1[^>]*>What is your postcode\?</h1>',
+}
+# Once the title has been found, a page listed before every body marker page can't be beaten, so the search stops
+FIRST_BODY_MARKER_POSITION = min(PAGE_POSITIONS[page] for page in BODY_MARKER_PATTERNS)
+
+# The lookahead for the first letter of each alternative rejects most tags before any alternative is tried
+PAGE_MARKERS = re.compile('<(?=[t%s])(?:(?P<title>title>[^<]*</title>)|%s)' % (
+    ''.join(sorted({pattern[0] for pattern in BODY_MARKER_PATTERNS.values()})),
+    '|'.join('(?P<%s>%s)' % (page.name, pattern) for (page, pattern) in BODY_MARKER_PATTERNS.items())))
+PAGE_MARKERS_BYTES = re.compile(PAGE_MARKERS.pattern.encode('ascii'))
+
+# A redirect from aiohttp has a plain text body with no tags, which is only checked for at the start of the page
+REDIRECT_BODY = Page.EQ_LAUNCHED.title
+REDIRECT_BODY_BYTES = REDIRECT_BODY.encode('ascii')
+
+
+def find_page(page_content):
+    """
+    Identifies a page from its content.
+    :param page_content: Is the text of the page.
+    :return: The Page, or None if the page can't be identified.
+    """
+
+    redirect = Page.EQ_LAUNCHED if page_content.startswith(REDIRECT_BODY) else None
+    return match_page(PAGE_MARKERS.finditer(page_content), str, redirect)
+
+
+def match_page(matches, decode, found=None):
+    """
+    Picks the page from the page markers found in a page.
+    :param matches: Is an iterator of the matches of PAGE_MARKERS, or PAGE_MARKERS_BYTES, in the page.
+    :param decode: Is a function which converts a matched title to text.
+    :param found: Is a Page already identified from the page, or None.
+    :return: The first Page listed whose marker the page contains, or None if it contains none. Only the page's
+    first title counts.
+    """
+
+    title_found = False
+    for match in matches:
+        if match.lastgroup == 'title':
+            if title_found:
+                continue
+            title_found = True
+            page = PAGES_BY_TITLE.get(decode(match.group()))
+            if page is None:
+                continue
+        else:
+            page = Page[match.lastgroup]
+
+        if found is None or PAGE_POSITIONS[page] < PAGE_POSITIONS[found]:
+            found = page
+        if title_found and PAGE_POSITIONS[found] <= FIRST_BODY_MARKER_POSITION:
+            break
+    return found
@@ -0,0 +1,137 @@
+import csv
+import logging
+import os
+import struct
+import sys
+from collections import Counter
+
+from . import FILE_NAME, POSTCODE_INDEX_FILE_NAME
+
+logger = logging.getLogger('performance')
+
+# A postcode index file holds a header, which identifies the version of the event data file it was built from,
+# followed by one entry per postcode. An entry is the number of addresses for the postcode, the length of the
+# postcode and then the postcode itself.
+POSTCODE_INDEX_MAGIC = b'RHPCIDX1'
+POSTCODE_INDEX_HEADER = struct.Struct('<8sQQ')
+POSTCODE_ENTRY = struct.Struct('<IB')
+
+
+def normalise_postcode(postcode):
+    """
+    :return: The postcode in upper case without spaces, as RH compares them.
+    """
+
+    return postcode.replace(' ', '').upper()
+
+
+def get_postcode_index_file_name(file_name):
+    """
+    Works out where the postcode index for an event data file lives.
+    :param file_name: Is the name of the event data file.
+    :return: The name of the postcode index file.
+    """
+
+    if file_name == FILE_NAME:
+        return POSTCODE_INDEX_FILE_NAME
+    return file_name + '.pcx'
+
+
+def load_postcode_counts(file_name):
+    """
+    Returns the number of addresses in the event data file for each postcode. An existing index file is reused if it
+    was built from the current version of the event data file, otherwise the counts are built and saved for the
+    next run.
+    Unlike the event data index, the counts cover the whole file rather than one worker's section, as RH lists every
+    address for a postcode.
+    :param file_name: Is the name of the event data file.
+    :return: Dict of address counts, keyed by normalised postcode.
+    """
+
+    index_file_name = get_postcode_index_file_name(file_name)
+    data_stat = os.stat(file_name)
+
+    counts = read_postcode_index_file(index_file_name, data_stat)
+    if counts is not None:
+        logger.info('Reusing postcode index %s' % index_file_name)
+        return counts
+
+    counts = build_postcode_counts(file_name)
+    save_postcode_index_file(index_file_name, data_stat, counts)
+    return counts
+
+
+def build_postcode_counts(file_name):
+    """
+    Scans the event data file once, counting the addresses for each postcode.
+    :param file_name: Is the name of the event data file.
+    :return: Dict of address counts, keyed by normalised postcode.
+    """
+
+    with open(file_name, 'r', newline='') as infile:
+        reader = csv.reader(infile)
+        position = next(reader).index('postcode')
+        return dict(Counter(normalise_postcode(row[position]) for row in reader if row))
+
+
+def read_postcode_index_file(index_file_name, data_stat):
+    """
+    Reads an existing postcode index file.
+    :param index_file_name: Is the name of the index file.
+    :param data_stat: Is the os.stat() result for the event data file, used to check that the index is current.
+    :return: Dict of address counts, keyed by normalised postcode, or None if there is no usable index file.
+    """
+
+    try:
+        with open(index_file_name, 'rb') as index_file:
+            index = index_file.read()
+    except OSError:
+        return None
+
+    if len(index) < POSTCODE_INDEX_HEADER.size:
+        return None
+    (magic, data_size, data_mtime) = POSTCODE_INDEX_HEADER.unpack_from(index)
+    if magic != POSTCODE_INDEX_MAGIC or data_size != data_stat.st_size or data_mtime != data_stat.st_mtime_ns:
+        logger.info('Ignoring out of date postcode index %s' % index_file_name)
+        return None
+
+    counts = {}
+    position = POSTCODE_INDEX_HEADER.size
+    while position < len(index):
+        (count, length) = POSTCODE_ENTRY.unpack_from(index, position)
+        position += POSTCODE_ENTRY.size
+        counts[index[position:position + length].decode('utf-8')] = count
+        position += length
+    return counts
+
+
+def save_postcode_index_file(index_file_name, data_stat, counts):
+    """
+    Saves the postcode counts so that later runs can reuse them. Failure to save is not fatal, as the counts can
+    always be rebuilt.
+    :param index_file_name: Is the name of the index file.
+    :param data_stat: Is the os.stat() result for the event data file that the counts were built from.
+    :param counts: Is the dict of address counts, keyed by normalised postcode.
+    """
+
+    temp_file_name = index_file_name + '.tmp'
+    try:
+        with open(temp_file_name, 'wb') as index_file:
+            index_file.write(POSTCODE_INDEX_HEADER.pack(POSTCODE_INDEX_MAGIC, data_stat.st_size, data_stat.st_mtime_ns))
+            for (postcode, count) in counts.items():
+                encoded = postcode.encode('utf-8')
+                index_file.write(POSTCODE_ENTRY.pack(count, len(encoded)))
+                index_file.write(encoded)
+        os.replace(temp_file_name, index_file_name)
+    except OSError as e:
+        logger.warning('Unable to save postcode index %s: %s' % (index_file_name, e))
+
+
+if __name__ == '__main__':
+    # Prebuild the index, so that it can be shipped alongside the event data file
+    if not os.path.exists(FILE_NAME):
+        sys.stdout.write('No event data file at %s. Postcode index not built\n' % FILE_NAME)
+        sys.exit(0)
+    postcode_counts = load_postcode_counts(FILE_NAME)
+    sys.stdout.write('Indexed %d postcodes in %s. The largest has %d addresses\n'
+                     % (len(postcode_counts), FILE_NAME, max(postcode_counts.values(), default=0)))
@@ -0,0 +1,253 @@
+import functools
+import logging
+import time
+from collections import deque, OrderedDict
+
+import pika
+
+logger = logging.getLogger('performance')
+
+# How often to log progress while publishing, in seconds
+PROGRESS_INTERVAL = 10.0
+
+
+class PublishError(Exception):
+    """
+    Raised when publishing stops before every message has been confirmed by the broker.
+    """
+
+
+class PublishStats:
+    """
+    Counts of the messages sent by a publisher.
+    """
+
+    def __init__(self):
+        self.start_time = time.monotonic()
+        self.end_time = None
+        self.published = 0
+        self.confirmed = 0
+        self.nacked = 0
+
+    def finish(self):
+        self.end_time = time.monotonic()
+
+    def add(self, other):
+        """
+        Adds the counts from another publisher, eg, one that published another section of the data in parallel.
+        """
+        self.published += other.published
+        self.confirmed += other.confirmed
+        self.nacked += other.nacked
+
+    @property
+    def elapsed(self):
+        return (self.end_time or time.monotonic()) - self.start_time
+
+    @property
+    def rate(self):
+        """
+        :return: The number of confirmed messages per second.
+        """
+        elapsed = self.elapsed
+        return self.confirmed / elapsed if elapsed > 0 else 0.0
+
+    def __str__(self):
+        return '%d messages confirmed in %.1fs (%.0f msgs/sec, %d nacked and resent)' % (
+            self.confirmed, self.elapsed, self.rate, self.nacked)
+
+
+def publish_basic(url, exchange, messages, on_confirm=None):
+    """
+    Publishes messages one at a time on a single channel.
+    Without an on_confirm callback the messages are sent without publisher confirms. With one the channel runs in
+    confirm mode, so each message waits for the broker to confirm it before the next is sent, and the callback only
+    sees confirmed messages.
+    :param url: Is the AMQP URL of the broker.
+    :param exchange: Is the exchange to publish to.
+    :param messages: Is an iterable of (routing_key, body) tuples. Each tuple may carry further items, which are
+    only used by the on_confirm callback.
+    :param on_confirm: Is an optional callback, which is passed each message once the broker has confirmed it.
+    :return: PublishStats for the run.
+    :raises PublishError: if the broker nacks a message.
+    """
+
+    stats = PublishStats()
+    connection = pika.BlockingConnection(pika.URLParameters(url))
+    channel = connection.channel()
+    if on_confirm:
+        channel.confirm_delivery()
+
+    try:
+        for message in messages:
+            try:
+                channel.basic_publish(exchange=exchange, routing_key=message[0], body=message[1])
+            except pika.exceptions.NackError as e:
+                raise PublishError('The broker nacked a message after %d were confirmed: %s'
+                                   % (stats.published, e)) from e
+            stats.published += 1
+            if on_confirm:
+                on_confirm(message)
+        stats.confirmed = stats.published
+    finally:
+        connection.close()
+
+    stats.finish()
+    return stats
+
+
+class PipelinedPublisher:
+    """
+    Publishes messages over several channels without waiting for each message to be confirmed.
+    Each channel runs in confirm mode and keeps up to max_unconfirmed messages in flight. The broker confirms them
+    in batches, and each confirmation lets the channel send the next batch. Any message which the broker nacks is
+    sent again.
+    """
+
+    def __init__(self, url, exchange, num_channels=4, max_unconfirmed=1000, on_confirm=None,
+                 connection_class=pika.SelectConnection):
+        """
+        :param url: Is the AMQP URL of the broker.
+        :param exchange: Is the exchange to publish to.
+        :param num_channels: Is the number of channels to publish on.
+        :param max_unconfirmed: Is the maximum number of unconfirmed messages per channel.
+        :param on_confirm: Is an optional callback, which is passed each message once the broker has confirmed it.
+        :param connection_class: Is the asynchronous pika connection class. The tests replace it with a fake broker.
+        """
+
+        self.url = url
+        self.exchange = exchange
+        self.num_channels = num_channels
+        self.max_unconfirmed = max_unconfirmed
+        self.on_confirm = on_confirm
+        self.connection_class = connection_class
+
+        self._connection = None
+        self._messages = None
+        self._retries = deque()
+        self._unconfirmed = {}
+        self._next_tag = {}
+        self._all_sent = False
+        self._closing = False
+        self._error = None
+        self._stats = None
+        self._last_progress = 0.0
+
+    def publish_all(self, messages):
+        """
+        Publishes the messages and waits until the broker has confirmed all of them.
+        :param messages: Is an iterable of (routing_key, body) tuples. It is read lazily, so can be a generator.
+        Each tuple may carry further items, which are only used by the on_confirm callback.
+        :return: PublishStats for the run.
+        :raises PublishError: if the connection fails before all messages are confirmed.
+        """
+
+        self._messages = iter(messages)
+        self._stats = PublishStats()
+        self._last_progress = self._stats.start_time
+
+        self._connection = self.connection_class(pika.URLParameters(self.url),
+                                                 on_open_callback=self._on_connection_open,
+                                                 on_open_error_callback=self._on_connection_error,
+                                                 on_close_callback=self._on_connection_closed)
+        self._connection.ioloop.start()
+
+        self._stats.finish()
+        if self._error:
+            raise PublishError('Publishing stopped after %d of %d messages confirmed: %s'
+                               % (self._stats.confirmed, self._stats.published, self._error))
+        return self._stats
+
+    def _on_connection_open(self, connection):
+        for _ in range(self.num_channels):
+            connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_connection_error(self, connection, error):
+        self._error = error
+        connection.ioloop.stop()
+
+    def _on_connection_closed(self, connection, reason):
+        if not self._closing:
+            self._error = reason
+        connection.ioloop.stop()
+
+    def _on_channel_open(self, channel):
+        channel.add_on_close_callback(self._on_channel_closed)
+        self._unconfirmed[channel] = OrderedDict()
+        self._next_tag[channel] = 1
+        channel.confirm_delivery(functools.partial(self._on_delivery_confirmation, channel),
+                                 callback=lambda _: self._publish_batch(channel))
+
+    def _on_channel_closed(self, channel, reason):
+        if not self._closing:
+            self._error = reason
+            self._close()
+
+    def _next_message(self):
+        if self._retries:
+            return self._retries.popleft()
+        if self._all_sent:
+            return None
+        message = next(self._messages, None)
+        if message is None:
+            self._all_sent = True
+        return message
+
+    def _publish_batch(self, channel):
+        """
+        Tops up the channel's unconfirmed messages to the limit.
+        """
+
+        unconfirmed = self._unconfirmed[channel]
+        while len(unconfirmed) < self.max_unconfirmed:
+            message = self._next_message()
+            if message is None:
+                break
+            channel.basic_publish(self.exchange, message[0], message[1])
+            unconfirmed[self._next_tag[channel]] = message
+            self._next_tag[channel] += 1
+            self._stats.published += 1
+
+        if self._all_sent and not self._retries and not any(self._unconfirmed.values()):
+            self._close()
+
+    def _on_delivery_confirmation(self, channel, method_frame):
+        method = method_frame.method
+        unconfirmed = self._unconfirmed[channel]
+        acked = isinstance(method, pika.spec.Basic.Ack)
+
+        # Delivery tags are issued in order, so a multiple confirmation covers the oldest unconfirmed messages
+        if method.multiple:
+            tags = []
+            for tag in unconfirmed:
+                if tag > method.delivery_tag:
+                    break
+                tags.append(tag)
+        else:
+            tags = [method.delivery_tag]
+
+        for tag in tags:
+            message = unconfirmed.pop(tag, None)
+            if message is None:
+                continue
+            if acked:
+                self._stats.confirmed += 1
+                if self.on_confirm:
+                    self.on_confirm(message)
+            else:
+                self._stats.nacked += 1
+                self._retries.append(message)
+
+        self._report_progress()
+        self._publish_batch(channel)
+
+    def _report_progress(self):
+        now = time.monotonic()
+        if now - self._last_progress >= PROGRESS_INTERVAL:
+            self._last_progress = now
+            logger.info('Publishing: %s' % self._stats)
+
+    def _close(self):
+        if not self._closing:
+            self._closing = True
+            self._connection.close()
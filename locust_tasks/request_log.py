@@ -0,0 +1,197 @@
+"""
+Streams a record of every verified request to local disk, for post-mortems which need more than the aggregated
+statistics, eg, which UAC got a 502 at what time.
+
+The records are packed into an in-memory buffer, which is bounded, and a writer greenlet hands the buffer to gevent's
+thread pool to be written. So the users never wait for the disk. If the disk can't keep up then records are dropped
+once the buffer is full, and the number dropped is logged. The files are rotated by size, and only the newest are
+kept.
+
+A log file starts with REQUEST_LOG_MAGIC, followed by the records. Each record is a REQUEST_RECORD, holding the
+request's start time (seconds since the epoch), response time (microseconds), HTTP status, response size and the
+lengths of the step ID and case key, followed by the UTF-8 step ID and case key. To convert the files to CSV:
+    $ python -m locust_tasks.request_log /tmp/request_log/*.rlog > requests.csv
+"""
+import csv
+import glob
+import logging
+import os
+import struct
+import sys
+import time
+
+import gevent
+from gevent.event import Event
+
+logger = logging.getLogger('performance')
+
+REQUEST_LOG_MAGIC = b'RHRLOG1\n'
+REQUEST_RECORD = struct.Struct('<dIHIBB')
+
+REQUEST_LOG_SUFFIX = '.rlog'
+
+
+class RequestLog:
+    """
+    A size rotated binary log of requests, written without blocking the users.
+    """
+
+    def __init__(self, directory, file_prefix, max_file_bytes, max_files, max_buffer_bytes, flush_interval=1.0):
+        """
+        :param directory: Is the directory to write the log files to. It's created if need be.
+        :param file_prefix: Is the start of the name of each log file, to tell the writers apart.
+        :param max_file_bytes: Is the size at which a log file is closed and the next one started.
+        :param max_files: Is the number of log files to keep. The oldest are deleted.
+        :param max_buffer_bytes: Is the most that records can take up in memory, before they're written.
+        :param flush_interval: Is the number of seconds between writes.
+        """
+
+        self.directory = directory
+        self.file_prefix = file_prefix
+        self.max_file_bytes = max_file_bytes
+        self.max_files = max_files
+        self.max_buffer_bytes = max_buffer_bytes
+        self.flush_interval = flush_interval
+
+        self.recorded = 0
+        self.dropped = 0
+        self._dropped_logged = 0
+        self._buffer = bytearray()
+        self._file = None
+        self._file_size = 0
+        self._file_num = 0
+        self._file_names = []
+        self._stop_event = Event()
+        self._writer_greenlet = None
+
+    def record(self, start_time, step, status, response_time, content_size, case_key):
+        """
+        Adds a request to the log. This only packs the record into the buffer, or drops it if the buffer is full.
+        :param start_time: Is the time the request started, in seconds since the epoch.
+        :param step: Is the step ID.
+        :param status: Is the HTTP status of the response.
+        :param response_time: Is the response time in milliseconds.
+        :param content_size: Is the size of the response in bytes.
+        :param case_key: Identifies the case used by the journey, eg, its UAC or postcode.
+        """
+
+        if len(self._buffer) >= self.max_buffer_bytes:
+            self.dropped += 1
+            return
+
+        step_bytes = step.encode()[:255]
+        case_key_bytes = case_key.encode()[:255]
+        self._buffer += REQUEST_RECORD.pack(start_time, min(int(response_time * 1000), 0xffffffff),
+                                            min(status or 0, 0xffff), min(content_size or 0, 0xffffffff),
+                                            len(step_bytes), len(case_key_bytes))
+        self._buffer += step_bytes
+        self._buffer += case_key_bytes
+        self.recorded += 1
+
+    def start(self):
+        """
+        Starts the writer greenlet.
+        """
+
+        if self._writer_greenlet is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._stop_event.clear()
+            self._writer_greenlet = gevent.spawn(self._writer_loop)
+
+    def stop(self):
+        """
+        Writes any buffered records, and closes the log file.
+        """
+
+        if self._writer_greenlet is not None:
+            self._stop_event.set()
+            self._writer_greenlet.join()
+            self._writer_greenlet = None
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+        if self.recorded:
+            logger.info(f'Request log: {self.recorded} requests logged, {self.dropped} dropped')
+
+    def _writer_loop(self):
+        while not self._stop_event.wait(self.flush_interval):
+            self._flush()
+        self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+
+        (data, self._buffer) = (self._buffer, bytearray())
+        try:
+            gevent.get_hub().threadpool.apply(self._write, (data,))
+        except OSError as e:
+            logger.error(f'Request log: failed to write {len(data)} bytes: {e}')
+
+        if self.dropped > self._dropped_logged:
+            logger.warning(f'Request log: {self.dropped - self._dropped_logged} requests dropped, as the disk is not '
+                           f'keeping up')
+            self._dropped_logged = self.dropped
+
+    def _write(self, data):
+        # Runs in the thread pool, so only the writer greenlet ever waits for it
+        if self._file is None or self._file_size >= self.max_file_bytes:
+            self._open_next_file()
+        self._file.write(data)
+        self._file.flush()
+        self._file_size += len(data)
+
+    def _open_next_file(self):
+        if self._file is not None:
+            self._file.close()
+
+        self._file_num += 1
+        file_name = os.path.join(self.directory, '%s-%s-%04d%s' % (self.file_prefix, time.strftime('%Y%m%d%H%M%S'),
+                                                                     self._file_num, REQUEST_LOG_SUFFIX))
+        self._file = open(file_name, 'wb')
+        self._file.write(REQUEST_LOG_MAGIC)
+        self._file_size = len(REQUEST_LOG_MAGIC)
+
+        self._file_names.append(file_name)
+        while len(self._file_names) > self.max_files:
+            os.remove(self._file_names.pop(0))
+
+
+def read_records(file_name):
+    """
+    Reads a request log file.
+    :param file_name: Is the name of the log file.
+    :return: Generator of (start_time, step, status, response_time, content_size, case_key) tuples, with the response
+    time in milliseconds.
+    :raises ValueError: if the file isn't a request log.
+    """
+
+    with open(file_name, 'rb') as log_file:
+        data = log_file.read()
+
+    if not data.startswith(REQUEST_LOG_MAGIC):
+        raise ValueError('%s is not a request log' % file_name)
+
+    position = len(REQUEST_LOG_MAGIC)
+    while position + REQUEST_RECORD.size <= len(data):
+        (start_time, response_time, status, content_size, step_length, case_key_length) = \
+            REQUEST_RECORD.unpack_from(data, position)
+        position += REQUEST_RECORD.size
+        step = data[position:position + step_length].decode(errors='replace')
+        position += step_length
+        case_key = data[position:position + case_key_length].decode(errors='replace')
+        position += case_key_length
+        yield (start_time, step, status, response_time / 1000, content_size, case_key)
+
+
+if __name__ == '__main__':
+    writer = csv.writer(sys.stdout)
+    writer.writerow(('start_time', 'step', 'status', 'response_time_ms', 'content_size', 'case_key'))
+    for pattern in sys.argv[1:]:
+        for log_file_name in sorted(glob.glob(pattern)):
+            for (start_time, step, status, response_time, content_size, case_key) in read_records(log_file_name):
+                writer.writerow((time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(start_time)) + '.%03dZ'
+                                 % (start_time % 1 * 1000), step, status, '%.3f' % response_time, content_size,
+                                 case_key))
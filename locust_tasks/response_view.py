@@ -0,0 +1,86 @@
+import codecs
+
+from .pages import PAGE_MARKERS_BYTES, REDIRECT_BODY_BYTES, Page, find_page, match_page
+
+# Encodings in which searching the raw bytes for an encoded string gives the same result as searching the text
+BYTE_SEARCHABLE_ENCODINGS = ('utf-8', 'ascii', 'iso8859-1')
+
+
+class ResponseView:
+    """
+    A view of a response body which is shared by all of the checks made on a response.
+    Reading resp.text decodes the whole body every time, so instead the body is decoded at most once, and only when
+    it's needed. Most checks can be answered from the raw bytes without decoding anything. For example, a page is
+    identified by one search of the raw bytes for the page markers.
+    """
+
+    __slots__ = ('content', 'encoding', 'byte_searchable', '_text')
+
+    def __init__(self, resp):
+        """
+        :param resp: Is the response to view.
+        """
+
+        self.content = resp.content or b''
+        # A missing charset would make requests guess the encoding, which is expensive. RH always sends UTF-8.
+        self.encoding = resp.encoding or 'utf-8'
+        try:
+            self.byte_searchable = codecs.lookup(self.encoding).name in BYTE_SEARCHABLE_ENCODINGS
+        except LookupError:
+            self.encoding = 'utf-8'
+            self.byte_searchable = True
+        self._text = None
+
+    @property
+    def text(self):
+        """
+        :return: The decoded body. It's decoded on first use and then reused.
+        """
+
+        if self._text is None:
+            self._text = str(self.content, self.encoding, errors='replace')
+        return self._text
+
+    def __bool__(self):
+        return bool(self.content)
+
+    def contains(self, expected_content):
+        """
+        :param expected_content: Is the text to look for.
+        :return: True if the body contains the text.
+        """
+
+        if self.byte_searchable and self._text is None:
+            try:
+                return expected_content.encode(self.encoding) in self.content
+            except UnicodeEncodeError:
+                pass
+        return expected_content in self.text
+
+    def find_page(self):
+        """
+        Identifies the page held by the response. See pages.find_page().
+        :return: The Page, or None if the page can't be identified.
+        """
+
+        if not self.byte_searchable:
+            return find_page(self.text)
+
+        redirect = Page.EQ_LAUNCHED if self.content.startswith(REDIRECT_BODY_BYTES) else None
+        return match_page(PAGE_MARKERS_BYTES.finditer(self.content),
+                          lambda title: title.decode(self.encoding, errors='replace'), redirect)
+
+
+def get_response_view(resp):
+    """
+    Returns the view of a response body, creating it on first use. The view is kept on the response so that every
+    check on the response shares it.
+    :param resp: Is the response.
+    :return: The ResponseView for the response.
+    """
+
+    view = getattr(resp, 'rh_view', None)
+    if view is None:
+        view = ResponseView(resp)
+        resp.rh_view = view
+    return view
@@ -0,0 +1,126 @@
+"""
+A seed artifact holds the UAC and Case update events for an event data file, already rendered as message bodies.
+Building the events is the CPU heavy part of seeding, so compiling them once lets the same data be republished
+(eg, after an environment reset) at the cost of reading the file.
+
+The artifact holds a header followed by one record per message. Each record is a routing key type, the length of
+the body and then the body bytes. The routing keys themselves come from the configuration at replay time.
+The case IDs, transaction IDs and timestamps are fixed when the artifact is compiled, so a replay recreates exactly
+the same cases.
+
+To compile an artifact and then replay it:
+    $ python -m locust_tasks.seed_artifact compile [event_data_file] [artifact_file]
+    $ python -m locust_tasks.seed_artifact replay [artifact_file]
+"""
+import csv
+import logging
+import mmap
+import struct
+import sys
+
+from . import FILE_NAME, SEED_ARTIFACT, UAC_ROUTING_KEY, CASE_ROUTING_KEY
+
+logger = logging.getLogger('performance')
+
+ARTIFACT_MAGIC = b'RHSEEDA1'
+ARTIFACT_HEADER = struct.Struct('<8sQ')
+RECORD_HEADER = struct.Struct('<BI')
+
+UAC_MESSAGE = 0
+CASE_MESSAGE = 1
+
+
+def compile_seed_artifact(file_name, artifact_name):
+    """
+    Builds the events for every record in an event data file and writes them to an artifact.
+    :param file_name: Is the name of the event data file.
+    :param artifact_name: Is the name of the artifact file to write.
+    :return: The number of messages written.
+    """
+
+    # Imported here as setup imports this module to replay artifacts
+    from .setup import generate_test_data_messages
+
+    message_types = {UAC_ROUTING_KEY: UAC_MESSAGE, CASE_ROUTING_KEY: CASE_MESSAGE}
+    count = 0
+
+    with open(file_name, 'r', newline='') as infile, open(artifact_name, 'wb') as artifact:
+        artifact.write(ARTIFACT_HEADER.pack(ARTIFACT_MAGIC, 0))
+        for message in generate_test_data_messages(csv.DictReader(infile), 0):
+            (routing_key, body) = message[:2]
+            artifact.write(RECORD_HEADER.pack(message_types[routing_key], len(body)))
+            artifact.write(body)
+            count += 1
+
+        # Fill in the message count now that it's known
+        artifact.seek(0)
+        artifact.write(ARTIFACT_HEADER.pack(ARTIFACT_MAGIC, count))
+
+    return count
+
+
+def read_artifact_header(header, artifact_name):
+    """
+    Checks that a file is a seed artifact of this version.
+    :param header: Is a buffer holding at least the start of the artifact.
+    :param artifact_name: Is the name of the artifact file, for the error message.
+    :return: The number of messages held by the artifact.
+    :raises ValueError: if the file is not a seed artifact of this version.
+    """
+
+    if len(header) < ARTIFACT_HEADER.size:
+        raise ValueError('%s is not a seed artifact' % artifact_name)
+    (magic, count) = ARTIFACT_HEADER.unpack_from(header)
+    if magic != ARTIFACT_MAGIC:
+        raise ValueError('%s is not a seed artifact' % artifact_name)
+    return count
+
+
+def iter_seed_artifact(artifact_name):
+    """
+    Reads the messages from an artifact. The file is memory mapped, so the bodies are copied straight out of the
+    page cache.
+    :param artifact_name: Is the name of the artifact file.
+    :return: Generator of (routing_key, body) tuples.
+    """
+
+    routing_keys = (UAC_ROUTING_KEY, CASE_ROUTING_KEY)
+
+    with open(artifact_name, 'rb') as artifact, \
+            mmap.mmap(artifact.fileno(), 0, access=mmap.ACCESS_READ) as artifact_map:
+        count = read_artifact_header(artifact_map, artifact_name)
+
+        position = ARTIFACT_HEADER.size
+        for _ in range(count):
+            (message_type, length) = RECORD_HEADER.unpack_from(artifact_map, position)
+            position += RECORD_HEADER.size
+            yield routing_keys[message_type], artifact_map[position:position + length]
+            position += length
+
+
+def count_seed_artifact_messages(artifact_name):
+    """
+    :param artifact_name: Is the name of the artifact file.
+    :return: The number of messages held by the artifact.
+    :raises ValueError: if the file is not a seed artifact of this version.
+    """
+
+    with open(artifact_name, 'rb') as artifact:
+        return read_artifact_header(artifact.read(ARTIFACT_HEADER.size), artifact_name)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == 'compile':
+        file_name = sys.argv[2] if len(sys.argv) > 2 else FILE_NAME
+        artifact_name = sys.argv[3] if len(sys.argv) > 3 else (SEED_ARTIFACT or file_name + '.seed')
+        num_messages = compile_seed_artifact(file_name, artifact_name)
+        sys.stdout.write('Compiled %d messages from %s into %s\n' % (num_messages, file_name, artifact_name))
+    elif command == 'replay':
+        from .setup import publish_seed_artifact
+        publish_seed_artifact(sys.argv[2] if len(sys.argv) > 2 else SEED_ARTIFACT)
+    else:
+        sys.exit('Usage: python -m locust_tasks.seed_artifact compile [event_data_file] [artifact_file]\n'
+                 '       python -m locust_tasks.seed_artifact replay [artifact_file]')
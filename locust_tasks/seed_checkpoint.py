@@ -0,0 +1,129 @@
+import logging
+import mmap
+import os
+import struct
+from uuid import UUID, uuid4
+
+logger = logging.getLogger('performance')
+
+# A checkpoint file holds a header, which identifies the version of the event data file it belongs to, followed by
+# a fixed size slot per record. A slot holds the record's state flags plus its generated caseId and
+# collectionExerciseId as raw UUID bytes.
+CHECKPOINT_MAGIC = b'RHSEEDC1'
+CHECKPOINT_HEADER = struct.Struct('<8sQQQ')
+SLOT_SIZE = 33
+
+# Record state flags
+IDS_GENERATED = 1
+UAC_CONFIRMED = 2
+CASE_CONFIRMED = 4
+COMPLETE = IDS_GENERATED | UAC_CONFIRMED | CASE_CONFIRMED
+
+# How many confirmations to take between flushes of the checkpoint to disk
+FLUSH_INTERVAL = 10000
+
+
+class SeedCheckpoint:
+    """
+    Records the progress of a seeding run, so that a restarted run can carry on from where the last one stopped.
+    The checkpoint holds the IDs generated for each record, so a restarted run reuses them rather than creating
+    duplicate cases, and whether the broker has confirmed each of the record's events.
+    The file is memory mapped, so updates are cheap and processes publishing different sections of the event data
+    file can share it.
+    """
+
+    def __init__(self, file_name, data_stat, num_records):
+        """
+        Opens the checkpoint file, creating it if it doesn't exist or doesn't match the event data file.
+        :param file_name: Is the name of the checkpoint file.
+        :param data_stat: Is the os.stat() result for the event data file.
+        :param num_records: Is the number of records in the event data file.
+        """
+
+        self.file_name = file_name
+        header = CHECKPOINT_HEADER.pack(CHECKPOINT_MAGIC, data_stat.st_size, data_stat.st_mtime_ns, num_records)
+        size = CHECKPOINT_HEADER.size + num_records * SLOT_SIZE
+
+        if not self._matches(header, size):
+            logger.info('Starting new seeding checkpoint %s' % file_name)
+            with open(file_name, 'wb') as checkpoint_file:
+                checkpoint_file.write(header)
+                checkpoint_file.truncate(size)
+
+        self._file = open(file_name, 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._unflushed = 0
+
+    def _matches(self, header, size):
+        try:
+            if os.path.getsize(self.file_name) != size:
+                return False
+            with open(self.file_name, 'rb') as checkpoint_file:
+                return checkpoint_file.read(len(header)) == header
+        except OSError:
+            return False
+
+    def _slot(self, record):
+        return CHECKPOINT_HEADER.size + record * SLOT_SIZE
+
+    def get_flags(self, record):
+        return self._map[self._slot(record)]
+
+    def is_complete(self, record):
+        return self._map[self._slot(record)] == COMPLETE
+
+    def first_incomplete(self, first_record, last_record):
+        """
+        :return: The first record in the range which hasn't had all of its events confirmed, or last_record + 1 if
+        they all have.
+        """
+
+        for record in range(first_record, last_record + 1):
+            if not self.is_complete(record):
+                return record
+        return last_record + 1
+
+    def count_complete(self, first_record, last_record):
+        return sum(1 for record in range(first_record, last_record + 1) if self.is_complete(record))
+
+    def get_ids(self, record):
+        """
+        Returns the IDs for a record, generating and saving them if this is the first time the record is published.
+        :param record: Is the number of the record. Numbered from 0 after the header line.
+        :return: Tuple of the caseId and collectionExerciseId.
+        """
+
+        slot = self._slot(record)
+        if self._map[slot] & IDS_GENERATED:
+            case_id = UUID(bytes=self._map[slot + 1:slot + 17])
+            collection_exercise_id = UUID(bytes=self._map[slot + 17:slot + 33])
+        else:
+            case_id = uuid4()
+            collection_exercise_id = uuid4()
+            self._map[slot + 1:slot + 33] = case_id.bytes + collection_exercise_id.bytes
+            self._map[slot] = IDS_GENERATED
+
+        return str(case_id), str(collection_exercise_id)
+
+    def confirm(self, record, flag):
+        """
+        Records that the broker has confirmed one of a record's events.
+        :param record: Is the number of the record.
+        :param flag: Is UAC_CONFIRMED or CASE_CONFIRMED.
+        """
+
+        slot = self._slot(record)
+        self._map[slot] |= flag
+
+        self._unflushed += 1
+        if self._unflushed >= FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        self._map.flush()
+        self._unflushed = 0
+
+    def close(self):
+        self.flush()
+        self._map.close()
+        self._file.close()
@@ -1,77 +1,252 @@
-#import pika
 import csv
-import datetime
-import hashlib
+import multiprocessing
+import os
 import sys
 import logging
 
-from uuid import uuid4
-
+import requests
+from gevent.event import Event
+
+from .address_options import MAX_LISTED_ADDRESSES
+from .case_allocator import CaseAllocator, EXHAUSTION_POLICIES
+from .case_distribution import CaseFeed, CaseSource, DISTRIBUTION_MODES, MASTER, get_arrival_share
+from .case_store import CaseStore, SharedCaseStore
+from .event_serializer import serialize_event_batch, generate_uuids
+from .event_index import load_event_data_index, calculate_section, read_event_data_header, iter_event_data_section
+from .postcode_index import load_postcode_counts, normalise_postcode
+from .publisher import PipelinedPublisher, PublishError, PublishStats, publish_basic
+from .seed_artifact import iter_seed_artifact, count_seed_artifact_messages
+from .seed_checkpoint import SeedCheckpoint, UAC_CONFIRMED, CASE_CONFIRMED
 from . import FILE_NAME, RABBITMQ_URL, EXCHANGE, UAC_ROUTING_KEY, CASE_ROUTING_KEY, DATA_PUBLISH, INSTANCE_NUM, MAX_INSTANCES
+from . import CASE_EXHAUSTION_POLICY, CASE_LEASE_TIMEOUT, PUBLISH_MODE, PUBLISH_CHANNELS, PUBLISH_MAX_UNCONFIRMED
+from . import PUBLISH_PROCESSES, CASE_REF_START, SEED_CHECKPOINT_FILE, SEED_ARTIFACT, SKIP_UNLISTED_ADDRESSES
+from . import CASE_DISTRIBUTION, CASE_SERVER_URL, CASE_CHUNK_SIZE, CASE_SERVER_WAIT
+from . import WORKER_PROCESSES, WORKER_PROCESS_NUM, SHARED_CASES_FILE
+
+cases = CaseStore()
+case_allocator = None
+
+# Only used when the master hands out the cases. The master holds the case source, and each worker a case feed.
+case_source = None
+case_feed = None
+
+# Set once the worker has its cases. The master can start the users while a worker is still fetching its first chunk.
+cases_ready = Event()
 
-case_ref = 84000000
-cases = []
-next_case_index = 0
+# The number of cases to build events for in one go when publishing test data
+SERIALIZE_BATCH_SIZE = 500
 
 logger = logging.getLogger('performance')
 
 
-def get_next_case():
+def lease_case(listed_only=False):
     """
-    Gets the next case to be used.
+    Leases the next case to be used. The case is not given to any other user until it is released.
+    :param listed_only: Is True if the journey selects the case's address from the addresses RH lists for its
+    postcode.
     :return: Case data, with a UAC that should be in Firestore.
+    :raises CasesExhausted: if the exhaustion policy doesn't allow a case to be leased.
     """
 
-    global next_case_index
- 
-    #logger.info("Next case: " + str(next_case_index))
+    cases_ready.wait()
+    return case_allocator.lease(listed_only)
 
-    next_case = cases[next_case_index]
-        
-    next_case_index += 1
-    if next_case_index >= len(cases):
-        sys.stdout.write('WARNING: All cases used. Wrapping around back to start of collection')
-        next_case_index = 0
-    
-    return next_case
+
+def release_case(case):
+    """
+    Returns a leased case so that it can be used by another user.
+    :param case: Is the case returned by lease_case().
+    """
+
+    case_allocator.release(case)
+
+
+def get_case_counts():
+    """
+    :return: The live counts of leased and available cases for this worker. Empty until the worker has its cases.
+    """
+
+    if case_allocator is None:
+        return {}
+    return case_allocator.get_counts()
 
 
 def setup_master():
     """
     Read CSV file and publish UAC and Case update events to RabbitMQ to seed Firestore with test data if requested.
+    If a precompiled seed artifact is configured then its events are replayed instead.
+    If the master hands out the cases then the whole event data file is read, ready for the workers.
     """
     
+    global case_source
+
+    check_case_distribution()
     if DATA_PUBLISH:
-        publish_test_data()
+        if SEED_ARTIFACT:
+            publish_seed_artifact(SEED_ARTIFACT)
+        else:
+            publish_test_data()
+
+    if CASE_DISTRIBUTION == MASTER:
+        offsets = load_event_data_index(FILE_NAME)
+        read_event_data(offsets, 0, len(offsets) - 2)
+        unlisted = find_unlisted_cases() if SKIP_UNLISTED_ADDRESSES else ()
+        case_source = CaseSource(cases, unlisted, int(CASE_CHUNK_SIZE))
+        logger.info('Read %d cases to hand out to the workers, %d at a time' % (len(cases), case_source.chunk_size))
 
 
-def setup_worker():
+def setup_worker(master_host=None, worker_id=None):
     """
-    Read test data for this worker
+    Read test data for this worker, or fetch the first chunk of cases from the master if it hands out the cases.
+    :param master_host: Is the host name of the master. Only used to fetch cases from the master.
+    :param worker_id: Is the worker's client ID. Only used to fetch cases from the master.
     """
     
+    global case_allocator
+
+    check_case_distribution()
+    if CASE_EXHAUSTION_POLICY not in EXHAUSTION_POLICIES:
+        sys.exit("ERROR: Environment variable 'CASE_EXHAUSTION_POLICY' must be one of: " + ', '.join(EXHAUSTION_POLICIES))
+    block_timeout = float(CASE_LEASE_TIMEOUT) if CASE_LEASE_TIMEOUT else None
+
+    if CASE_DISTRIBUTION == MASTER:
+        if worker_id is None:
+            sys.exit("ERROR: CASE_DISTRIBUTION 'master' needs Locust to run as a worker")
+        unlisted = fetch_first_cases(master_host, worker_id)
+        case_allocator = CaseAllocator(cases, CASE_EXHAUSTION_POLICY, block_timeout, unlisted)
+        case_feed.start(case_allocator)
+        cases_ready.set()
+        return
+
+    if SHARED_CASES_FILE:
+        use_shared_cases()
+    else:
+        # Read in section of event data file for the current instance
+        offsets = load_event_data_index(FILE_NAME)
+        num_event_rows = len(offsets) - 1
+        (first_record, last_record) = calculate_section_of_event_data_file(num_event_rows)
+        read_event_data(offsets, first_record, last_record)
+
+    unlisted = find_unlisted_cases() if SKIP_UNLISTED_ADDRESSES else ()
+    case_allocator = CaseAllocator(cases, CASE_EXHAUSTION_POLICY, block_timeout, unlisted)
+    cases_ready.set()
+
+
+def save_instance_cases(file_name):
+    """
+    Reads the section of the event data file for the current instance, and saves it as a case file which the worker
+    processes in the container share. Used by the launcher.
+    :param file_name: Is the name of the case file.
+    :return: The number of cases saved.
+    """
+
+    offsets = load_event_data_index(FILE_NAME)
+    (first_record, last_record) = calculate_section_of_event_data_file(len(offsets) - 1)
+    read_event_data(offsets, first_record, last_record)
+    cases.save(file_name)
+    return len(cases)
+
+
+def use_shared_cases():
+    """
+    Uses this worker process's part of the instance's cases, from the case file shared by the worker processes in
+    the container.
+    """
+
     global cases
 
-    # Read in section of event data file for the current instance
-    num_event_rows = get_num_event_data_records()
-    (first_record, last_record) = calculate_section_of_event_data_file(num_event_rows)            
-    read_event_data(first_record, last_record)
+    cases = SharedCaseStore(SHARED_CASES_FILE)
+    num_instance_cases = len(cases)
+    (first_record, last_record) = calculate_section(num_instance_cases, int(WORKER_PROCESS_NUM), int(WORKER_PROCESSES))
+    cases.select(first_record, last_record)
+
+    logger.info('Worker process %s/%s: Cases %d..%d inclusive of the instance\'s %d cases, shared from %s'
+                % (WORKER_PROCESS_NUM, WORKER_PROCESSES, first_record, last_record, num_instance_cases,
+                   SHARED_CASES_FILE))
 
 
-def get_num_event_data_records():
+def stop_worker():
     """
-    This function reads the event data file to find out how many records it holds.
-    :return: The number of records in the event data file, not including the header line.
+    Stops fetching cases from the master.
     """
 
-    lines = 0
-    for _ in open(FILE_NAME):
-        lines += 1
-        
-    # Actual number of records is one less due to header line
-    return lines - 1
+    if case_feed:
+        case_feed.stop()
+
+
+def check_case_distribution():
+    if CASE_DISTRIBUTION not in DISTRIBUTION_MODES:
+        sys.exit("ERROR: Environment variable 'CASE_DISTRIBUTION' must be one of: " + ', '.join(DISTRIBUTION_MODES))
+
+
+def fetch_first_cases(master_host, worker_id):
+    """
+    Fetches the worker's first chunk of cases from the master. This waits for the master's web UI to start.
+    :param master_host: Is the host name of the master, for when CASE_SERVER_URL isn't set.
+    :param worker_id: Is the worker's client ID.
+    :return: List of the indices of the unlisted cases.
+    """
+
+    global case_feed
+
+    url = CASE_SERVER_URL or 'http://%s:8089' % master_host
+    case_feed = CaseFeed(url, worker_id, int(CASE_CHUNK_SIZE))
+    try:
+        unlisted = case_feed.fetch_first_chunk(cases, float(CASE_SERVER_WAIT))
+    except requests.RequestException as e:
+        sys.exit('ERROR: Unable to fetch cases from the master at %s: %s' % (url, e))
+    if not cases:
+        sys.exit('ERROR: The master had no cases to hand out within %s seconds' % CASE_SERVER_WAIT)
+
+    logger.info('Fetched %d cases from the master at %s' % (len(cases), url))
+    return unlisted
+
+
+def get_case_source_counts():
+    """
+    :return: The counts of cases handed out to the workers, as returned by CaseSource.get_counts(). Only used on the
+    master.
+    """
+
+    return case_source.get_counts()
+
+
+def get_case_chunk(worker_id, max_count, released, connected, missing):
+    """
+    Hands the next chunk of cases out to a worker, after taking back the cases of any workers which have gone. Only
+    used on the master.
+    :param worker_id: Is the worker's client ID.
+    :param max_count: Is the most cases the worker wants.
+    :param released: Is the indices of the cases the worker has given back.
+    :param connected: Is the IDs of the workers which are sending heartbeats.
+    :param missing: Is the IDs of the workers which have stopped sending heartbeats.
+    :return: The chunk, as returned by CaseSource.take_chunk(), plus the worker's share of the arrival schedule.
+    """
+
+    case_source.update_workers(connected, missing)
+    chunk = case_source.take_chunk(worker_id, max_count, released)
+    chunk['arrival_share'] = get_arrival_share(worker_id, connected)
+    return chunk
+
+
+def get_worker_arrival_share():
+    """
+    :return: This worker's share of the arrival schedule, as given by the master. Only used when the master hands
+    out the cases.
+    """
+
+    return case_feed.arrival_share
+
+
+def set_arrival_share_listener(listener):
+    """
+    :param listener: Is called with the worker's new number and the number of workers, whenever the master changes
+    this worker's share of the arrival schedule.
+    """
+
+    case_feed.on_arrival_share = listener
+
 
-    
 def calculate_section_of_event_data_file(number_records):
     """
     This function uses the instance settings and the number of records in the event data file to calculate the
@@ -98,133 +273,210 @@ def calculate_section_of_event_data_file(number_records):
         sys.exit("ERROR: Event data file too small. There must be at least one worker instance per record in the file") 
 
     # Calculate range of file owned by this instance
-    records_per_instance = number_records / max_instances
-    first_record = int(records_per_instance * (instance_num-1))
-    last_record = int(records_per_instance * (instance_num)) -1
+    (first_record, last_record) = calculate_section(number_records, instance_num, max_instances)
 
     logger.info('Instance %d/%d: Event range: %d..%d inclusive from %d records\n' % (instance_num, max_instances, first_record, last_record, number_records))
 
     return first_record, last_record
     
 
-def read_event_data(first_record, last_record):
+def read_event_data(offsets, first_record, last_record):
     """
     Read in the section of the event data file which belongs to the current instance.
+    Only the lines holding this section are read and parsed, so the cost depends on the size of the section rather
+    than the size of the file.
+    :param offsets: The record offsets from the event data file index.
     :param first_record: The first record from the CSV event data file to use. Numbered from 0 after the header line.
     :param last_record: The final record from the CSV event data file that belongs to the current instance
     """
 
-    with open(FILE_NAME, 'r') as infile:
-        reader = csv.DictReader(infile)
-        line_number = 0
-        for line in reader:
-            if line_number >= first_record and line_number <= last_record:
-                cases.append(line)
-            line_number += 1
+    fieldnames = read_event_data_header(FILE_NAME)
+    reader = csv.reader(iter_event_data_section(FILE_NAME, offsets, first_record, last_record))
+    cases.append_rows(reader, fieldnames)
+
+
+def find_unlisted_cases():
+    """
+    Finds the cases whose addresses RH won't list, because their postcode has more addresses than RH lists.
+    :return: List of the indices of the unlisted cases.
+    """
+
+    postcode_counts = load_postcode_counts(FILE_NAME)
+    unlisted = [index for (index, postcode) in enumerate(cases.iter_values('postcode'))
+                if postcode_counts.get(normalise_postcode(postcode), 0) > MAX_LISTED_ADDRESSES]
+
+    logger.info('%d of %d cases are at postcodes with more than %d addresses. They won\'t be used for journeys which '
+                'select an address' % (len(unlisted), len(cases), MAX_LISTED_ADDRESSES))
+    return unlisted
 
 
 def publish_test_data():
     """
     Send all Case/UAC data from the event data file to the RH service.
+    The file can be split into sections which are published in parallel by a pool of processes. Each case gets a
+    caseRef based on its position in the file, so the caseRefs stay unique however the file is split.
+    If a checkpoint file is configured then a run which was stopped part way through is resumed, reusing the IDs
+    generated by the earlier run.
+    """
+
+    offsets = load_event_data_index(FILE_NAME)
+    num_records = len(offsets) - 1
+    num_processes = get_num_publish_processes(num_records)
+
+    # Create or validate the checkpoint before any publishing process opens it
+    if SEED_CHECKPOINT_FILE:
+        SeedCheckpoint(SEED_CHECKPOINT_FILE, os.stat(FILE_NAME), num_records).close()
+    sections = [calculate_section(num_records, n, num_processes) for n in range(1, num_processes + 1)]
+
+    logger.info('Publishing %d cases using %d process(es)' % (num_records, num_processes))
+    stats = PublishStats()
+    if num_processes == 1:
+        section_stats = [publish_test_data_section(*section) for section in sections]
+    else:
+        # Use fresh processes rather than forking, as forking the gevent patched Locust process isn't safe
+        with multiprocessing.get_context('spawn').Pool(num_processes, initializer=setup_publish_process) as pool:
+            section_stats = pool.starmap(publish_test_data_section, sections)
+    for section_stat in section_stats:
+        stats.add(section_stat)
+    stats.finish()
+
+    logger.info('Published test data: %s' % stats)
+
+
+def get_num_publish_processes(num_records):
+    """
+    :param num_records: Is the number of records in the event data file.
+    :return: The number of processes to publish with. 'auto' uses one process per CPU.
+    """
+
+    if PUBLISH_PROCESSES == 'auto':
+        num_processes = os.cpu_count() or 1
+    else:
+        num_processes = int(PUBLISH_PROCESSES)
+    return max(1, min(num_processes, num_records))
+
+
+def setup_publish_process():
+    """
+    Sets up logging for a publishing process, as it doesn't inherit the Locust logging configuration.
+    """
+
+    logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(processName)s/%(levelname)s: %(message)s')
+
+
+def publish_test_data_section(first_record, last_record):
+    """
+    Send the Case/UAC data for a section of the event data file to the RH service.
+    :param first_record: The first record to publish. Numbered from 0 after the header line.
+    :param last_record: The final record to publish.
+    :return: PublishStats for the section.
+    """
+
+    offsets = load_event_data_index(FILE_NAME)
+    checkpoint = None
+    on_confirm = None
+    resume_record = first_record
+    if SEED_CHECKPOINT_FILE:
+        checkpoint = SeedCheckpoint(SEED_CHECKPOINT_FILE, os.stat(FILE_NAME), len(offsets) - 1)
+        on_confirm = lambda message: checkpoint.confirm(*message[2])
+        resume_record = checkpoint.first_incomplete(first_record, last_record)
+        if resume_record > last_record:
+            logger.info('Records %d..%d already published' % (first_record, last_record))
+            checkpoint.close()
+            return PublishStats()
+        if resume_record > first_record:
+            logger.info('Resuming records %d..%d from record %d' % (first_record, last_record, resume_record))
+
+    fieldnames = read_event_data_header(FILE_NAME)
+    reader = csv.DictReader(iter_event_data_section(FILE_NAME, offsets, resume_record, last_record), fieldnames=fieldnames)
+    messages = generate_test_data_messages(reader, resume_record, checkpoint)
+
+    try:
+        stats = publish_messages(messages, on_confirm)
+    except PublishError:
+        raise
+    except Exception as e:
+        # Pika exceptions can't always be passed back from a publishing process, so report them as a PublishError
+        raise PublishError('Failed to publish records %d..%d: %r' % (first_record, last_record, e)) from None
+    finally:
+        if checkpoint:
+            checkpoint.close()
+
+    logger.info('Published records %d..%d: %s' % (first_record, last_record, stats))
+    return stats
+
+
+def publish_seed_artifact(artifact_name):
+    """
+    Replay the events held in a precompiled seed artifact. See seed_artifact.py.
+    :param artifact_name: Is the name of the artifact file.
+    """
+
+    logger.info('Replaying %d messages from seed artifact %s' % (count_seed_artifact_messages(artifact_name), artifact_name))
+    stats = publish_messages(iter_seed_artifact(artifact_name))
+    logger.info('Replayed seed artifact: %s' % stats)
+
+
+def publish_messages(messages, on_confirm=None):
+    """
+    Publish messages to RabbitMQ using the configured publish mode.
+    :param messages: Is an iterable of (routing_key, body) tuples.
+    :param on_confirm: Is an optional callback, which is passed each message once the broker has confirmed it.
+    :return: PublishStats for the messages.
+    """
+
+    if PUBLISH_MODE == 'pipelined':
+        publisher = PipelinedPublisher(RABBITMQ_URL, EXCHANGE, int(PUBLISH_CHANNELS), int(PUBLISH_MAX_UNCONFIRMED),
+                                       on_confirm)
+        return publisher.publish_all(messages)
+    elif PUBLISH_MODE == 'basic':
+        return publish_basic(RABBITMQ_URL, EXCHANGE, messages, on_confirm)
+    else:
+        sys.exit("ERROR: Environment variable 'PUBLISH_MODE' must be one of: basic, pipelined")
+
+
+def generate_test_data_messages(reader, first_record, checkpoint=None):
+    """
+    Builds the UAC and Case update events for each case.
+    :param reader: Is a csv.DictReader for the event data.
+    :param first_record: Is the number of the first record read by the reader. Numbered from 0 after the header line.
+    :param checkpoint: Is an optional SeedCheckpoint. If supplied then the case IDs come from the checkpoint, and
+    events which have already been confirmed are not sent again.
+    :return: Generator of (routing_key, body, (record, flag)) tuples, with the UAC event for a case followed by its
+    Case event. The record number and flag identify the event when it is confirmed.
     """
 
-    parameters = pika.URLParameters(RABBITMQ_URL)
-    connection = pika.BlockingConnection(parameters)
-    channel = connection.channel()
-
-    with open(FILE_NAME, 'r') as infile:
-        reader = csv.DictReader(infile)
-        for line in reader:
-            case_id =  str(uuid4())
-            collection_exercise_id = str(uuid4())
-
-            uac_event = uac_event_builder(line, case_id, collection_exercise_id)
-            channel.basic_publish(exchange=EXCHANGE,
-                                  routing_key=UAC_ROUTING_KEY,
-                                  body=uac_event)
-            
-            case_event = case_event_builder(line, case_id, collection_exercise_id)
-            channel.basic_publish(exchange=EXCHANGE,
-                                  routing_key=CASE_ROUTING_KEY,
-                                  body=case_event)
-
-    connection.close()
-
-
-def uac_event_builder(line, case_id, collection_exercise_id):
-    """
-    Build UAC event message.
-    :param line: CSV data
-    :param case_id:
-    :param collection_exercise_id:
-    :return:  UAC event message
-    """
-    str_list = []
-    str_list.append('{"event": { "type": "UAC_UPDATED", "source": "CASE_SERVICE", "channel": "RM", "dateTime": "')
-    str_list.append(datetime.datetime.utcnow().isoformat())
-    str_list.append('", "transactionId" : "')
-    str_list.append(str(uuid4()))
-    str_list.append('" }, "payload" : {"uac" : { "uacHash": "')
-    str_list.append(hashlib.sha256(line["uac"].encode()).hexdigest())
-    str_list.append('", "active" : ')
-    str_list.append(line["active"])
-    str_list.append(', "questionnaireId" : "')
-    str_list.append(line["questionnaireId"])
-    str_list.append('", "caseType" : "')
-    str_list.append(line["caseType"])
-    str_list.append('", "region" : "')
-    str_list.append(line["region"])
-    str_list.append('", "caseId" : "')
-    str_list.append(case_id)
-    str_list.append('", "collectionExerciseId" : "')
-    str_list.append(collection_exercise_id)
-    str_list.append('"}}}')
-    return ''.join(str_list)
-
-
-def case_event_builder(line, case_id, collection_exercise_id):
-    """
-    Build Case event message.
-    :param line: CSV data
-    :param case_id:
-    :param collection_exercise_id:
-    :return: Case event message
-    """
-    str_list = []
-    str_list.append('{"event": { "type": "CASE_UPDATED", "source": "CASE_SERVICE", "channel": "RM", "dateTime": "')
-    str_list.append(datetime.datetime.utcnow().isoformat())
-    str_list.append('", "transactionId": "')
-    str_list.append(str(uuid4()))
-    str_list.append('" }, "payload": {"collectionCase": { "id": "')
-    str_list.append(case_id)
-    str_list.append('", "caseRef": "')
-    str_list.append(str(case_ref + 1))
-    str_list.append('", "caseType": "')
-    str_list.append(line["caseType"])
-    str_list.append('", "survey": "CENSUS", "collectionExerciseId": "')
-    str_list.append(collection_exercise_id)
-    str_list.append('", "address": { "addressLine1": "')
-    str_list.append(line["addressLine1"])
-    str_list.append('", "addressLine2": "')
-    str_list.append(line["addressLine2"])
-    str_list.append('", "addressLine3": "')
-    str_list.append(line["addressLine3"])
-    str_list.append('", "townName": "')
-    str_list.append(line["townName"])
-    str_list.append('", "postcode": "')
-    str_list.append(line["postcode"])
-    str_list.append('", "region": "E", "latitude": "')
-    str_list.append(line["latitude"])
-    str_list.append('", "longitude": "')
-    str_list.append(line["longitude"])
-    str_list.append('", "uprn": "')
-    str_list.append(line["uprn"])
-    str_list.append('", "arid": "ABPXXXXXX010008328509", "addressType": "')
-    str_list.append(line["caseType"])
-    str_list.append('", "estabType": "Household"')
-    str_list.append('}, "contact": { "title": null, "forename": null, "surname": null, "email": null, "telNo": null')
-    str_list.append('}, "state": "ACTIONABLE", "actionableFrom": "')
-    str_list.append(datetime.datetime.utcnow().isoformat())
-    str_list.append('"}}}')
-    return ''.join(str_list)
+    batch = []
+    for (record, line) in enumerate(reader, first_record):
+        batch.append((record, line))
+        if len(batch) == SERIALIZE_BATCH_SIZE:
+            yield from generate_test_data_message_batch(batch, checkpoint)
+            batch = []
+    yield from generate_test_data_message_batch(batch, checkpoint)
+
+
+def generate_test_data_message_batch(batch, checkpoint):
+    """
+    Builds the UAC and Case update events for a batch of cases. See generate_test_data_messages().
+    :param batch: Is a list of (record, line) tuples.
+    :param checkpoint: Is an optional SeedCheckpoint.
+    """
 
+    case_ref_start = int(CASE_REF_START) + 1
+    flags = [0] * len(batch)
+    ids = None if checkpoint else generate_uuids(2 * len(batch))
+    batch_cases = []
+
+    for (position, (record, line)) in enumerate(batch):
+        if checkpoint:
+            flags[position] = checkpoint.get_flags(record)
+            (case_id, collection_exercise_id) = checkpoint.get_ids(record)
+        else:
+            (case_id, collection_exercise_id) = ids[2 * position:2 * position + 2]
+        batch_cases.append((line, case_id, collection_exercise_id, case_ref_start + record))
+
+    for ((record, _), record_flags, (uac_event, case_event)) in zip(batch, flags, serialize_event_batch(batch_cases)):
+        if not record_flags & UAC_CONFIRMED:
+            yield UAC_ROUTING_KEY, uac_event, (record, UAC_CONFIRMED)
+        if not record_flags & CASE_CONFIRMED:
+            yield CASE_ROUTING_KEY, case_event, (record, CASE_CONFIRMED)
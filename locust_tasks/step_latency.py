@@ -0,0 +1,276 @@
+"""
+Latency histograms for each step of the journeys, merged across the workers.
+
+Locust's own statistics are by URL, and round response times into coarse buckets. Here each step (eg,
+'RequestUacSms-4-SelectAddress') and each journey has its own histogram, which keeps 3 significant digits
+across the whole range of response times, in the same way as an HdrHistogram. The workers send the master the
+counts recorded since their last report, as a sparse list of bucket counts, and the master adds them together. So the
+master's percentiles cover every response from every worker, without the samples themselves being sent.
+"""
+import math
+from bisect import bisect_left
+from itertools import accumulate
+
+# Every bucket covers values which agree to at least this many significant digits
+SIGNIFICANT_DIGITS = 3
+SUB_BUCKET_BITS = math.ceil(math.log2(2 * 10 ** SIGNIFICANT_DIGITS))
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+SUB_BUCKET_HALF = SUB_BUCKET_COUNT >> 1
+
+PERCENTILES = (50.0, 90.0, 95.0, 99.0, 99.9)
+
+
+def get_bucket_index(value):
+    """
+    :param value: Is a non-negative integer value.
+    :return: The index of the bucket which holds the value.
+    """
+
+    shift = max(0, value.bit_length() - SUB_BUCKET_BITS)
+    return shift * SUB_BUCKET_HALF + (value >> shift)
+
+
+def get_bucket_value(index):
+    """
+    :param index: Is the index of a bucket.
+    :return: The highest value held by the bucket.
+    """
+
+    if index < SUB_BUCKET_COUNT:
+        return index
+    shift = index // SUB_BUCKET_HALF - 1
+    return ((index - shift * SUB_BUCKET_HALF + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    """
+    A histogram of latencies in microseconds. Only the buckets which have been used are held.
+    The sorted bucket indexes are kept until a new bucket is used, which is rare once a test has warmed up, so the
+    percentiles can be read repeatedly without sorting the buckets each time.
+    """
+
+    __slots__ = ('counts', 'total_count', 'min_value', 'max_value', 'total', '_sorted_indexes')
+
+    def __init__(self):
+        self.counts = {}
+        self.total_count = 0
+        self.min_value = None
+        self.max_value = 0
+        self.total = 0
+        self._sorted_indexes = None
+
+    def record(self, value):
+        """
+        :param value: Is the latency, in microseconds.
+        """
+
+        value = max(0, int(value))
+        index = get_bucket_index(value)
+        if index in self.counts:
+            self.counts[index] += 1
+        else:
+            self.counts[index] = 1
+            self._sorted_indexes = None
+        self.total_count += 1
+        self.total += value
+        self.max_value = max(self.max_value, value)
+        self.min_value = value if self.min_value is None else min(self.min_value, value)
+
+    def encode(self):
+        """
+        :return: The histogram as a flat list of ints, which msgpack sends compactly. This is the total, min and max
+        followed by the index and count of each bucket that has been used.
+        """
+
+        encoded = [self.total, self.min_value or 0, self.max_value]
+        for (index, count) in self.counts.items():
+            encoded.append(index)
+            encoded.append(count)
+        return encoded
+
+    def add_encoded(self, encoded):
+        """
+        Adds the counts from an encoded histogram to this one.
+        :param encoded: Is the output of encode().
+        """
+
+        (total, min_value, max_value) = encoded[:3]
+        added = 0
+        for position in range(3, len(encoded), 2):
+            (index, count) = (encoded[position], encoded[position + 1])
+            if index in self.counts:
+                self.counts[index] += count
+            else:
+                self.counts[index] = count
+                self._sorted_indexes = None
+            added += count
+
+        if added:
+            self.total_count += added
+            self.total += total
+            self.max_value = max(self.max_value, max_value)
+            self.min_value = min_value if self.min_value is None else min(self.min_value, min_value)
+
+    def get_value_at_percentile(self, percentile):
+        """
+        :param percentile: Is the percentile, eg, 99.9.
+        :return: The latency at the percentile, in microseconds. This is the highest value in the bucket which holds
+        the percentile, so it's never lower than the true value.
+        """
+
+        return self.get_values_at_percentiles((percentile,))[0]
+
+    def get_values_at_percentiles(self, percentiles):
+        """
+        :param percentiles: Is a sequence of percentiles, in ascending order.
+        :return: List of the latency at each percentile, in microseconds.
+        """
+
+        if not self.total_count:
+            return [0] * len(percentiles)
+
+        if self._sorted_indexes is None:
+            self._sorted_indexes = sorted(self.counts)
+        indexes = self._sorted_indexes
+        cumulative_counts = list(accumulate(map(self.counts.__getitem__, indexes)))
+
+        values = []
+        for percentile in percentiles:
+            position = bisect_left(cumulative_counts, max(1, math.ceil(self.total_count * percentile / 100)))
+            if position < len(indexes):
+                values.append(min(get_bucket_value(indexes[position]), self.max_value))
+            else:
+                values.append(self.max_value)
+        return values
+
+    def get_summary(self):
+        """
+        :return: Dict of the count, plus the min, mean, max and percentile latencies in milliseconds.
+        """
+
+        summary = {
+            'count': self.total_count,
+            'min': (self.min_value or 0) / 1000,
+            'mean': self.total / self.total_count / 1000 if self.total_count else 0.0,
+            'max': self.max_value / 1000,
+        }
+        for (percentile, value) in zip(PERCENTILES, self.get_values_at_percentiles(PERCENTILES)):
+            summary['p%g' % percentile] = value / 1000
+        return summary
+
+
+class StepLatencies:
+    """
+    The latency histograms for each step and journey.
+    A worker records latencies and periodically takes the histograms recorded since it last reported them. The
+    master adds the workers' histograms to its own.
+
+    If correction is enabled then a second set of histograms is corrected for coordinated omission. Each user waits
+    for a response before it carries on, so while RH stalls the user doesn't send the requests it would otherwise
+    have sent, and the stall only shows up as one slow response. The corrected histograms also record the responses
+    that the user would have seen for the requests it should have sent during the stall, as HdrHistogram's
+    recordValueWithExpectedInterval does. The expected interval is the think time the user waited before the step.
+    """
+
+    GROUPS = ('steps', 'journeys', 'corrected_steps', 'corrected_journeys')
+
+    def __init__(self, corrected=False):
+        """
+        :param corrected: Is True to also keep histograms corrected for coordinated omission.
+        """
+
+        self.corrected = corrected
+        self.histograms = {group: {} for group in self.GROUPS}
+
+    def _get_histogram(self, group, name):
+        histograms = self.histograms[group]
+        histogram = histograms.get(name)
+        if histogram is None:
+            histogram = histograms[name] = LatencyHistogram()
+        return histogram
+
+    def record(self, step, journey, response_time, expected_interval=None):
+        """
+        Records the response time of a step.
+        :param step: Is the step ID.
+        :param journey: Is the name of the journey which the step belongs to.
+        :param response_time: Is the response time in milliseconds.
+        :param expected_interval: Is the think time before the step in milliseconds, or None if it isn't known.
+        """
+
+        value = int(response_time * 1000)
+        self._get_histogram('steps', step).record(value)
+        self._get_histogram('journeys', journey).record(value)
+
+        if self.corrected:
+            values = get_corrected_values(value, int(expected_interval * 1000) if expected_interval else 0)
+            for group, name in (('corrected_steps', step), ('corrected_journeys', journey)):
+                histogram = self._get_histogram(group, name)
+                for corrected_value in values:
+                    histogram.record(corrected_value)
+
+    def take_deltas(self):
+        """
+        Returns the histograms recorded since the last call, and starts new ones.
+        :return: Dict of encoded histograms by group and name, or None if nothing has been recorded.
+        """
+
+        if not any(self.histograms.values()):
+            return None
+
+        deltas = {group: {name: histogram.encode() for (name, histogram) in histograms.items()}
+                  for (group, histograms) in self.histograms.items() if histograms}
+        self.clear()
+        return deltas
+
+    def add_deltas(self, deltas):
+        """
+        Adds histograms taken by take_deltas(), eg, on another worker.
+        """
+
+        for (group, encoded_histograms) in deltas.items():
+            if group not in self.histograms:
+                continue
+            for (name, encoded) in encoded_histograms.items():
+                self._get_histogram(group, name).add_encoded(encoded)
+
+    def get_summary(self):
+        """
+        :return: Dict of the latency summary for each step and journey. If there are corrected histograms then each
+        summary holds the corrected summary as well.
+        """
+
+        summary = {}
+        for group in ('steps', 'journeys'):
+            histograms = self.histograms[group]
+            corrected = self.histograms['corrected_' + group]
+            summary[group] = {}
+            for name in sorted(histograms):
+                summary[group][name] = histograms[name].get_summary()
+                if name in corrected:
+                    summary[group][name]['corrected'] = corrected[name].get_summary()
+        return summary
+
+    def clear(self):
+        self.histograms = {group: {} for group in self.GROUPS}
+
+
+def get_corrected_values(value, expected_interval, max_values=10000):
+    """
+    Works out the latencies to record for a response, when correcting for coordinated omission.
+    :param value: Is the latency of the response.
+    :param expected_interval: Is the expected interval between requests, in the same units. 0 if not known.
+    :param max_values: Is the most values to return, to limit the cost of a very long stall.
+    :return: List of the response's latency, followed by the latencies of the requests that would have been sent
+    while it was outstanding.
+    """
+
+    values = [value]
+    if expected_interval <= 0:
+        return values
+
+    missing = value - expected_interval
+    while missing >= expected_interval and len(values) < max_values:
+        values.append(missing)
+        missing -= expected_interval
+    return values
@@ -0,0 +1,51 @@
+"""
+Tests for CaseAllocator's block policy while the cases are being changed under users who are waiting for one.
+
+Run from the repository root:
+    $ python -m pytest tests
+"""
+import gevent
+
+from locust_tasks.case_allocator import BLOCK, CaseAllocator
+from locust_tasks.case_store import CaseStore
+
+FIELDNAMES = ['uac', 'uprn']
+
+
+def make_allocator(number_of_cases):
+    cases = CaseStore()
+    cases.append_rows([['uac%d' % number, str(number)] for number in range(number_of_cases)], FIELDNAMES)
+    return CaseAllocator(cases, BLOCK, block_timeout=2)
+
+
+def test_blocked_lease_gets_a_case_returned_after_compaction():
+    allocator = make_allocator(2)
+    (retiring, kept) = (allocator.lease(), allocator.lease())
+    allocator.retire_all(1)
+    allocator.release(retiring)
+
+    waiter = gevent.spawn(allocator.lease)
+    gevent.sleep(0.1)
+    assert allocator.compact() == [1]
+    allocator.release(kept)
+
+    case = waiter.get(timeout=1)
+    assert (case.index, case.uac) == (0, 'uac1')
+    assert allocator.available_count == 0
+
+
+def test_blocked_lease_gets_a_case_added_after_a_reset():
+    allocator = make_allocator(2)
+    held = [allocator.lease(), allocator.lease()]
+
+    waiter = gevent.spawn(allocator.lease)
+    gevent.sleep(0.1)
+    assert allocator.retire_all(2) == 2
+    allocator.cases.append_rows([['uac2', '2']], FIELDNAMES)
+    allocator.add_cases([2])
+
+    case = waiter.get(timeout=1)
+    assert (case.index, case.uac) == (2, 'uac2')
+    for case in held:
+        allocator.release(case)
+    assert allocator.available_count == 0